@@ -0,0 +1 @@
+"""chroma-spec benchmarks."""
@@ -0,0 +1,257 @@
+"""Benchmarks of chromatic math, rendering and batch throughput."""
+
+import json
+import os
+import subprocess  # noqa: S404
+import sys
+
+import numpy as np
+import pytest
+
+from chroma_spec import background, drift, flashlight, planckian, spec, utils
+
+SEED = 20220721
+MEASURES_PER_FLASHLIGHT = 10
+BULK_SIZE = 100_000
+# Rendering 1k graphs takes minutes and 100k hours, see the nox session.
+LARGE = pytest.mark.large
+SIZES = [10, pytest.param(1_000, marks=LARGE), pytest.param(100_000, marks=LARGE)]
+
+
+def _xy(size):
+    """Reproducible chromaticities around the Planckian locus."""
+    rng = np.random.default_rng(SEED)
+    x = rng.uniform(0.31, 0.45, size)
+    y = 0.33 + 0.25 * (x - 0.31) + rng.normal(0, 0.01, size)
+    return x.round(4), y.round(4)
+
+
+def _write_database(path, size):
+    """SOTC database of size measures, ten per flashlight."""
+    x, y = _xy(size)
+    flashlights = []
+    for start in range(0, size, MEASURES_PER_FLASHLIGHT):
+        measures = [
+            {
+                "date": "2022-07-21",
+                "mod": "og",
+                "level": "lvl" + str(idx - start),
+                "lux": 100 + idx,
+                "ra": 90.0,
+                "ciex": float(x[idx]),
+                "ciey": float(y[idx]),
+            }
+            for idx in range(start, min(start + MEASURES_PER_FLASHLIGHT, size))
+        ]
+        flashlights.append(
+            {
+                "id": str(start),
+                "model": "FL" + str(start),
+                "status": "owned",
+                "configuration": "stock",
+                "measures": measures,
+            },
+        )
+
+    with open(path, "w") as o:
+        json.dump({"version": "0.0.1", "flashlights": flashlights}, o)
+    return path
+
+
+@pytest.fixture(scope="session", autouse=True)
+def warm_cache(tmp_path_factory):
+    """Backgrounds and the Planckian table, computed once before timing."""
+    previous = os.environ.get("CHROMA_SPEC_CACHE")
+    os.environ["CHROMA_SPEC_CACHE"] = str(tmp_path_factory.mktemp("cache"))
+    background.load_background(background.SPEC_SIZE, spectral_locus_labels=[])
+    background.load_background(background.EVOL_SIZE)
+    planckian.planckian_table()
+    yield
+    if previous is None:
+        del os.environ["CHROMA_SPEC_CACHE"]
+    else:
+        os.environ["CHROMA_SPEC_CACHE"] = previous
+
+
+@pytest.fixture(scope="session")
+def databases(tmp_path_factory):
+    """Synthetic databases by number of measures, written once."""
+    paths = dict()
+
+    def get(size):
+        if size not in paths:
+            path = tmp_path_factory.mktemp("db") / ("sotc-" + str(size) + ".json")
+            paths[size] = _write_database(path, size)
+        return paths[size]
+
+    return get
+
+
+def _rounds(size):
+    """Number of rounds, a single one for large databases."""
+    return 3 if size <= 10 else 1
+
+
+@pytest.mark.parametrize("method", utils.CCT_METHODS)
+def test_xy_to_cct(benchmark, method):
+    """Scalar CCT."""
+    benchmark(utils.xy_to_CCT, 0.3604, 0.3339, method)
+
+
+@pytest.mark.parametrize("method", utils.CCT_METHODS)
+def test_xy_to_duv(benchmark, method):
+    """Scalar DUV."""
+    benchmark(utils.xy_to_DUV, 0.3604, 0.3339, method)
+
+
+@pytest.mark.parametrize("method", utils.CCT_METHODS)
+def test_xy_to_cct_array(benchmark, method):
+    """Bulk CCT over 100k measures."""
+    benchmark(utils.xy_to_CCT_array, *_xy(BULK_SIZE), method)
+
+
+@pytest.mark.parametrize("method", utils.CCT_METHODS)
+def test_xy_to_duv_array(benchmark, method):
+    """Bulk DUV over 100k measures."""
+    benchmark(utils.xy_to_DUV_array, *_xy(BULK_SIZE), method)
+
+
+def test_drift_analyze(benchmark):
+    """Drift of 100k measures, ten dated measures per flashlight."""
+    x, y = _xy(BULK_SIZE)
+    rows = np.arange(BULK_SIZE)
+    columns = {
+        "id": (rows // MEASURES_PER_FLASHLIGHT).astype(np.str_),
+        "date": np.datetime64("2022-07-21") + rows % MEASURES_PER_FLASHLIGHT * 30,
+        "mod": np.full(BULK_SIZE, "og"),
+        "level": np.full(BULK_SIZE, "mid"),
+        "ciex": x,
+        "ciey": y,
+    }
+    columns["date"] = columns["date"].astype(np.str_)
+    benchmark(drift.analyze, columns)
+
+
+@pytest.mark.parametrize("fmt", spec.FORMATS)
+def test_plot_chroma_spec(benchmark, tmp_path, fmt):
+    """Single chromatic graph."""
+    benchmark.pedantic(
+        spec.plot_chroma_spec,
+        args=(0.3604, 0.3339, "PL47MU", tmp_path),
+        kwargs={"fmt": fmt},
+        rounds=5,
+        warmup_rounds=1,
+    )
+
+
+def test_flashlight_plots(benchmark):
+    """Raster plots of every measure of a flashlight, on its prepared figure."""
+    x, y = _xy(MEASURES_PER_FLASHLIGHT)
+    fl = flashlight.Flashlight(
+        {
+            "id": "0",
+            "model": "FL0",
+            "status": "owned",
+            "configuration": "stock",
+            "measures": [
+                {
+                    "date": "2022-07-21",
+                    "mod": "og",
+                    "level": "lvl" + str(idx),
+                    "ciex": float(x[idx]),
+                    "ciey": float(y[idx]),
+                }
+                for idx in range(MEASURES_PER_FLASHLIGHT)
+            ],
+        },
+    )
+
+    def plot_all():
+        for measure_id in range(MEASURES_PER_FLASHLIGHT):
+            fl.rasterize_plot(measure_id)
+        fl.release_plot()
+
+    benchmark.pedantic(plot_all, rounds=3, warmup_rounds=1)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_batch(benchmark, databases, tmp_path, size):
+    """Chromatic graphs of a database, regenerated every round."""
+    benchmark.pedantic(
+        spec.chroma_spec_batch,
+        args=(databases(size), tmp_path),
+        kwargs={"force": True},
+        rounds=_rounds(size),
+    )
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_evol(benchmark, databases, tmp_path, size):
+    """Evolution graphs of a database, regenerated every round."""
+    benchmark.pedantic(
+        spec.chroma_spec_evol,
+        args=(databases(size), tmp_path),
+        kwargs={"force": True},
+        rounds=_rounds(size),
+    )
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_gifs(benchmark, databases, tmp_path, size):
+    """Gifs of a database, regenerated every round."""
+    benchmark.pedantic(
+        spec.chroma_spec_gifs,
+        args=(databases(size), tmp_path),
+        kwargs={"force": True},
+        rounds=_rounds(size),
+    )
+
+
+@pytest.mark.parametrize("size", [10, 1_000, 100_000])
+def test_stats(benchmark, databases, tmp_path, size):
+    """Chromatic properties of a database, loading included."""
+    benchmark(spec.chroma_spec_stats, databases(size), tmp_path / "sotc.csv")
+
+
+@pytest.mark.parametrize(
+    "command",
+    [["--help"], ["single", "--CIEx", "0.3604", "--CIEy", "0.3339", "--model", "X"]],
+    ids=["help", "single"],
+)
+def test_cold_start(benchmark, tmp_path, command):
+    """CLI cold start, from interpreter launch to exit."""
+    args = [sys.executable, "-m", "chroma_spec"] + command
+    if command[0] == "single":
+        args += ["--outdir", str(tmp_path)]
+    benchmark.pedantic(
+        subprocess.run,
+        args=(args,),
+        kwargs={"check": True, "capture_output": True},
+        rounds=5,
+    )
+
+
+@pytest.mark.parametrize("size", [10, 1_000, 100_000])
+def test_peak_memory(benchmark, databases, tmp_path, size):
+    """Memory high-water mark of stats, in a fresh process."""
+    report = tmp_path / "profile.json"
+    args = [
+        sys.executable,
+        "-m",
+        "chroma_spec",
+        "--profile",
+        str(report),
+        "stats",
+        "--indb",
+        str(databases(size)),
+        "--out",
+        str(tmp_path / "sotc.csv"),
+    ]
+    benchmark.pedantic(
+        subprocess.run,
+        args=(args,),
+        kwargs={"check": True, "capture_output": True},
+        rounds=3,
+    )
+    with open(report) as i:
+        benchmark.extra_info["max_rss_kib"] = json.load(i)["max_rss_kib"]
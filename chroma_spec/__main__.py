@@ -1,14 +1,133 @@
 """Command-line interface."""
 
+import contextlib
+import json
+import logging
+import pathlib
+
 import click
 
-from . import spec, utils
+from . import database, pipeline, profiling, server, sharding, spec, utils
+from .schema import SchemaError
 
 
 @click.group(name="main")
+@click.option(
+    "--memo-size",
+    type=click.IntRange(min=0),
+    default=utils.CHROMA_CACHE_SIZE,
+    help="Number of memoized chromatic properties.",
+)
+@click.option(
+    "--profile",
+    "profile_file",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default=None,
+    help="Writes per-stage timings as JSON, - for stderr.",
+)
+@click.option(
+    "--cprofile",
+    "cprofile_file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Writes cProfile statistics, along with --profile.",
+)
 @click.version_option()
-def main():
+@click.pass_context
+def main(ctx, memo_size, profile_file, cprofile_file):
     """chroma-spec main cli."""
+    utils.set_chroma_cache_size(memo_size)
+    if profile_file is not None:
+        ctx.with_resource(profiling.profile(profile_file, cprofile_file))
+
+
+@main.result_callback()
+def log_memo(*args, **kwargs):
+    """Log the chromatic properties cache statistics."""
+    logging.debug("Chroma cache: " + str(utils.chroma_cache_info()))
+
+
+@contextlib.contextmanager
+def _schema_errors():
+    """Report the records that do not match the schema, every one of them.
+
+    Yields:
+        None: Database validation or loading
+
+    Raises:
+        ClickException: Records that do not match the schema
+    """
+    try:
+        yield
+    except SchemaError as err:
+        raise click.ClickException(str(err)) from None
+
+
+def _validate(indb, schema):
+    """Validate a database before streaming it, listing every error.
+
+    Commands that load a database as columns validate it while loading,
+    in the same pass, see database.load_columns.
+
+    Args:
+        indb (string): Input database file
+        schema (string): SOTC JSON schema file
+    """
+    with _schema_errors():
+        database.validate(indb, schema)
+
+
+def _parse_shard(ctx, param, value):
+    """Click callback of the --shard option.
+
+    Args:
+        ctx (click.Context): Click context
+        param (click.Parameter): Shard option
+        value (string): Shard as "i/N", may be None
+
+    Returns:
+        tuple: (index, count), None for every flashlight
+
+    Raises:
+        BadParameter: Invalid shard specification
+    """
+    if value is None:
+        return None
+    try:
+        return sharding.parse_shard(value)
+    except ValueError as err:
+        raise click.BadParameter(str(err)) from None
+
+
+def _graph_file(ctx, param, value):
+    """Click callback of graph file options, the suffix sets the format.
+
+    Args:
+        ctx (click.Context): Click context
+        param (click.Parameter): Graph file option
+        value (string): Graph file
+
+    Returns:
+        string: Graph file
+
+    Raises:
+        BadParameter: Unsupported graph format
+    """
+    if pathlib.Path(value).suffix[1:] not in spec.FORMATS:
+        raise click.BadParameter(
+            "Unsupported graph format, suffix must be one of: "
+            + ", ".join("." + fmt for fmt in spec.FORMATS),
+        )
+    return value
+
+
+SHARD_OPTION = click.option(
+    "--shard",
+    type=str,
+    default=None,
+    callback=_parse_shard,
+    help="Renders only the i/N flashlights partition, see merge.",
+)
 
 
 @main.command(name="single")
@@ -22,12 +141,32 @@ def main():
     help="Output directory.",
 )
 @click.option("-z", "--zoom", is_flag=True, help="Enables zoom.")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(spec.FORMATS),
+    default="svg",
+    help="Graphs image format.",
+)
+@click.option(
+    "--raster-background",
+    is_flag=True,
+    help="Rasterizes the diagram background of svg graphs.",
+)
 @click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
 @click.version_option()
-def single(ciex, ciey, model, outdir, zoom, verbose):
+def single(ciex, ciey, model, outdir, zoom, fmt, raster_background, verbose):
     """chroma-spec plots a given chromatic measure."""
     utils.setup_logger(verbose)
-    spec.chroma_spec_single(ciex, ciey, model, outdir, zoom=zoom)
+    spec.chroma_spec_single(
+        ciex,
+        ciey,
+        model,
+        outdir,
+        zoom=zoom,
+        fmt=fmt,
+        rasterize_background=raster_background,
+    )
 
 
 @main.command(name="batch")
@@ -43,12 +182,48 @@ def single(ciex, ciey, model, outdir, zoom, verbose):
     default="data/SOTC",
     help="Output directory.",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=0),
+    default=1,
+    help="Number of rendering processes, 0 for one per CPU.",
+)
+@click.option("-f", "--force", is_flag=True, help="Regenerates up to date graphs.")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(spec.FORMATS),
+    default="svg",
+    help="Graphs image format.",
+)
+@click.option(
+    "--raster-background",
+    is_flag=True,
+    help="Rasterizes the diagram background of svg graphs.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked before any processing.",
+)
+@SHARD_OPTION
 @click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
 @click.version_option()
-def batch(indb, outdir, verbose):
+def batch(indb, outdir, jobs, force, fmt, raster_background, schema, shard, verbose):
     """chroma-spec batch plot chromatic measures."""
     utils.setup_logger(verbose)
-    spec.chroma_spec_batch(indb, outdir)
+    _validate(indb, schema)
+    spec.chroma_spec_batch(
+        indb,
+        outdir,
+        jobs=jobs,
+        force=force,
+        fmt=fmt,
+        rasterize_background=raster_background,
+        shard=shard,
+    )
 
 
 @main.command(name="evol")
@@ -64,12 +239,57 @@ def batch(indb, outdir, verbose):
     default="data/SOTC",
     help="Output directory.",
 )
+@click.option("-f", "--force", is_flag=True, help="Regenerates up to date graphs.")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(spec.FORMATS),
+    default="svg",
+    help="Graphs image format.",
+)
+@click.option(
+    "--raster-background",
+    is_flag=True,
+    help="Rasterizes the diagram background of svg graphs.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked before any processing.",
+)
+@SHARD_OPTION
+@click.option(
+    "--drift",
+    "show_drift",
+    is_flag=True,
+    help="Draws the steps between measures, outliers in red.",
+)
 @click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
 @click.version_option()
-def evol(indb, outdir, verbose):
+def evol(
+    indb,
+    outdir,
+    force,
+    fmt,
+    raster_background,
+    schema,
+    shard,
+    show_drift,
+    verbose,
+):
     """chroma-spec evol plot chromatic evolutions."""
     utils.setup_logger(verbose)
-    spec.chroma_spec_evol(indb, outdir)
+    _validate(indb, schema)
+    spec.chroma_spec_evol(
+        indb,
+        outdir,
+        force=force,
+        fmt=fmt,
+        rasterize_background=raster_background,
+        shard=shard,
+        show_drift=show_drift,
+    )
 
 
 @main.command(name="gifs")
@@ -85,12 +305,408 @@ def evol(indb, outdir, verbose):
     default="data/SOTC",
     help="Output directory.",
 )
+@click.option("-f", "--force", is_flag=True, help="Regenerates up to date graphs.")
+@click.option("--frames", is_flag=True, help="Also writes every frame as png.")
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked before any processing.",
+)
+@SHARD_OPTION
 @click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
 @click.version_option()
-def gifs(indb, outdir, verbose):
+def gifs(indb, outdir, force, frames, schema, shard, verbose):
     """chroma-spec gifs plot animated chromatic evolutions."""
     utils.setup_logger(verbose)
-    spec.chroma_spec_gifs(indb, outdir)
+    _validate(indb, schema)
+    spec.chroma_spec_gifs(indb, outdir, force=force, keep_frames=frames, shard=shard)
+
+
+@main.command(name="merge")
+@click.argument(
+    "shard_dirs",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option(
+    "--outdir",
+    type=click.Path(exists=True),
+    default="data/SOTC",
+    help="Output directory.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def merge(shard_dirs, outdir, verbose):
+    """chroma-spec merge the output directories of shards."""
+    utils.setup_logger(verbose)
+    try:
+        copied = sharding.merge(shard_dirs, outdir)
+    except ValueError as err:
+        raise click.ClickException(str(err)) from None
+    logging.info("Merged " + str(copied) + " graphs --> " + str(outdir))
+
+
+@main.command(name="map")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True),
+    default="data/sotc.json",
+    help="Input database file.",
+)
+@click.option(
+    "--out",
+    type=click.Path(dir_okay=False),
+    default="data/SOTC/sotc.svg",
+    callback=_graph_file,
+    help="Output graph file, its suffix sets the image format.",
+)
+@click.option(
+    "--color-by",
+    type=click.Choice(spec.MAP_COLORS),
+    default=None,
+    help="Colors measures by a field.",
+)
+@click.option("--density", is_flag=True, help="Draws a density layer.")
+@click.option(
+    "--raster-background",
+    is_flag=True,
+    help="Rasterizes the diagram background of svg graphs.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked while loading.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def map_(indb, out, color_by, density, raster_background, schema, verbose):
+    """chroma-spec map plot all measures on a single graph."""
+    utils.setup_logger(verbose)
+    with _schema_errors():
+        spec.chroma_spec_map(
+            indb,
+            out,
+            color_by=color_by,
+            density=density,
+            rasterize_background=raster_background,
+            schema=schema,
+        )
+
+
+@main.command(name="convert")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True),
+    default="data/sotc.json",
+    help="Input database file.",
+)
+@click.option(
+    "--outdb",
+    type=click.Path(),
+    default="data/sotc.npz",
+    help="Output binary database file.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked before conversion.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def convert(indb, outdb, schema, verbose):
+    """chroma-spec convert a database to the binary columnar format."""
+    utils.setup_logger(verbose)
+    with _schema_errors():
+        database.convert(indb, outdb, schema)
+
+
+@main.command(name="ingest")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True),
+    default="data/sotc.json",
+    help="Database file.",
+)
+@click.option(
+    "--records",
+    type=click.Path(exists=True, dir_okay=False, allow_dash=True),
+    default="-",
+    help="Flashlight records to append, as JSON Lines, - for stdin.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked before appending.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def ingest(indb, records, schema, verbose):
+    """chroma-spec ingest append flashlight records to the database log."""
+    utils.setup_logger(verbose)
+    with click.open_file(records) as i:
+        try:
+            database.ingest(
+                indb,
+                [json.loads(line) for line in i if line.strip()],
+                schema,
+            )
+        except ValueError as err:
+            raise click.ClickException(str(err)) from None
+
+
+@main.command(name="compact")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True),
+    default="data/sotc.json",
+    help="Database file.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def compact(indb, verbose):
+    """chroma-spec compact fold the database log back into the database."""
+    utils.setup_logger(verbose)
+    database.compact(indb)
+
+
+@main.command(name="stats")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True, allow_dash=True),
+    default="data/sotc.json",
+    help="Input database file, - reads x y pairs from stdin.",
+)
+@click.option(
+    "--out",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="Output table file, - for stdout.",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["csv", "npz"]),
+    default="csv",
+    help="Output table format.",
+)
+@click.option(
+    "--method",
+    type=click.Choice(utils.CCT_METHODS),
+    default=utils.CCT_METHODS[0],
+    help="CCT method.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked while loading.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def stats(indb, out, fmt, method, schema, verbose):
+    """chroma-spec stats compute chromatic properties in bulk."""
+    utils.setup_logger(verbose)
+    if indb != "-":
+        with _schema_errors():
+            spec.chroma_spec_stats(indb, out, fmt=fmt, method=method, schema=schema)
+        return
+
+    try:
+        spec.chroma_spec_stats(indb, out, fmt=fmt, method=method)
+    except ValueError as err:
+        raise click.UsageError("Invalid stdin: " + str(err)) from None
+
+
+@main.command(name="drift")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True),
+    default="data/sotc.json",
+    help="Input database file.",
+)
+@click.option(
+    "--out",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="Output table file, - for stdout.",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["csv", "npz"]),
+    default="csv",
+    help="Output table format.",
+)
+@click.option(
+    "--method",
+    type=click.Choice(utils.CCT_METHODS),
+    default=utils.CCT_METHODS[0],
+    help="CCT method.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked while loading.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def drift(indb, out, fmt, method, schema, verbose):
+    """chroma-spec drift analyze chromaticity drift along measure histories."""
+    utils.setup_logger(verbose)
+    with _schema_errors():
+        spec.chroma_spec_drift(indb, out, fmt=fmt, method=method, schema=schema)
+
+
+@main.command(name="near")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True),
+    default="data/sotc.json",
+    help="Input database file.",
+)
+@click.option("--CIEx", type=float, required=True, help="CIE 1931 x coordinate.")
+@click.option("--CIEy", type=float, required=True, help="CIE 1931 y coordinate.")
+@click.option(
+    "-k",
+    "--count",
+    type=click.IntRange(min=1),
+    default=5,
+    help="Number of measures.",
+)
+@click.option(
+    "--radius",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="Largest delta u'v', all measures within it up to count.",
+)
+@click.option(
+    "--out",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="Output table file, - for stdout.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked while loading.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def near(indb, ciex, ciey, count, radius, out, schema, verbose):
+    """chroma-spec near list the measures closest to a chromaticity."""
+    utils.setup_logger(verbose)
+    with _schema_errors():
+        spec.chroma_spec_near(
+            indb,
+            ciex,
+            ciey,
+            out,
+            k=count,
+            radius=radius,
+            schema=schema,
+        )
+
+
+@main.command(name="pipeline")
+@click.option(
+    "--indb",
+    type=click.Path(exists=True),
+    default="data/sotc.json",
+    help="Input database file.",
+)
+@click.option(
+    "--outdir",
+    type=click.Path(exists=True),
+    default="data/SOTC",
+    help="Output directory.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=0),
+    default=1,
+    help="Number of rendering processes, 0 for one per CPU.",
+)
+@click.option(
+    "--queue-size",
+    type=click.IntRange(min=1),
+    default=pipeline.QUEUE_SIZE,
+    help="Number of pending renders before reading waits.",
+)
+@click.option("-f", "--force", is_flag=True, help="Regenerates up to date graphs.")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(spec.FORMATS),
+    default="svg",
+    help="Graphs image format.",
+)
+@click.option(
+    "--raster-background",
+    is_flag=True,
+    help="Rasterizes the diagram background of svg graphs.",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True),
+    default=database.SCHEMA,
+    help="Database schema file, checked before any processing.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def pipeline_(
+    indb,
+    outdir,
+    jobs,
+    queue_size,
+    force,
+    fmt,
+    raster_background,
+    schema,
+    verbose,
+):
+    """chroma-spec pipeline plot chromatic measures and evolutions."""
+    utils.setup_logger(verbose)
+    _validate(indb, schema)
+    pipeline.run(
+        indb,
+        outdir,
+        jobs=jobs,
+        force=force,
+        maxsize=queue_size,
+        fmt=fmt,
+        rasterize_background=raster_background,
+    )
+
+
+@main.command(name="serve")
+@click.option("--host", type=str, default=server.HOST, help="TCP host.")
+@click.option(
+    "--port", type=click.IntRange(min=0), default=server.PORT, help="TCP port."
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Unix socket, instead of TCP.",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Enables verbose mode.")
+@click.version_option()
+def serve(host, port, socket_path, verbose):
+    """chroma-spec serve render requests over HTTP."""
+    utils.setup_logger(verbose)
+    try:
+        server.serve(host, port, socket_path)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--socket") from None
 
 
 if __name__ == "__main__":
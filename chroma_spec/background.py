@@ -0,0 +1,331 @@
+"""chroma-spec background."""
+
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+
+import colour
+import matplotlib
+import numpy as np
+from colour.plotting import (
+    CONSTANTS_ARROW_STYLE,
+    CONSTANTS_COLOUR_STYLE,
+    override_style,
+    plot_planckian_locus_in_chromaticity_diagram_CIE1931,
+)
+from matplotlib.backend_bases import FigureCanvasBase
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from . import profiling, utils
+
+SPEC_SIZE = (1280 / 100, 1000 / 100)
+EVOL_SIZE = (6.4, 6.4)
+DPI = 100
+CHECKSUM_SIZE = hashlib.sha256().digest_size
+
+_backgrounds = dict()
+
+
+def background_key(size, dpi=DPI, spectral_locus_labels=None):
+    """Cache key of a background.
+
+    Args:
+        size (tuple): Figure size in inches
+        dpi (int): Figure resolution
+        spectral_locus_labels (list, optional): Spectral locus labels
+
+    Returns:
+        string: Cache key
+
+    Example:
+        >>> from chroma_spec import background
+        >>> len(background.background_key(background.SPEC_SIZE))
+        40
+    """
+    if spectral_locus_labels is not None:
+        spectral_locus_labels = tuple(spectral_locus_labels)
+
+    key = repr(
+        (
+            tuple(size),
+            dpi,
+            spectral_locus_labels,
+            matplotlib.__version__,
+            colour.__version__,
+        ),
+    )
+    return hashlib.sha1(key.encode()).hexdigest()  # noqa: S324
+
+
+@override_style()
+def plot_background(size, dpi=DPI, spectral_locus_labels=None):
+    """Draw the CIE 1931 chromaticity diagram and the Planckian locus.
+
+    The figure is created outside of pyplot so that it is never retained by
+    its figure manager.
+
+    Args:
+        size (tuple): Figure size in inches
+        dpi (int): Figure resolution
+        spectral_locus_labels (list, optional): Spectral locus labels
+
+    Returns:
+        matplotlib.figure.Figure: Background figure
+
+    Example:
+        >>> from chroma_spec import background
+        >>> fig = background.plot_background(background.EVOL_SIZE)
+    """
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+
+    settings = dict()
+    if spectral_locus_labels is not None:
+        settings["spectral_locus_labels"] = list(spectral_locus_labels)
+
+    plot_planckian_locus_in_chromaticity_diagram_CIE1931(
+        {},
+        standalone=False,
+        figure=figure,
+        axes=figure.gca(),
+        **settings,
+    )
+    return figure
+
+
+def _read_cache(path):
+    """Pickled background of a cache file, checked against its checksum.
+
+    Args:
+        path (pathlib.Path): Cache file, SHA-256 digest then pickle
+
+    Returns:
+        bytes: Pickled background figure
+
+    Raises:
+        ValueError: Truncated or corrupt cache file
+    """
+    content = path.read_bytes()
+    checksum, data = content[:CHECKSUM_SIZE], content[CHECKSUM_SIZE:]
+    if hashlib.sha256(data).digest() != checksum:
+        raise ValueError(str(path) + " is corrupt")
+    return data
+
+
+def load_background(size, dpi=DPI, spectral_locus_labels=None):
+    """Serialized background, from memory, disk or freshly drawn.
+
+    Cache files are checked against their checksum, truncated or corrupt
+    ones are drawn again. They are unpickled: keep the cache directory
+    writable by its owner only, see utils.cache_dir.
+
+    Args:
+        size (tuple): Figure size in inches
+        dpi (int): Figure resolution
+        spectral_locus_labels (list, optional): Spectral locus labels
+
+    Returns:
+        bytes: Pickled background figure
+
+    Example:
+        >>> from chroma_spec import background
+        >>> data = background.load_background(background.EVOL_SIZE)
+    """
+    key = background_key(size, dpi, spectral_locus_labels)
+    if key in _backgrounds:
+        return _backgrounds[key]
+
+    path = pathlib.Path(utils.cache_dir(), "background-" + key + ".pickle")
+    try:
+        data = _read_cache(path)
+        logging.debug("Background loaded from " + str(path))
+    except (OSError, ValueError):
+        data = pickle.dumps(plot_background(size, dpi, spectral_locus_labels))
+        try:
+            pathlib.Path.mkdir(path.parent, mode=0o700, parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + "." + str(os.getpid()))
+            tmp_path.write_bytes(hashlib.sha256(data).digest() + data)
+            os.replace(tmp_path, path)
+            logging.debug("Background cached in " + str(path))
+        except OSError as err:
+            logging.warning("Background cache disabled: " + str(err))
+
+    _backgrounds[key] = data
+    return data
+
+
+def new_figure(size=SPEC_SIZE, dpi=DPI, spectral_locus_labels=None):
+    """Fresh figure holding a copy of the cached background.
+
+    Args:
+        size (tuple): Figure size in inches
+        dpi (int): Figure resolution
+        spectral_locus_labels (list, optional): Spectral locus labels
+
+    Returns:
+        tuple (figure, axes): Background figure and its axes
+
+    Example:
+        >>> from chroma_spec import background
+        >>> figure, axes = background.new_figure(spectral_locus_labels=[])
+    """
+    with profiling.stage("background"):
+        data = load_background(size, dpi, spectral_locus_labels)
+        figure = pickle.loads(data)  # noqa: S301
+        FigureCanvasAgg(figure)
+    return figure, figure.axes[0]
+
+
+def rasterize(figure):
+    """Rasterize a figure straight from its Agg canvas buffer.
+
+    Args:
+        figure (matplotlib.figure.Figure): Figure to rasterize
+
+    Returns:
+        numpy.ndarray: RGBA image, independent of the figure buffer
+
+    Example:
+        >>> from chroma_spec import background
+        >>> figure, axes = background.new_figure(background.EVOL_SIZE)
+        >>> background.rasterize(figure).shape
+        (640, 640, 4)
+    """
+    figure.canvas.draw()
+    return np.array(figure.canvas.buffer_rgba())
+
+
+def release(figure):
+    """Release the artists and the raster buffer of a figure.
+
+    Figures and canvases reference each other, without an explicit release
+    their memory lingers until the next garbage collection.
+
+    Args:
+        figure (matplotlib.figure.Figure): Figure to release
+
+    Example:
+        >>> from chroma_spec import background
+        >>> figure, axes = background.new_figure(spectral_locus_labels=[])
+        >>> background.release(figure)
+    """
+    figure.clear()
+    FigureCanvasBase(figure)
+
+
+def rasterize_background(axes):
+    """Rasterize the background artists in vector outputs.
+
+    Artists drawn afterwards, measures and titles, stay vector.
+
+    Args:
+        axes (matplotlib.axes.Axes): Background axes
+
+    Example:
+        >>> from chroma_spec import background
+        >>> figure, axes = background.new_figure(spectral_locus_labels=[])
+        >>> background.rasterize_background(axes)
+    """
+    for artists in (axes.collections, axes.images, axes.lines, axes.texts):
+        for artist in artists:
+            artist.set_rasterized(True)
+
+
+@contextlib.contextmanager
+def figure_context(size=SPEC_SIZE, dpi=DPI, spectral_locus_labels=None):
+    """Fresh background figure, released on exit.
+
+    Args:
+        size (tuple): Figure size in inches
+        dpi (int): Figure resolution
+        spectral_locus_labels (list, optional): Spectral locus labels
+
+    Yields:
+        tuple (figure, axes): Background figure and its axes
+
+    Example:
+        >>> from chroma_spec import background
+        >>> with background.figure_context(spectral_locus_labels=[]) as (fig, ax):
+        ...     background.plot_points(ax, {"PL47MU": [0.3604, 0.3339]})
+    """
+    figure, axes = new_figure(size, dpi, spectral_locus_labels)
+    try:
+        yield figure, axes
+    finally:
+        release(figure)
+
+
+@override_style()
+def plot_points(axes, points):
+    """Draw measures on top of a background, the colour way.
+
+    Args:
+        axes (matplotlib.axes.Axes): Background axes
+        points (dict): Measure descriptions mapped to CIE 1931 [x, y]
+
+    Returns:
+        list: (marker, annotation) artists of every measure
+
+    Example:
+        >>> from chroma_spec import background
+        >>> figure, axes = background.new_figure(spectral_locus_labels=[])
+        >>> artists = background.plot_points(axes, {"PL47MU": [0.3604, 0.3339]})
+    """
+    artists = []
+    for label, xy in points.items():
+        (marker,) = axes.plot(
+            xy[0],
+            xy[1],
+            color=CONSTANTS_COLOUR_STYLE.colour.brightest,
+            label=label,
+            marker="o",
+            markeredgecolor=CONSTANTS_COLOUR_STYLE.colour.dark,
+            markeredgewidth=CONSTANTS_COLOUR_STYLE.geometry.short * 0.75,
+            markersize=(
+                CONSTANTS_COLOUR_STYLE.geometry.short * 6
+                + CONSTANTS_COLOUR_STYLE.geometry.short * 0.75
+            ),
+        )
+        annotation = axes.annotate(
+            label,
+            xy=xy,
+            xytext=(-50, 30),
+            textcoords="offset points",
+            arrowprops=CONSTANTS_ARROW_STYLE,
+        )
+        artists.append((marker, annotation))
+    return artists
+
+
+def plot_steps(axes, steps):
+    """Draw the steps between consecutive measures, outliers in red.
+
+    Args:
+        axes (matplotlib.axes.Axes): Background axes
+        steps (list): [x0, y0, x1, y1, outlier] steps, see drift.analyze
+
+    Example:
+        >>> from chroma_spec import background
+        >>> figure, axes = background.new_figure(spectral_locus_labels=[])
+        >>> background.plot_steps(axes, [[0.3604, 0.3339, 0.3630, 0.3360, False]])
+    """
+    for x0, y0, x1, y1, outlier in steps:
+        axes.annotate(
+            "",
+            xy=(x1, y1),
+            xytext=(x0, y0),
+            arrowprops={
+                "arrowstyle": "->",
+                "color": (
+                    CONSTANTS_COLOUR_STYLE.colour.cycle[0]
+                    if outlier
+                    else CONSTANTS_COLOUR_STYLE.colour.dark
+                ),
+                "linestyle": "--",
+                "linewidth": CONSTANTS_COLOUR_STYLE.geometry.short * 1.5,
+            },
+        )
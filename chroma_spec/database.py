@@ -0,0 +1,800 @@
+"""chroma-spec database."""
+
+import contextlib
+import itertools
+import json
+import logging
+import os
+import pathlib
+import re
+import struct
+import zipfile
+
+import numpy as np
+
+from .flashlight import Flashlight
+from .measures import MeasureTable, encode
+from .schema import SCHEMA, SchemaError, load_validators
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Windows, database logs are not locked.
+    fcntl = None
+
+CHUNK_SIZE = 1 << 16
+# Flashlights streamed from a JSON database share a table per batch, and
+# records are turned into columns a batch of measures at a time.
+BATCH_SIZE = 1024
+JSON_LINES_SUFFIXES = (".jsonl", ".ndjson")
+BINARY_SUFFIXES = (".npz",)
+FLASHLIGHT_COLUMNS = ("id", "model", "status", "configuration")
+LOG_SUFFIX = ".wal"
+WHITESPACE = re.compile(r"\s*")
+
+
+class _Reader:
+    """Incremental JSON tokenizer over a text file.
+
+    Only the tokens around the ``flashlights`` array are scanned by hand,
+    values themselves are decoded by the standard library decoder.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        """Wrap a text stream.
+
+        Args:
+            stream (file): Text stream
+            chunk_size (int): Read size in characters
+        """
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read the next chunk, at least as large as the pending data.
+
+        Returns:
+            bool: False at end of file
+        """
+        chunk = self._stream.read(max(self._chunk_size, len(self._buffer)))
+        if not chunk:
+            self._eof = True
+            return False
+
+        self._buffer += chunk
+        return True
+
+    def peek(self):
+        """Next non-whitespace character.
+
+        Returns:
+            string: Next character, empty at end of file
+        """
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, tokens):
+        """Consume the next non-whitespace character.
+
+        Args:
+            tokens (string): Allowed characters
+
+        Returns:
+            string: Consumed character
+
+        Raises:
+            ValueError: Unexpected character
+        """
+        token = self.peek()
+        if not token or token not in tokens:
+            raise ValueError("Expected one of '" + tokens + "', got '" + token + "'")
+        self._pos += 1
+        return token
+
+    def decode(self):
+        """Decode the next JSON value.
+
+        A value ending with the buffer may be truncated (numbers), it is only
+        accepted at end of file or once the buffer extends beyond it.
+
+        Returns:
+            object: Decoded value
+
+        Raises:
+            json.JSONDecodeError: Malformed value
+        """
+        if self._pos > self._chunk_size:
+            pos = self._pos
+            self._buffer = self._buffer[pos:]
+            self._pos = 0
+
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof or not self._fill():
+                    raise
+                continue
+
+            if end < len(self._buffer) or self._eof or not self._fill():
+                self._pos = end
+                return value
+
+
+def _iter_json(stream, chunk_size=CHUNK_SIZE, header=None):
+    """Stream the flashlights array of a SOTC JSON database.
+
+    Args:
+        stream (file): SOTC JSON database
+        chunk_size (int): Read size in characters
+        header (dict, optional): Filled with the other top-level fields
+
+    Yields:
+        dict: Flashlight properties
+    """
+    reader = _Reader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        key = reader.decode()
+        reader.expect(":")
+        if key != "flashlights":
+            value = reader.decode()
+            if header is not None:
+                header[key] = value
+        else:
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                yield reader.decode()
+                while reader.expect(",]") == ",":
+                    yield reader.decode()
+
+        if reader.expect(",}") == "}":
+            return
+
+
+def _iter_json_lines(stream):
+    """Stream a JSON Lines database, one flashlight per line.
+
+    Args:
+        stream (file): JSON Lines database
+
+    Yields:
+        dict: Flashlight properties
+    """
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_records(indb, chunk_size=CHUNK_SIZE, header=None):
+    """Stream the flashlight records of a JSON database, one at a time.
+
+    SOTC JSON databases are read incrementally, memory is bounded by the
+    largest flashlight record whatever the database size. Files with a
+    ``.jsonl`` or ``.ndjson`` suffix are read as JSON Lines, one flashlight
+    object per line. Ingested records pending in the database log are
+    merged, see ingest.
+
+    Args:
+        indb (string): Input database file
+        chunk_size (int): Read size in characters
+        header (dict, optional): Filled with the other top-level fields
+
+    Yields:
+        dict: Flashlight properties
+
+    Example:
+        >>> from chroma_spec import database
+        >>> [fl["id"] for fl in database.iter_records("data/sotc.json")][:2]
+        ['001', '002']
+    """
+    with _pending_log(indb) as pending:
+        stream = open(indb)
+    with stream:
+        if pathlib.Path(indb).suffix in JSON_LINES_SUFFIXES:
+            records = _iter_json_lines(stream)
+        else:
+            records = _iter_json(stream, chunk_size, header)
+        yield from _merge_log(records, pending)
+
+
+def iter_flashlights(indb, chunk_size=CHUNK_SIZE):
+    """Stream the flashlights of a database, one at a time.
+
+    JSON and JSON Lines databases are streamed by iter_records, a batch
+    of flashlights at a time, ``.npz`` binary databases are memory-mapped.
+    The measures of a flashlight are a view of a table shared by the whole
+    batch or database. Ingested records pending in the database log are
+    merged, see ingest.
+
+    Args:
+        indb (string): Input database file
+        chunk_size (int): Read size in characters
+
+    Yields:
+        flashlight.Flashlight: Flashlight records
+
+    Example:
+        >>> from chroma_spec import database
+        >>> [fl.model for fl in database.iter_flashlights("data/sotc.json")][:2]
+        ['SP10Pro', 'TS10']
+    """
+    if pathlib.Path(indb).suffix in BINARY_SUFFIXES:
+        with _pending_log(indb) as pending:
+            arrays = open_npz(indb)
+        for fl in _iter_columns(arrays):
+            if fl.id in pending:
+                fl = Flashlight(_merge_record(_properties(fl), pending.pop(fl.id)))
+            yield fl
+        for properties in pending.values():
+            yield Flashlight(properties)
+        return
+
+    records = iter_records(indb, chunk_size)
+    while True:
+        batch = list(itertools.islice(records, BATCH_SIZE))
+        if not batch:
+            return
+        yield from _iter_columns(_columns(batch, dict()))
+
+
+def log_path(indb):
+    """Log of the records ingested into a database, not compacted yet.
+
+    Args:
+        indb (string): Database file
+
+    Returns:
+        pathlib.Path: JSON Lines log, next to the database
+
+    Example:
+        >>> from chroma_spec import database
+        >>> database.log_path("data/sotc.json").name
+        'sotc.json.wal'
+    """
+    return pathlib.Path(str(indb) + LOG_SUFFIX)
+
+
+def ingest(indb, records, schema=SCHEMA):
+    """Append flashlight records to the log of a database.
+
+    Records are validated first, nothing is written unless they all match
+    the schema. Writing is an append to the log, whatever the database
+    size: loaders merge the log at read time, measures are added to the
+    flashlight with the same id, its other properties are replaced, and
+    new flashlights come last. See compact to fold the log back.
+
+    Args:
+        indb (string): Database file
+        records (iterable): Flashlight records, with their new measures only
+        schema (string): SOTC JSON schema file
+
+    Returns:
+        int: Number of ingested records
+
+    Raises:
+        SchemaError: Records that do not match the schema, all of them
+
+    Example:
+        >>> from chroma_spec import database
+        >>> database.convert("data/sotc.json", "/tmp/sotc.npz")
+        >>> database.ingest(
+        ...     "/tmp/sotc.npz",
+        ...     [
+        ...         {
+        ...             "id": "011",
+        ...             "model": "D4V2",
+        ...             "status": "owned",
+        ...             "configuration": "stock",
+        ...             "measures": [],
+        ...         },
+        ...     ],
+        ... )
+        1
+    """
+    validators = load_validators(str(schema))
+    records = list(records)
+    errors = []
+    for idx, properties in enumerate(records):
+        validators[1](properties, "records[" + str(idx) + "]", errors)
+    if errors:
+        raise SchemaError(indb, errors)
+
+    content = "".join(json.dumps(properties) + "\n" for properties in records)
+    path = log_path(indb)
+    with open(path, "a+b") as o:
+        _lock(o)
+        if o.seek(0, os.SEEK_END):
+            o.seek(-1, os.SEEK_END)
+            if o.read(1) != b"\n":
+                # Isolate the torn end of an interrupted append.
+                content = "\n" + content
+        o.write(content.encode())
+        o.flush()
+        os.fsync(o.fileno())
+    logging.info(str(len(records)) + " records --> " + str(path))
+    return len(records)
+
+
+def compact(indb):
+    """Fold the log of a database back into it.
+
+    The database is rewritten atomically in its own format, then the log
+    is emptied. Loaders and ingest wait for the compaction to end, they
+    never see the records of the log twice.
+
+    Args:
+        indb (string): Database file
+
+    Returns:
+        int: Number of flashlights with folded records
+
+    Example:
+        >>> from chroma_spec import database
+        >>> database.compact("/tmp/sotc.npz")
+        1
+    """
+    path = log_path(indb)
+    try:
+        log = open(path, "r+")
+    except FileNotFoundError:
+        return 0
+
+    with log:
+        _lock(log)
+        pending = _read_log(log)
+        count = len(pending)
+        if count:
+            _rewrite(indb, pending)
+            logging.info(
+                str(path) + " --> " + str(indb) + ": " + str(count) + " flashlights",
+            )
+        log.truncate(0)
+    return count
+
+
+def _rewrite(indb, pending):
+    """Rewrite a database atomically, with records merged in.
+
+    Args:
+        indb (string): Database file
+        pending (dict): Records to merge, see _read_log
+    """
+    suffix = pathlib.Path(indb).suffix
+    tmp_path = pathlib.Path(str(indb) + "." + str(os.getpid()))
+    if suffix in BINARY_SUFFIXES:
+        arrays = open_npz(indb)
+        records = (_properties(fl) for fl in _iter_columns(arrays))
+        records = _merge_log(records, pending)
+        with open(tmp_path, "wb") as o:
+            np.savez(o, **_columns(records, {"version": str(arrays["version"][0])}))
+    elif suffix in JSON_LINES_SUFFIXES:
+        with open(indb) as i, open(tmp_path, "w") as o:
+            for properties in _merge_log(_iter_json_lines(i), pending):
+                o.write(json.dumps(properties) + "\n")
+    else:
+        header = dict()
+        with open(indb) as i:
+            flashlights = list(_merge_log(_iter_json(i, header=header), pending))
+        header["flashlights"] = flashlights
+        with open(tmp_path, "w") as o:
+            o.write(json.dumps(header, indent=2) + "\n")
+    os.replace(tmp_path, indb)
+
+
+@contextlib.contextmanager
+def _pending_log(indb):
+    """Records pending in the log of a database, under a shared lock.
+
+    Open the database within, it is then consistent with the log even if
+    compacted right after.
+
+    Args:
+        indb (string): Database file
+
+    Yields:
+        dict: Flashlight ids mapped to records, see _read_log
+    """
+    try:
+        log = open(log_path(indb))
+    except FileNotFoundError:
+        yield dict()
+        return
+
+    with log:
+        _lock(log, shared=True)
+        yield _read_log(log)
+
+
+def _lock(stream, shared=False):
+    """Lock a database log until it is closed.
+
+    Without fcntl (Windows), logs are not locked: ingest, compact and
+    loaders must not run concurrently on the same database then.
+
+    Args:
+        stream (file): Database log
+        shared (bool): Flag to share the lock with other readers
+    """
+    if fcntl is not None:
+        fcntl.flock(stream, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+def _read_log(stream):
+    """Records of a database log, merged by flashlight id.
+
+    Lines that cannot be decoded were torn by an interrupted append, they
+    are skipped.
+
+    Args:
+        stream (file): Database log
+
+    Returns:
+        dict: Flashlight ids mapped to records, in ingestion order
+    """
+    pending = dict()
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            properties = json.loads(line)
+        except ValueError:
+            logging.warning(stream.name + ":" + str(line_no) + ": torn record")
+            continue
+        if properties["id"] in pending:
+            properties = _merge_record(pending[properties["id"]], properties)
+        pending[properties["id"]] = properties
+    return pending
+
+
+def _merge_log(records, pending):
+    """Merge pending records into the flashlight records of a database.
+
+    Args:
+        records (iterable): Flashlight records
+        pending (dict): Records to merge, consumed, see _read_log
+
+    Yields:
+        dict: Flashlight records, new flashlights last
+    """
+    for properties in records:
+        if properties["id"] in pending:
+            properties = _merge_record(properties, pending.pop(properties["id"]))
+        yield properties
+    yield from pending.values()
+
+
+def _merge_record(properties, update):
+    """Merge an ingested record into a flashlight record.
+
+    Args:
+        properties (dict): Flashlight record
+        update (dict): Ingested record of the same flashlight
+
+    Returns:
+        dict: Flashlight record, with the ingested properties and measures
+    """
+    merged = dict(properties)
+    merged.update(update)
+    if isinstance(properties["measures"], MeasureTable):
+        merged["measures"] = MeasureTable.concatenate(
+            [properties["measures"], MeasureTable.from_records(update["measures"])],
+        )
+    else:
+        merged["measures"] = list(properties["measures"]) + update["measures"]
+    return merged
+
+
+def _properties(fl):
+    """Record of a flashlight, its measures kept as a table.
+
+    Args:
+        fl (flashlight.Flashlight): Flashlight
+
+    Returns:
+        dict: Flashlight record, with a measures.MeasureTable of measures
+    """
+    properties = {name: getattr(fl, name) for name in FLASHLIGHT_COLUMNS}
+    properties["measures"] = fl.table
+    return properties
+
+
+def load_table(indb):
+    """All the measures of a database, in a single table.
+
+    Binary databases are memory-mapped, without copy.
+
+    Args:
+        indb (string): Input database file
+
+    Returns:
+        measures.MeasureTable: Measures table
+
+    Example:
+        >>> from chroma_spec import database
+        >>> len(database.load_table("data/sotc.json"))
+        15
+    """
+    arrays = load_columns(indb)
+    return MeasureTable(arrays)
+
+
+def validate(indb, schema=SCHEMA):
+    """Validate a database against a schema, in one streamed pass.
+
+    Every error is collected before raising, nothing has been rendered yet.
+    Binary databases were validated when converted, they are accepted as is.
+    JSON Lines databases have no top-level fields, only their flashlights
+    are validated.
+
+    Args:
+        indb (string): Input database file
+        schema (string): SOTC JSON schema file
+
+    Raises:
+        SchemaError: Records that do not match the schema
+
+    Example:
+        >>> from chroma_spec import database
+        >>> database.validate("data/sotc.json")
+    """
+    if pathlib.Path(indb).suffix in BINARY_SUFFIXES:
+        return
+
+    validators = load_validators(str(schema))
+    header = dict()
+    errors = []
+    for idx, properties in enumerate(iter_records(indb, header=header)):
+        validators[1](properties, "flashlights[" + str(idx) + "]", errors)
+    _validate_header(indb, header, validators, errors)
+    if errors:
+        raise SchemaError(indb, errors)
+    logging.debug(str(indb) + " matches " + str(schema))
+
+
+def _validate_header(indb, header, validators, errors):
+    """Validate the top-level fields of a database, once its records are read.
+
+    Args:
+        indb (string): Input database file, JSON Lines have no header
+        header (dict): Other top-level fields, read along with records
+        validators (tuple): Top-level and flashlight validators
+        errors (list): Collected errors, extended in place
+    """
+    if pathlib.Path(indb).suffix not in JSON_LINES_SUFFIXES:
+        validators[0](dict(header, flashlights=[]), "$", errors)
+
+
+def load_columns(indb, schema=None):
+    """All the flashlights and measures of a database, as columns.
+
+    The layout is the one of binary databases: flashlight columns (fl_id,
+    fl_model, fl_status, fl_configuration), measure offsets per flashlight
+    (fl_offsets), measure columns and the measure fields outside of the
+    schema (see measures.MeasureTable.columns) and the database version.
+    String columns are categorical, see column. Binary
+    databases are memory-mapped, without copy, unless records are pending
+    in their log.
+
+    Args:
+        indb (string): Input database file
+        schema (string, optional): SOTC JSON schema file to validate against
+
+    Returns:
+        dict: Column names mapped to arrays
+
+    Example:
+        >>> from chroma_spec import database
+        >>> database.load_columns("data/sotc.json")["fl_offsets"][:3].tolist()
+        [0, 3, 4]
+    """
+    validators = None
+    if schema is not None:
+        validators = load_validators(str(schema))
+
+    if pathlib.Path(indb).suffix not in BINARY_SUFFIXES:
+        header = dict()
+        return _columns(iter_records(indb, header=header), header, validators, indb)
+
+    with _pending_log(indb) as pending:
+        arrays = open_npz(indb)
+    if not pending:
+        return arrays
+    logging.debug(str(indb) + " has pending records, compact it to memory-map")
+    records = _merge_log((_properties(fl) for fl in _iter_columns(arrays)), pending)
+    header = {"version": str(arrays["version"][0])}
+    # Binary records were validated when converted, logged ones when ingested.
+    return _columns(records, header)
+
+
+def _columns(records, header, validators=None, source=None):
+    """Flashlight records as columns, see load_columns.
+
+    Args:
+        records (iterable): Flashlight records, measures as records or tables
+        header (dict): Other top-level fields, read along with records
+        validators (tuple, optional): Top-level and flashlight validators
+        source (string, optional): Database file, required with validators
+
+    Returns:
+        dict: Column names mapped to arrays
+
+    Raises:
+        SchemaError: Records that do not match the schema, all of them
+    """
+    errors = []
+    columns = {name: [] for name in FLASHLIGHT_COLUMNS}
+    counts = []
+    # Measures are stacked as records, then turned into columns a batch at
+    # a time: each column is built by a few vectorized calls.
+    tables = []
+    batch = []
+    for idx, properties in enumerate(records):
+        if validators is not None:
+            validators[1](properties, "flashlights[" + str(idx) + "]", errors)
+        if errors:
+            # Keep validating, invalid records are not loaded.
+            continue
+        for name in FLASHLIGHT_COLUMNS:
+            columns[name].append(properties[name])
+        measures = properties["measures"]
+        if isinstance(measures, MeasureTable):
+            measures = measures.records()
+        counts.append(len(measures))
+        batch.extend(measures)
+        if len(batch) >= BATCH_SIZE:
+            tables.append(MeasureTable.from_records(batch))
+            batch = []
+    tables.append(MeasureTable.from_records(batch))
+
+    if validators is not None:
+        _validate_header(source, header, validators, errors)
+    if errors:
+        raise SchemaError(source, errors)
+    header.setdefault("version", "")
+
+    table = MeasureTable.concatenate(tables)
+    arrays = dict()
+    for name, values in columns.items():
+        arrays["fl_" + name], arrays["fl_" + name + "_values"] = encode(values)
+    arrays["fl_offsets"] = np.cumsum([0] + counts, dtype=np.int64)
+    arrays.update(table.columns())
+    arrays["version"] = np.array([header["version"]])
+    return arrays
+
+
+def convert(indb, outdb, schema=SCHEMA):
+    """Compile a JSON database into a binary columnar database.
+
+    The binary database is an uncompressed ``.npz`` of the load_columns
+    arrays, they can be memory-mapped by open_npz.
+
+    Args:
+        indb (string): Input JSON or JSON Lines database file
+        outdb (string): Output ``.npz`` database file
+        schema (string, optional): SOTC JSON schema file, None to skip checks
+
+    Example:
+        >>> from chroma_spec import database
+        >>> database.convert("data/sotc.json", "/tmp/sotc.npz")
+    """
+    arrays = load_columns(indb, schema)
+
+    with open(outdb, "wb") as o:
+        np.savez(o, **arrays)
+    logging.info(
+        str(indb)
+        + " --> "
+        + str(outdb)
+        + ": "
+        + str(len(arrays["fl_id"]))
+        + " flashlights, "
+        + str(len(arrays["ciex"]))
+        + " measures",
+    )
+
+
+def open_npz(path):
+    """Memory-map the arrays of an uncompressed ``.npz`` file.
+
+    Args:
+        path (string): Binary database file
+
+    Returns:
+        dict: Array names mapped to read-only memory-mapped arrays
+
+    Raises:
+        ValueError: Compressed archive member
+
+    Example:
+        >>> from chroma_spec import database
+        >>> database.convert("data/sotc.json", "/tmp/sotc.npz")
+        >>> database.open_npz("/tmp/sotc.npz")["ciex"][:2].tolist()
+        [0.3603, 0.3553]
+    """
+    arrays = dict()
+    with zipfile.ZipFile(path) as z, open(path, "rb") as i:
+        for info in z.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(info.filename + " is compressed")
+
+            # Local file header: fixed 30 bytes, then file name and extra field.
+            i.seek(info.header_offset)
+            local_header = struct.unpack("<4s5H3L2H", i.read(30))
+            i.seek(local_header[-2] + local_header[-1], 1)
+
+            version = np.lib.format.read_magic(i)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(i)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(i)
+
+            arrays[info.filename[: -len(".npy")]] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                offset=i.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+def column(arrays, name):
+    """Values of a column of a database, categorical columns decoded.
+
+    Args:
+        arrays (dict): Database columns, see load_columns
+        name (string): Column name
+
+    Returns:
+        numpy.ndarray: Column values
+
+    Example:
+        >>> from chroma_spec import database
+        >>> arrays = database.load_columns("data/sotc.json")
+        >>> database.column(arrays, "fl_model")[:2].tolist()
+        ['SP10Pro', 'TS10']
+    """
+    if name + "_values" in arrays:
+        return arrays[name + "_values"][arrays[name]]
+    return arrays[name]
+
+
+def _iter_columns(arrays):
+    """Stream the flashlights of database columns.
+
+    Measures are views of a table of the whole columns, memory-mapped
+    columns are not copied. Distinct flashlight strings are shared.
+
+    Args:
+        arrays (dict): Database columns, see load_columns
+
+    Yields:
+        flashlight.Flashlight: Flashlight records
+    """
+    table = MeasureTable(arrays)
+    values = {
+        name: arrays["fl_" + name + "_values"].tolist() for name in FLASHLIGHT_COLUMNS
+    }
+    offsets = arrays["fl_offsets"]
+    for idx in range(len(offsets) - 1):
+        properties = {
+            name: values[name][arrays["fl_" + name][idx]] for name in FLASHLIGHT_COLUMNS
+        }
+        properties["measures"] = table.view(int(offsets[idx]), int(offsets[idx + 1]))
+        yield Flashlight(properties)
@@ -0,0 +1,181 @@
+"""chroma-spec drift analytics."""
+
+import numpy as np
+
+from . import utils
+
+DAYS_PER_YEAR = 365.25
+OUTLIER_Z = 3.5
+# Iglewicz and Hoaglin modified z-score scale, the MAD of a normal sample.
+MAD_SCALE = 0.6745
+# Steps below the resolution of 4 decimal xy coordinates are noise.
+MAD_FLOOR = 1e-4
+ISO_DATE_LENGTH = 10
+ISO_DATE_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9]
+
+
+def dates_to_days(dates):
+    """ISO dates to days since the epoch, NaN when not a date.
+
+    Plain "YYYY-MM-DD" dates are parsed from their code points in a few
+    array operations, string sorts and per-value parsing are left to the
+    other dates.
+
+    Args:
+        dates (array_like): ISO 8601 dates
+
+    Returns:
+        numpy.ndarray: Days, as floats
+
+    Example:
+        >>> from chroma_spec import drift
+        >>> dates = ["1970-01-02", "2022-07-21", "2022-02-30", "2022-07-21T12", "?"]
+        >>> drift.dates_to_days(dates).tolist()
+        [1.0, 19194.0, nan, 19194.0, nan]
+    """
+    dates = np.asarray(dates, dtype=np.str_).reshape(-1)
+    days = np.full(len(dates), np.nan)
+    plain = np.zeros(len(dates), dtype=bool)
+    if dates.itemsize >= ISO_DATE_LENGTH * 4:
+        codes = dates.view(np.uint32).reshape(len(dates), -1)
+        # One contiguous row per character, strings are padded with zeros.
+        chars = codes[:, : ISO_DATE_LENGTH + 1].T.astype(np.int64)
+        digits = chars[ISO_DATE_DIGITS] - ord("0")
+        plain = (
+            np.all((digits >= 0) & (digits <= 9), axis=0)
+            & (chars[4] == ord("-"))
+            & (chars[7] == ord("-"))
+        )
+        if len(chars) > ISO_DATE_LENGTH:
+            plain &= chars[ISO_DATE_LENGTH] == 0
+        year = digits[0] * 1000 + digits[1] * 100 + digits[2] * 10 + digits[3]
+        month = digits[4] * 10 + digits[5]
+        day = digits[6] * 10 + digits[7]
+        plain &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+
+        months = (year - 1970) * 12 + month - 1
+        parsed = months.astype("datetime64[M]").astype("datetime64[D]") + (day - 1)
+        # Days beyond the end of their month roll over.
+        plain &= parsed.astype("datetime64[M]").astype(np.int64) == months
+        days[plain] = parsed[plain].astype(np.int64)
+
+    others = ~plain
+    if others.any():
+        uniques, inverse = np.unique(dates[others], return_inverse=True)
+        values = np.full(len(uniques), np.nan)
+        for idx, date in enumerate(uniques.tolist()):
+            try:
+                values[idx] = np.datetime64(date, "D").astype(np.int64)
+            except ValueError:
+                continue
+        days[others] = values[inverse.reshape(-1)]
+    return days
+
+
+def analyze(columns):
+    """Chromaticity drift along the measure history of every flashlight.
+
+    Flashlight histories are ordered by date, measures of a day in database
+    order. For every measure:
+
+    - previous: row of the previous measure of its flashlight, -1 if first
+    - step: delta u'v' from the previous measure
+    - days: days since the first measure with the same mod and level
+    - shift: delta u'v' from the first measure with the same mod and level
+    - rate: shift per year, NaN on the first day
+    - outlier: step far above the steps of the whole database, by modified
+      z-score over OUTLIER_Z
+
+    Everything is computed in a few sorts and array operations, whatever
+    the number of flashlights.
+
+    Args:
+        columns (dict): Measure columns, with the id of their flashlight
+
+    Returns:
+        dict: previous, step, days, shift, rate and outlier arrays, by row
+
+    Example:
+        >>> from chroma_spec import drift
+        >>> analysis = drift.analyze(
+        ...     {
+        ...         "id": ["1", "1", "1"],
+        ...         "date": ["2022-01-01", "2022-07-02", "2022-01-01"],
+        ...         "mod": ["og", "og", "og"],
+        ...         "level": ["high", "high", "low"],
+        ...         "ciex": [0.3604, 0.3630, 0.3580],
+        ...         "ciey": [0.3339, 0.3360, 0.3320],
+        ...     },
+        ... )
+        >>> analysis["previous"].tolist()
+        [-1, 2, 0]
+        >>> analysis["rate"].round(4).tolist()
+        [nan, 0.0035, nan]
+    """
+    fl_ids = np.asarray(columns["id"], dtype=np.str_)
+    u, v = utils.xy_to_uvp_array(columns["ciex"], columns["ciey"])
+    days = dates_to_days(columns["date"])
+    rows = np.arange(len(fl_ids))
+
+    order = np.lexsort((rows, days, fl_ids))
+    previous = np.full(len(rows), -1)
+    same = fl_ids[order][1:] == fl_ids[order][:-1]
+    previous[order[1:][same]] = order[:-1][same]
+    has_previous = previous >= 0
+    step = np.full(len(rows), np.nan)
+    step[has_previous] = np.hypot(
+        u[has_previous] - u[previous[has_previous]],
+        v[has_previous] - v[previous[has_previous]],
+    )
+
+    # Settings: measures of a flashlight with the same mod and level.
+    mods = np.asarray(columns["mod"], dtype=np.str_)
+    levels = np.asarray(columns["level"], dtype=np.str_)
+    order = np.lexsort((rows, days, levels, mods, fl_ids))
+    starts = np.ones(len(rows), dtype=bool)
+    starts[1:] = (
+        (fl_ids[order][1:] != fl_ids[order][:-1])
+        | (mods[order][1:] != mods[order][:-1])
+        | (levels[order][1:] != levels[order][:-1])
+    )
+    first = np.empty(len(rows), dtype=np.intp)
+    first[order] = order[np.maximum.accumulate(np.where(starts, rows, 0))]
+
+    elapsed = days - days[first]
+    shift = np.hypot(u - u[first], v - v[first])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(elapsed > 0, shift / elapsed * DAYS_PER_YEAR, np.nan)
+
+    return {
+        "previous": previous,
+        "step": step,
+        "days": elapsed,
+        "shift": shift,
+        "rate": rate,
+        "outlier": outliers(step),
+    }
+
+
+def outliers(values):
+    """Flag values far above the others, by modified z-score.
+
+    Args:
+        values (numpy.ndarray): Values, NaN are ignored
+
+    Returns:
+        numpy.ndarray: Outlier flags
+
+    Example:
+        >>> import numpy as np
+        >>> from chroma_spec import drift
+        >>> drift.outliers(np.array([0.001, 0.002, 0.0015, 0.03, np.nan])).tolist()
+        [False, False, False, True, False]
+    """
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return np.zeros(len(values), dtype=bool)
+
+    median = np.median(finite)
+    mad = max(np.median(np.abs(finite - median)), MAD_FLOOR)
+    with np.errstate(invalid="ignore"):
+        return MAD_SCALE * (values - median) / mad > OUTLIER_Z
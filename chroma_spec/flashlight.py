@@ -1,21 +1,39 @@
 """chroma-spec flashlight."""
 
-import matplotlib.pyplot as plt
-from colour.plotting import plot_planckian_locus_in_chromaticity_diagram_CIE1931, render
+import numpy as np
 
-from . import utils
+from . import profiling, utils
+from .measures import MeasureTable
+
+PLOT_BBOX = [0.3, 0.75, 0.25, 0.65]
 
 
 class Flashlight:
-    """Docstring for Flashlight."""
+    """Docstring for Flashlight.
+
+    Measures are held in a columnar MeasureTable, measures may be given as
+    records or as a table.
+    """
+
+    __slots__ = ("_id", "_model", "_status", "_configuration", "_table", "_plot")
 
     def __init__(self, properties):
         """Docstring for __init__."""
         super(Flashlight, self).__init__()
+        self._id = properties["id"]
         self._model = properties["model"]
         self._status = properties["status"]
         self._configuration = properties["configuration"]
-        self._measures = properties["measures"]
+        if isinstance(properties["measures"], MeasureTable):
+            self._table = properties["measures"]
+        else:
+            self._table = MeasureTable.from_records(properties["measures"])
+        self._plot = None
+
+    @property
+    def id(self):  # noqa: A003
+        """Docstring for id."""
+        return self._id
 
     @property
     def model(self):
@@ -32,59 +50,156 @@ class Flashlight:
         """Docstring for configuration."""
         return self._configuration
 
+    @property
+    def table(self):
+        """Docstring for table."""
+        return self._table
+
     @property
     def measures(self):
-        """Docstring for measures."""
-        return self._measures
+        """Measure records, rebuilt from the table on every access.
+
+        A lossy view: missing required strings read as "" and integers as
+        floats.
+        Loops over the measures should read the table columns instead.
+
+        Returns:
+            list: Measure records
+        """
+        return self._table.records()
 
     def get_cct(self, measure_id):
         """Docstring for get_cct."""
-        return utils.xy_to_CCT(
-            self.measures[measure_id]["ciex"],
-            self.measures[measure_id]["ciey"],
-        )
+        return float(self._table.cct[measure_id])
 
     def get_duv(self, measure_id):
         """Docstring for get_duv."""
-        return utils.xy_to_DUV(
-            self.measures[measure_id]["ciex"],
-            self.measures[measure_id]["ciey"],
-        )
+        return float(self._table.duv[measure_id])
+
+    def get_ccts(self):
+        """Docstring for get_ccts."""
+        return self._table.cct
+
+    def get_duvs(self):
+        """Docstring for get_duvs."""
+        return self._table.duv
+
+    def _plot_template(self):
+        """Figure shared by the plots of every measure, prepared once.
+
+        The spectral locus, the axes and the layout are drawn a single time,
+        the layout fitted to the title of the first measure. The marker, its
+        annotation and the title are animated: the drawn background is kept
+        without them and restored before each measure is blitted.
+
+        Returns:
+            tuple: (figure, axes, marker, annotation, background region)
+        """
+        if self._plot is not None:
+            return self._plot
+
+        from colour.plotting import render
+
+        from . import background
+
+        x = float(self._table.ciex[0])
+        y = float(self._table.ciey[0])
+        cct, duv, _, _ = utils.xy_to_chroma(x, y)
+
+        figure, axes = background.new_figure(spectral_locus_labels=[])
+        with profiling.stage("plot"):
+            ((marker, annotation),) = background.plot_points(
+                axes,
+                {self.model: [x, y]},
+            )
+        with profiling.stage("render"):
+            render(
+                figure=figure,
+                axes=axes,
+                standalone=False,
+                bounding_box=PLOT_BBOX,
+                title=utils.chroma_label(self.model, x, y, cct, duv),
+            )
+            for artist in (marker, annotation, axes.title):
+                artist.set_animated(True)
+            figure.canvas.draw()
+            region = figure.canvas.copy_from_bbox(figure.bbox)
+
+        self._plot = (figure, axes, marker, annotation, region)
+        return self._plot
 
     def get_plot(self, measure_id):
-        """Docstring for get_plot."""
-        cct_str = "%4.0f" % self.get_cct(measure_id)
-        duv_str = "%.4f" % self.get_duv(measure_id)
-        x = self.measures[measure_id]["ciex"]
-        y = self.measures[measure_id]["ciey"]
-        xy = [x, y]
-
-        label = (
-            self.model
-            + " ["
-            + str(x)
-            + "; "
-            + str(y)
-            + "]\nCCT: "
-            + cct_str
-            + "K\nDUV: "
-            + duv_str
-            + "\n"
-        )
-
-        bbox = [0.3, 0.75, 0.25, 0.65]
-
-        fig = plt.figure(figsize=(1280 / 100, 1000 / 100), dpi=100)
-
-        figure, axes = plot_planckian_locus_in_chromaticity_diagram_CIE1931(
-            {self.model: xy},
-            spectral_locus_labels=[],
-            standalone=False,
-            axes=fig.gca(),
-        )
-        render(
-            axes=axes,
-            bounding_box=bbox,
-            # filename=pathlib.Path(outdir, fl + ".svg"),
-            title=label,
-        )
+        """Plot of a measure, on the figure shared by the flashlight measures.
+
+        Only the marker, its annotation and the title are updated, the
+        figure is the same for every measure: it is valid until the next
+        measure is plotted. It is not retained by pyplot, release it with
+        release_plot.
+
+        Args:
+            measure_id (int): Measure index
+
+        Returns:
+            tuple (figure, axes): Measure figure and its axes
+        """
+        figure, axes, marker, annotation, _ = self._plot_template()
+
+        x = float(self._table.ciex[measure_id])
+        y = float(self._table.ciey[measure_id])
+        with profiling.stage("chroma"):
+            cct, duv, _, _ = utils.xy_to_chroma(x, y)
+        with profiling.stage("plot"):
+            marker.set_data([x], [y])
+            annotation.xy = (x, y)
+            axes.title.set_text(utils.chroma_label(self.model, x, y, cct, duv))
+        return figure, axes
+
+    def rasterize_plot(self, measure_id):
+        """Rasterize the plot of a measure, blitted on the drawn background.
+
+        Args:
+            measure_id (int): Measure index
+
+        Returns:
+            numpy.ndarray: RGBA image
+        """
+        figure, axes = self.get_plot(measure_id)
+        _, _, marker, annotation, region = self._plot
+        with profiling.stage("rasterize"):
+            figure.canvas.restore_region(region)
+            for artist in (marker, annotation, axes.title):
+                axes.draw_artist(artist)
+            return np.array(figure.canvas.buffer_rgba())
+
+    def save_plot(self, measure_id, output, fmt="svg"):
+        """Save the plot of a measure into a file or a binary stream.
+
+        Raster formats are blitted, vector formats are drawn in full by
+        their backend.
+
+        Args:
+            measure_id (int): Measure index
+            output (string): Output file or binary stream
+            fmt (string): Image format, svg, png or webp
+        """
+        if fmt == "svg":
+            figure, _ = self.get_plot(measure_id)
+            with profiling.stage("save"):
+                figure.savefig(output, format=fmt)
+            return
+
+        image = self.rasterize_plot(measure_id)
+        from matplotlib import image as mimage
+
+        with profiling.stage("save"):
+            mimage.imsave(output, image, format=fmt)
+
+    def release_plot(self):
+        """Release the figure shared by the measure plots, if any."""
+        if self._plot is None:
+            return
+
+        from . import background
+
+        background.release(self._plot[0])
+        self._plot = None
@@ -0,0 +1,187 @@
+"""chroma-spec chromaticity index."""
+
+import math
+
+import numpy as np
+
+from . import utils
+
+CELL_SIZE = 0.005
+MAX_CELLS = 1024
+
+
+class ChromaIndex:
+    """Uniform grid over the CIE 1976 u'v' coordinates of measures.
+
+    Measures are sorted by grid cell, the measures of a cell column are
+    contiguous: a query only computes distances for the few cells around
+    its point. Measures without chromaticity are left out.
+
+    Example:
+        >>> from chroma_spec import database, index
+        >>> table = database.load_table("data/sotc.json")
+        >>> idx = index.ChromaIndex(table.ciex, table.ciey)
+        >>> rows, distances = idx.nearest(0.3604, 0.3339, k=2)
+        >>> rows.tolist(), distances.round(4).tolist()
+        ([4, 7], [0.0, 0.0164])
+    """
+
+    def __init__(self, x, y, cell_size=CELL_SIZE):
+        """Build the index of measures.
+
+        Args:
+            x (array_like): CIE 1931 chromacity coordinates x
+            y (array_like): CIE 1931 chromacity coordinates y
+            cell_size (float): Grid cell size in u'v', grown for sparse data
+        """
+        super(ChromaIndex, self).__init__()
+        u, v = utils.xy_to_uvp_array(x, y)
+        rows = np.flatnonzero(np.isfinite(u) & np.isfinite(v))
+        u, v = u[rows], v[rows]
+
+        if len(rows):
+            self._origin = (u.min(), v.min())
+            extent = max(u.max() - self._origin[0], v.max() - self._origin[1])
+        else:
+            self._origin = (0.0, 0.0)
+            extent = 0.0
+        self._cell_size = max(cell_size, extent / (MAX_CELLS - 1))
+
+        cell_u, cell_v = self._cells(u, v)
+        self._shape = (int(cell_u.max(initial=0)) + 1, int(cell_v.max(initial=0)) + 1)
+        cells = cell_u * self._shape[1] + cell_v
+        order = np.argsort(cells, kind="stable")
+        self._rows = rows[order]
+        self._u = u[order]
+        self._v = v[order]
+        self._starts = np.searchsorted(
+            cells[order],
+            np.arange(self._shape[0] * self._shape[1] + 1),
+        )
+
+    def __len__(self):
+        """Number of indexed measures."""
+        return len(self._rows)
+
+    def _cells(self, u, v):
+        """Grid cells of u'v' coordinates, unbounded.
+
+        Args:
+            u (numpy.ndarray): CIE 1976 u' coordinates
+            v (numpy.ndarray): CIE 1976 v' coordinates
+
+        Returns:
+            tuple: (u, v) cell indices
+        """
+        cell_u = np.floor((u - self._origin[0]) / self._cell_size)
+        cell_v = np.floor((v - self._origin[1]) / self._cell_size)
+        return cell_u.astype(np.intp), cell_v.astype(np.intp)
+
+    def _within(self, u, v, radius):
+        """Measures within a u'v' distance of a point.
+
+        Args:
+            u (float): CIE 1976 u' coordinate
+            v (float): CIE 1976 v' coordinate
+            radius (float): u'v' distance
+
+        Returns:
+            tuple: (positions, distances) arrays, in grid order
+        """
+        (u0, u1), (v0, v1) = self._cells(
+            np.array([u - radius, u + radius]),
+            np.array([v - radius, v + radius]),
+        )
+        u0, v0 = max(u0, 0), max(v0, 0)
+        u1, v1 = min(u1, self._shape[0] - 1), min(v1, self._shape[1] - 1)
+        if u0 > u1 or v0 > v1:
+            # Out of the grid, no measure around.
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        columns = np.arange(u0, u1 + 1) * self._shape[1]
+        candidates = [
+            np.arange(start, stop)
+            for start, stop in np.stack(
+                [self._starts[columns + v0], self._starts[columns + v1 + 1]],
+                axis=1,
+            ).tolist()
+        ]
+        candidates = np.concatenate(candidates + [np.empty(0, dtype=np.intp)])
+        distances = np.hypot(self._u[candidates] - u, self._v[candidates] - v)
+        inside = distances <= radius
+        return candidates[inside], distances[inside]
+
+    def _sorted(self, positions, distances, k=None):
+        """Closest measures first.
+
+        Args:
+            positions (numpy.ndarray): Grid positions of measures
+            distances (numpy.ndarray): u'v' distances of measures
+            k (int, optional): Number of measures to keep
+
+        Returns:
+            tuple: (rows, distances) arrays, sorted by distance
+        """
+        if k is not None and k < len(distances):
+            # Only the k closest are sorted.
+            closest = np.argpartition(distances, k - 1)[:k]
+            positions, distances = positions[closest], distances[closest]
+        order = np.lexsort((self._rows[positions], distances))
+        return self._rows[positions[order]], distances[order]
+
+    def within(self, x, y, radius):
+        """Measures within a u'v' distance of a chromaticity.
+
+        Args:
+            x (float): CIE 1931 chromacity coordinate x
+            y (float): CIE 1931 chromacity coordinate y
+            radius (float): Delta u'v'
+
+        Returns:
+            tuple: (rows, distances) arrays, sorted by distance
+        """
+        u, v = utils.xy_to_uvp_array(x, y)
+        return self._sorted(*self._within(u, v, radius))
+
+    def nearest(self, x, y, k=1):
+        """Nearest measures to a chromaticity.
+
+        The search radius starts at the grid bounds and doubles until k
+        measures are found.
+
+        Args:
+            x (float): CIE 1931 chromacity coordinate x
+            y (float): CIE 1931 chromacity coordinate y
+            k (int): Number of measures
+
+        Returns:
+            tuple: (rows, distances) arrays, sorted by distance
+        """
+        u, v = utils.xy_to_uvp_array(x, y)
+        # Every measure is within this distance of the point.
+        limit = math.hypot(
+            max(abs(u - self._origin[0]), abs(self._corner(0) - u)),
+            max(abs(v - self._origin[1]), abs(self._corner(1) - v)),
+        )
+        # Nothing is closer than the grid bounds.
+        radius = self._cell_size + math.hypot(
+            max(self._origin[0] - u, u - self._corner(0), 0),
+            max(self._origin[1] - v, v - self._corner(1), 0),
+        )
+        while True:
+            radius = min(radius, limit)
+            positions, distances = self._within(u, v, radius)
+            if len(positions) >= k or radius >= limit:
+                return self._sorted(positions, distances, k)
+            radius *= 2
+
+    def _corner(self, axis):
+        """Upper bound of the grid along an axis.
+
+        Args:
+            axis (int): 0 for u', 1 for v'
+
+        Returns:
+            float: Upper coordinate of the last cell
+        """
+        return self._origin[axis] + self._shape[axis] * self._cell_size
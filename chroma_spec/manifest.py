@@ -0,0 +1,159 @@
+"""chroma-spec manifest."""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import pathlib
+from importlib import metadata
+
+MANIFEST_NAME = ".chroma-spec-manifest.json"
+MANIFEST_VERSION = "0.0.1"
+
+
+@functools.lru_cache(maxsize=None)
+def _versions():
+    """Versions of the rendering libraries, read without importing them.
+
+    Returns:
+        list: matplotlib and colour-science versions
+    """
+    return [metadata.version("matplotlib"), metadata.version("colour-science")]
+
+
+def digest(inputs):
+    """Content hash of the inputs of a graph.
+
+    Library versions are part of the hash, a rendering upgrade invalidates
+    every graph.
+
+    Args:
+        inputs (list): JSON serializable graph inputs (measures, settings)
+
+    Returns:
+        string: Hexadecimal SHA-256 digest
+
+    Example:
+        >>> from chroma_spec import manifest
+        >>> len(manifest.digest([0.3604, 0.3339, "PL47MU", "spec"]))
+        64
+    """
+    content = json.dumps(
+        [inputs, _versions()],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class Manifest:
+    """Record of the graphs generated in an output directory.
+
+    Graphs are keyed by their path relative to the output directory and
+    mapped to the digest of their inputs.
+
+    Example:
+        >>> from chroma_spec import manifest
+        >>> mf = manifest.Manifest("/tmp")
+        >>> mf.is_current("/tmp/PL47MU.svg", manifest.digest(["PL47MU"]))
+        False
+    """
+
+    def __init__(self, outdir, force=False):
+        """Load the manifest of an output directory.
+
+        Args:
+            outdir (string): Output directory
+            force (bool): Flag to consider every graph out of date
+        """
+        super(Manifest, self).__init__()
+        self._outdir = pathlib.Path(outdir)
+        self._force = force
+        self._artifacts = dict()
+        self._claimed = set()
+
+        try:
+            with open(self.path) as i:
+                content = json.load(i)
+        except (OSError, ValueError):
+            return
+
+        if content.get("version") == MANIFEST_VERSION:
+            self._artifacts = content["artifacts"]
+
+    @property
+    def path(self):
+        """Manifest file."""
+        return pathlib.Path(self._outdir, MANIFEST_NAME)
+
+    def _key(self, path):
+        """Manifest key of a graph."""
+        return pathlib.Path(path).relative_to(self._outdir).as_posix()
+
+    def claim(self, path):
+        """Claim a graph for the current run, the first claim wins.
+
+        Measures of the same model, mod and level share a graph, so do
+        flashlights of the same model: without a single owner, each run
+        would overwrite the graph and its digest with the other inputs.
+
+        Args:
+            path (string): Graph file
+
+        Returns:
+            bool: False if the graph is already claimed, skip it then
+        """
+        key = self._key(path)
+        if key in self._claimed:
+            logging.warning("Duplicate graph, skipped: " + str(path))
+            return False
+        self._claimed.add(key)
+        return True
+
+    def is_current(self, path, content_digest):
+        """Check whether a graph is up to date.
+
+        Args:
+            path (string): Graph file
+            content_digest (string): Digest of the graph inputs
+
+        Returns:
+            bool: True if the graph exists and was generated from these inputs
+        """
+        if self._force or not pathlib.Path(path).exists():
+            return False
+
+        current = self._artifacts.get(self._key(path)) == content_digest
+        if current is True:
+            logging.debug("Up to date: " + str(path))
+        return current
+
+    def record(self, path, content_digest):
+        """Record a generated graph.
+
+        Args:
+            path (string): Graph file
+            content_digest (string): Digest of the graph inputs
+        """
+        self._artifacts[self._key(path)] = content_digest
+
+    def items(self):
+        """Recorded graphs.
+
+        Returns:
+            list: (path relative to the output directory, digest) pairs
+        """
+        return sorted(self._artifacts.items())
+
+    def save(self):
+        """Write the manifest, atomically."""
+        tmp_path = self.path.with_name(MANIFEST_NAME + "." + str(os.getpid()))
+        with open(tmp_path, "w") as o:
+            json.dump(
+                {"version": MANIFEST_VERSION, "artifacts": self._artifacts},
+                o,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
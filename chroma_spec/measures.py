@@ -0,0 +1,292 @@
+"""chroma-spec measures."""
+
+import json
+
+import numpy as np
+
+from . import utils
+
+FLOAT_COLUMNS = ("ciex", "ciey", "lux", "ra")
+STRING_COLUMNS = ("date", "mod", "level")
+COLUMNS = STRING_COLUMNS + FLOAT_COLUMNS
+# Optional fields, left out of records when missing (NaN or "").
+OPTIONAL_FLOAT_COLUMNS = ("measured_cct", "measured_u", "measured_v")
+OPTIONAL_STRING_COLUMNS = ("idx",)
+ALL_FLOAT_COLUMNS = FLOAT_COLUMNS + OPTIONAL_FLOAT_COLUMNS
+ALL_STRING_COLUMNS = STRING_COLUMNS + OPTIONAL_STRING_COLUMNS
+# Record fields of the columns named otherwise, cct is the computed column.
+FIELDS = {"measured_cct": "cct", "measured_u": "u", "measured_v": "v"}
+RECORD_FIELDS = {FIELDS.get(name, name) for name in ALL_STRING_COLUMNS}
+RECORD_FIELDS.update(FIELDS.get(name, name) for name in ALL_FLOAT_COLUMNS)
+
+
+def encode(values):
+    """Categorical encoding of strings.
+
+    Args:
+        values (list): Strings
+
+    Returns:
+        tuple (codes, values): int32 codes into the sorted distinct values
+
+    Example:
+        >>> from chroma_spec import measures
+        >>> codes, values = measures.encode(["og", "lee", "og"])
+        >>> codes.tolist(), values.tolist()
+        ([1, 0, 1], ['lee', 'og'])
+    """
+    values, codes = np.unique(np.asarray(values, dtype=np.str_), return_inverse=True)
+    return codes.astype(np.int32).reshape(-1), values
+
+
+class MeasureTable:
+    """Columnar store of the measures of one or many flashlights.
+
+    Float columns are float64 (NaN when missing). String columns are
+    categorical: int32 codes into the sorted distinct values, decoded on
+    access. A table may be a view of some rows of another one, the table
+    of a flashlight shares the columns of the whole collection. Measure
+    fields outside of the schema are kept sparsely, as JSON objects of the
+    rows that have some, decoded with their record only. CCT and DUV
+    columns are computed on first access, then reused.
+
+    Example:
+        >>> from chroma_spec import measures
+        >>> table = measures.MeasureTable.from_records(
+        ...     [{"date": "2022-07-21", "mod": "og", "level": "1-150",
+        ...       "lux": 74, "ra": 100.0, "ciex": 0.3418, "ciey": 0.3518}],
+        ... )
+        >>> table.cct.round(2).tolist()
+        [5124.41]
+    """
+
+    __slots__ = ("_columns", "_start", "_stop", "_cct", "_duv")
+
+    def __init__(self, columns, start=0, stop=None):
+        """Build a table from its columns, or a view of some of their rows.
+
+        Args:
+            columns (dict): Column names mapped to arrays, see columns
+            start (int): First row
+            stop (int, optional): Row after the last one, None for the end
+        """
+        super(MeasureTable, self).__init__()
+        self._columns = columns
+        self._start = start
+        self._stop = len(columns["ciex"]) if stop is None else stop
+        self._cct = None
+        self._duv = None
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from measure records.
+
+        Args:
+            records (list): Measure dicts, as stored in the SOTC database
+
+        Returns:
+            MeasureTable: Measures table
+        """
+        columns = dict()
+        for name in ALL_FLOAT_COLUMNS:
+            field = FIELDS.get(name, name)
+            columns[name] = np.array(
+                [rec.get(field, np.nan) for rec in records],
+                dtype=np.float64,
+            )
+        for name in ALL_STRING_COLUMNS:
+            columns[name], columns[name + "_values"] = encode(
+                [rec.get(name, "") for rec in records],
+            )
+
+        extra_rows = []
+        extra = []
+        for idx, rec in enumerate(records):
+            if rec.keys() - RECORD_FIELDS:
+                extra_rows.append(idx)
+                extra.append(
+                    json.dumps(
+                        {k: v for k, v in rec.items() if k not in RECORD_FIELDS}
+                    ),
+                )
+        columns["extra_rows"] = np.array(extra_rows, dtype=np.int64)
+        columns["extra"] = np.array(extra, dtype=np.str_)
+        return cls(columns)
+
+    @classmethod
+    def concatenate(cls, tables):
+        """Stack tables, for queries across a whole collection.
+
+        Args:
+            tables (list): Measure tables
+
+        Returns:
+            MeasureTable: Stacked measures table
+        """
+        columns = dict()
+        for name in ALL_FLOAT_COLUMNS:
+            columns[name] = np.concatenate(
+                [getattr(table, name) for table in tables]
+                or [np.empty(0, dtype=np.float64)],
+            )
+        for name in ALL_STRING_COLUMNS:
+            columns[name], columns[name + "_values"] = encode(
+                np.concatenate(
+                    [getattr(table, name) for table in tables]
+                    or [np.empty(0, dtype=np.str_)],
+                ),
+            )
+
+        extra_rows = [np.empty(0, dtype=np.int64)]
+        extra = [np.empty(0, dtype=np.str_)]
+        offset = 0
+        for table in tables:
+            rows, fields = table._extra()
+            extra_rows.append(rows + offset)
+            extra.append(fields)
+            offset += len(table)
+        columns["extra_rows"] = np.concatenate(extra_rows)
+        columns["extra"] = np.concatenate(extra)
+        return cls(columns)
+
+    def __len__(self):
+        """Number of measures."""
+        return self._stop - self._start
+
+    def __getattr__(self, name):
+        """Values of a column, string columns decoded.
+
+        Args:
+            name (string): Column name, see ALL_FLOAT_COLUMNS, ALL_STRING_COLUMNS
+
+        Returns:
+            numpy.ndarray: Column values, views of float columns
+
+        Raises:
+            AttributeError: Unknown column
+        """
+        rows = slice(self._start, self._stop)
+        if name in ALL_FLOAT_COLUMNS:
+            return self._columns[name][rows]
+        if name in ALL_STRING_COLUMNS:
+            return self._columns[name + "_values"][self._columns[name][rows]]
+        raise AttributeError(name)
+
+    @property
+    def cct(self):
+        """Correlated Colour Temperatures, computed once."""
+        if self._cct is None:
+            self._cct = utils.xy_to_CCT_array(self.ciex, self.ciey)
+        return self._cct
+
+    @property
+    def duv(self):
+        """Delta uv, computed once."""
+        if self._duv is None:
+            self._duv = utils.xy_to_DUV_array(self.ciex, self.ciey)
+        return self._duv
+
+    def view(self, start, stop):
+        """Some rows of the table, sharing its columns.
+
+        Args:
+            start (int): First row
+            stop (int): Row after the last one
+
+        Returns:
+            MeasureTable: Measures table, nothing is copied
+        """
+        return MeasureTable(self._columns, self._start + start, self._start + stop)
+
+    def columns(self):
+        """Columns of the table rows, in the layout of the table columns.
+
+        Float columns are arrays, string columns are codes (``name``) into
+        distinct values (``name_values``). Other fields are JSON objects
+        (``extra``) of some rows (``extra_rows``).
+
+        Returns:
+            dict: Column names mapped to arrays
+        """
+        columns = {name: getattr(self, name) for name in ALL_FLOAT_COLUMNS}
+        for name in ALL_STRING_COLUMNS:
+            columns[name] = self._columns[name][slice(self._start, self._stop)]
+            columns[name + "_values"] = self._columns[name + "_values"]
+        columns["extra_rows"], columns["extra"] = self._extra()
+        return columns
+
+    def _extra(self):
+        """Rows of the table with fields outside of the columns.
+
+        Returns:
+            tuple (rows, fields): Row indices in the table, JSON objects
+        """
+        rows = self._columns["extra_rows"]
+        start, stop = np.searchsorted(rows, [self._start, self._stop])
+        return rows[start:stop] - self._start, self._columns["extra"][start:stop]
+
+    def record(self, idx):
+        """Measure record, as stored in the SOTC database.
+
+        Args:
+            idx (int): Measure index
+
+        Returns:
+            dict: Measure record, missing fields are left out
+        """
+        return self.records(idx, idx + 1)[0]
+
+    def rows(self, names):
+        """Values of some columns, measure by measure, as Python scalars.
+
+        Far cheaper than records in loops over measures: no dict is built
+        and missing values are left as they are stored.
+
+        Args:
+            names (tuple): Column names, see COLUMNS
+
+        Returns:
+            list: Tuples of values, one per measure
+
+        Example:
+            >>> from chroma_spec import measures
+            >>> table = measures.MeasureTable.from_records(
+            ...     [{"date": "2022-07-21", "mod": "og", "level": "1-150",
+            ...       "ciex": 0.3418, "ciey": 0.3518}],
+            ... )
+            >>> table.rows(("mod", "level", "ciex", "ciey"))
+            [('og', '1-150', 0.3418, 0.3518)]
+        """
+        columns = [getattr(self, name).tolist() for name in names]
+        return [tuple(column[idx] for column in columns) for idx in range(len(self))]
+
+    def records(self, start=0, stop=None):
+        """Measure records, as stored in the SOTC database.
+
+        Args:
+            start (int): First measure
+            stop (int, optional): Measure after the last one, None for all
+
+        Returns:
+            list: Measure records, missing fields are left out
+        """
+        table = self.view(start, len(self) if stop is None else stop)
+        columns = [
+            (name, getattr(table, name).tolist())
+            for name in ALL_STRING_COLUMNS + ALL_FLOAT_COLUMNS
+        ]
+        rows, fields = table._extra()
+        extra = {row: fields[idx] for idx, row in enumerate(rows.tolist())}
+        records = []
+        for idx in range(len(table)):
+            rec = dict()
+            for name, column in columns:
+                value = column[idx]
+                if value != value or (value == "" and name in OPTIONAL_STRING_COLUMNS):
+                    # NaN floats and empty optional strings are missing.
+                    continue
+                rec[FIELDS.get(name, name)] = value
+            if idx in extra:
+                rec.update(json.loads(extra[idx]))
+            records.append(rec)
+        return records
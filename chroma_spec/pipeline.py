@@ -0,0 +1,329 @@
+"""chroma-spec asynchronous pipeline."""
+
+import asyncio
+import concurrent.futures
+import io
+import logging
+import os
+import pathlib
+import uuid
+
+from . import database, manifest, spec
+
+QUEUE_SIZE = 64
+
+
+def _render(job):
+    """Executor entry point, render a graph in memory.
+
+    Args:
+        job (tuple): Render function and its keyword arguments, output aside
+
+    Returns:
+        bytes: Rendered graph
+    """
+    func, kwargs = job
+    stream = io.BytesIO()
+    func(output=stream, **kwargs)
+    return stream.getvalue()
+
+
+class RenderQueue:
+    """Bounded queue of render jobs, consumed by a pool of workers.
+
+    Graphs are rendered on an executor, CPU-bound work never blocks the
+    event loop, and files are written from the default thread pool. submit
+    waits while the queue is full, producers are throttled to the rendering
+    throughput. Jobs are consumed by several workers, a slow graph does not
+    hold back the others. Without an executor, graphs are rendered by the
+    default thread pool: keep a single worker then, plotting styles are
+    process-wide.
+
+    Example:
+        >>> import asyncio
+        >>> from chroma_spec import pipeline, spec
+        >>> async def main():
+        ...     async with pipeline.RenderQueue() as queue:
+        ...         return await queue.render(
+        ...             spec.render_chroma_spec,
+        ...             {"x": 0.3604, "y": 0.3339, "fl": "PL47MU"},
+        ...         )
+        >>> asyncio.run(main())[:5]
+        b'<?xml'
+    """
+
+    def __init__(self, executor=None, workers=1, maxsize=QUEUE_SIZE):
+        """Configure the queue, workers are started by the context manager.
+
+        Args:
+            executor (concurrent.futures.Executor, optional): Render executor
+            workers (int): Number of concurrent renders
+            maxsize (int): Number of pending jobs before submit waits
+        """
+        super(RenderQueue, self).__init__()
+        self._executor = executor
+        self._workers = workers
+        self._maxsize = maxsize
+        self._queue = None
+        self._tasks = []
+
+    async def __aenter__(self):
+        """Start the workers."""
+        self._queue = asyncio.Queue(self._maxsize)
+        self._tasks = [
+            asyncio.ensure_future(self._work()) for _ in range(self._workers)
+        ]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Wait for pending jobs unless failing, then stop the workers."""
+        if exc_type is None:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, func, kwargs, path=None):
+        """Queue a render job, waiting while the queue is full.
+
+        Args:
+            func (callable): Render function, with an output argument
+            kwargs (dict): Render function arguments, output aside
+            path (string, optional): Output file
+
+        Returns:
+            asyncio.Future: Output file if any, otherwise the rendered bytes
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, kwargs, path, future))
+        return future
+
+    async def render(self, func, kwargs, path=None):
+        """Render a graph through the queue.
+
+        Args:
+            func (callable): Render function, with an output argument
+            kwargs (dict): Render function arguments, output aside
+            path (string, optional): Output file
+
+        Returns:
+            object: Output file if any, otherwise the rendered bytes
+        """
+        return await (await self.submit(func, kwargs, path))
+
+    async def _work(self):
+        """Render and write queued jobs, forever."""
+        loop = asyncio.get_running_loop()
+        while True:
+            func, kwargs, path, future = await self._queue.get()
+            try:
+                result = await loop.run_in_executor(
+                    self._executor,
+                    _render,
+                    (func, kwargs),
+                )
+                if path is not None:
+                    await loop.run_in_executor(None, _write, path, result)
+                    result = path
+            except Exception as err:
+                if not future.cancelled():
+                    future.set_exception(err)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+
+def _write(path, data):
+    """Write a file atomically.
+
+    The temporary file name is unique, concurrent writes of the same file
+    do not clash: the last one wins. It is created as open would, the
+    umask applies and graphs get the usual permissions.
+
+    Args:
+        path (string): Output file
+        data (bytes): File content
+    """
+    path = pathlib.Path(path)
+    tmp_path = path.with_name(path.name + "." + uuid.uuid4().hex)
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    with os.fdopen(fd, "wb") as o:
+        o.write(data)
+    os.replace(tmp_path, path)
+
+
+async def _iter_flashlights(indb):
+    """Stream the flashlights of a database, read off the event loop.
+
+    Args:
+        indb (string): Input database file
+
+    Yields:
+        flashlight.Flashlight: Flashlight records
+    """
+    loop = asyncio.get_running_loop()
+    flashlights = database.iter_flashlights(indb)
+    while True:
+        fl = await loop.run_in_executor(None, next, flashlights, None)
+        if fl is None:
+            return
+        yield fl
+
+
+async def _collect(futures, mf):
+    """Record and log the progress of queued graphs, in submission order.
+
+    Args:
+        futures (list): Graph futures and the digests of their inputs
+        mf (manifest.Manifest): Output directory manifest
+    """
+    for idx, (future, content_digest) in enumerate(futures):
+        path = await future
+        mf.record(path, content_digest)
+        logging.info("[" + str(idx + 1) + "/" + str(len(futures)) + "] " + str(path))
+
+
+async def batch(indb, outdir, queue, mf, fmt="svg", rasterize_background=False):
+    """Queue the chromatic graphs of all measures from a database.
+
+    Measures that share a graph are rendered once, see
+    manifest.Manifest.claim.
+
+    Args:
+        indb (string): Input database file
+        outdir (string): Output directory
+        queue (RenderQueue): Render queue
+        mf (manifest.Manifest): Output directory manifest, saved by the caller
+        fmt (string): Image format, see spec.FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+    """
+    futures = []
+    async for fl in _iter_flashlights(indb):
+        fl_path = pathlib.Path(outdir, fl.model)
+        pathlib.Path.mkdir(fl_path, exist_ok=True)
+
+        for mod, level, x, y in fl.table.rows(spec.MEASURE_ROW):
+            rec_fname = fl.model + "_" + mod + "_" + level
+            rec_file = pathlib.Path(fl_path, rec_fname + "." + fmt)
+            if not mf.claim(rec_file):
+                continue
+            rec_digest = spec.graph_digest(
+                [x, y, rec_fname, "spec"],
+                rasterize_background,
+            )
+            if mf.is_current(rec_file, rec_digest):
+                continue
+            kwargs = {
+                "x": x,
+                "y": y,
+                "fl": rec_fname,
+                "fmt": fmt,
+                "rasterize_background": rasterize_background,
+            }
+            future = await queue.submit(spec.render_chroma_spec, kwargs, rec_file)
+            futures.append((future, rec_digest))
+    await _collect(futures, mf)
+
+
+async def evol(indb, outdir, queue, mf, fmt="svg", rasterize_background=False):
+    """Queue the evolution graphs of all models from a database.
+
+    Flashlights of the same model share a graph, see manifest.Manifest.claim.
+
+    Args:
+        indb (string): Input database file
+        outdir (string): Output directory
+        queue (RenderQueue): Render queue
+        mf (manifest.Manifest): Output directory manifest, saved by the caller
+        fmt (string): Image format, see spec.FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+    """
+    futures = []
+    async for fl in _iter_flashlights(indb):
+        fl_path = pathlib.Path(outdir, fl.model)
+        pathlib.Path.mkdir(fl_path, exist_ok=True)
+        fl_file = pathlib.Path(fl_path, fl.model + "." + fmt)
+        if not mf.claim(fl_file):
+            continue
+
+        fl_dict = spec.evol_points(fl)
+        fl_digest = spec.graph_digest([fl_dict, fl.model, "evol"], rasterize_background)
+        if mf.is_current(fl_file, fl_digest):
+            continue
+        kwargs = {
+            "points": fl_dict,
+            "model": fl.model,
+            "fmt": fmt,
+            "rasterize_background": rasterize_background,
+        }
+        future = await queue.submit(spec.render_chroma_evol, kwargs, fl_file)
+        futures.append((future, fl_digest))
+    await _collect(futures, mf)
+
+
+async def _run(indb, outdir, jobs, force, maxsize, settings):
+    """Batch and evol graphs on one event loop, see run.
+
+    Args:
+        indb (string): Input database file
+        outdir (string): Output directory
+        jobs (int): Number of rendering processes, 0 for one per CPU
+        force (bool): Flag to regenerate up to date graphs
+        maxsize (int): Number of pending jobs before producers wait
+        settings (dict): Graph settings, fmt and rasterize_background
+    """
+    from . import background
+
+    # Warm the background caches once, forked workers inherit them.
+    background.load_background(background.SPEC_SIZE, spectral_locus_labels=[])
+    background.load_background(background.EVOL_SIZE)
+
+    mf = manifest.Manifest(outdir, force=force)
+    workers = jobs or os.cpu_count()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=spec._init_worker,
+        ) as executor:
+            async with RenderQueue(executor, workers, maxsize) as queue:
+                await asyncio.gather(
+                    batch(indb, outdir, queue, mf, **settings),
+                    evol(indb, outdir, queue, mf, **settings),
+                )
+    finally:
+        mf.save()
+
+
+def run(
+    indb,
+    outdir,
+    jobs=1,
+    force=False,
+    maxsize=QUEUE_SIZE,
+    fmt="svg",
+    rasterize_background=False,
+):
+    """Chromatic and evolution graphs of a database, through one pipeline.
+
+    Database reads, renders and file writes overlap: flashlights are read
+    from a thread, graphs are rendered by a process pool and written from a
+    thread. Graphs that are up to date with the output directory manifest
+    are skipped.
+
+    Args:
+        indb (string): Input database file
+        outdir (string): Output directory
+        jobs (int): Number of rendering processes, 0 for one per CPU
+        force (bool): Flag to regenerate up to date graphs
+        maxsize (int): Number of pending jobs before producers wait
+        fmt (string): Image format, see spec.FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+
+    Example:
+        >>> from chroma_spec import pipeline
+        >>> pipeline.run("data/sotc.json", "/tmp")
+    """
+    settings = {"fmt": fmt, "rasterize_background": rasterize_background}
+    asyncio.run(_run(indb, outdir, jobs, force, maxsize, settings))
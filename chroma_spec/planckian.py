@@ -0,0 +1,224 @@
+"""chroma-spec Planckian locus."""
+
+import functools
+import logging
+import os
+import pathlib
+
+import numpy as np
+
+from . import utils
+
+TABLE_START = 1000
+TABLE_END = 100000
+TABLE_SPACING = 1.001
+TABLE_VERSION = "0.0.1"
+# Second radiation constant, colour-science value.
+C2 = 1.4388e-2
+PARABOLIC_DUV = 0.002
+
+
+def _table_temperatures(start, end, spacing):
+    """Temperatures of a Planckian table, the colour-science Ohno 2013 way.
+
+    The spacing multiplier is slightly decreased for higher temperatures.
+
+    Args:
+        start (float): Lowest temperature in kelvin
+        end (float): Highest temperature in kelvin
+        spacing (float): Temperature multiplier between entries
+
+    Returns:
+        numpy.ndarray: Increasing temperatures
+    """
+    temperatures = [start, start + 1]
+    next_t = start + 1
+    next_spacing = spacing
+    while next_t * next_spacing < end:
+        next_t = next_t * next_spacing
+        temperatures.append(next_t)
+        d = (next_t - TABLE_START) / (TABLE_END - TABLE_START)
+        d = min(max(d, 0), 1)
+        next_spacing = spacing * (1 - d) + (1 + (spacing - 1) / 10) * d
+    temperatures.extend([end - 1, end])
+    return np.array(temperatures, dtype=np.float64)
+
+
+def _build_table(start, end, spacing):
+    """Integrate Planck's law against the CIE 1931 2 degree observer.
+
+    Args:
+        start (float): Lowest temperature in kelvin
+        end (float): Highest temperature in kelvin
+        spacing (float): Temperature multiplier between entries
+
+    Returns:
+        numpy.ndarray: (T, u, v) rows, CIE 1960 UCS coordinates
+    """
+    import colour
+
+    cmfs = (
+        colour.MSDS_CMFS["CIE 1931 2 Degree Standard Observer"]
+        .copy()
+        .align(colour.SPECTRAL_SHAPE_DEFAULT)
+    )
+    temperatures = _table_temperatures(start, end, spacing)
+    wavelengths = cmfs.wavelengths[:, np.newaxis] * 1e-9
+
+    # Radiation constants common to every wavelength cancel out.
+    radiance = 1 / np.expm1(C2 / (wavelengths * temperatures)) / wavelengths**5
+    xyz = np.dot(np.transpose(cmfs.values), radiance)
+    d = xyz[0] + 15 * xyz[1] + 3 * xyz[2]
+    return np.stack([temperatures, 4 * xyz[0] / d, 6 * xyz[1] / d], axis=1)
+
+
+@functools.lru_cache(maxsize=None)
+def planckian_table(start=TABLE_START, end=TABLE_END, spacing=TABLE_SPACING):
+    """Planckian table, from memory, disk or freshly integrated.
+
+    Args:
+        start (float): Lowest temperature in kelvin
+        end (float): Highest temperature in kelvin
+        spacing (float): Temperature multiplier between entries
+
+    Returns:
+        numpy.ndarray: Read-only (T, u, v) rows, CIE 1960 UCS coordinates
+
+    Example:
+        >>> from chroma_spec import planckian
+        >>> planckian.planckian_table()[0].round(4).tolist()
+        [1000.0, 0.448, 0.3546]
+    """
+    name = "_".join(("planckian", TABLE_VERSION, str(start), str(end), str(spacing)))
+    path = pathlib.Path(utils.cache_dir(), name + ".npy")
+    try:
+        table = np.load(path)
+        logging.debug("Planckian table loaded from " + str(path))
+    except (OSError, ValueError):
+        table = _build_table(start, end, spacing)
+        try:
+            pathlib.Path.mkdir(path.parent, parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + "." + str(os.getpid()))
+            with open(tmp_path, "wb") as o:
+                np.save(o, table)
+            os.replace(tmp_path, path)
+            logging.debug("Planckian table cached in " + str(path))
+        except OSError as err:
+            logging.warning("Planckian table cache disabled: " + str(err))
+
+    table.flags.writeable = False
+    return table
+
+
+def _nearest(table, u, v):
+    """Index of the table entry nearest to each point.
+
+    Distances to the locus decrease then increase along the table, for
+    points within a reasonable DUV, the turning point is found by a
+    vectorized bisection: log2 of the table size steps instead of a full
+    distance matrix. Whether the distance rises after an entry is linear
+    in the point coordinates, each step gathers three precomputed
+    differences of the table, about 0.15s for a million points.
+
+    Args:
+        table (numpy.ndarray): Planckian table
+        u (numpy.ndarray): CIE 1960 UCS coordinates u
+        v (numpy.ndarray): CIE 1960 UCS coordinates v
+
+    Returns:
+        numpy.ndarray: Table indices
+    """
+    table_u = table[:, 1]
+    table_v = table[:, 2]
+    # Squared distances of entries i + 1 and i differ by
+    # |t(i + 1)|^2 - |t(i)|^2 - 2 p.(t(i + 1) - t(i)), for a point p.
+    step_u = 2 * np.diff(table_u)
+    step_v = 2 * np.diff(table_v)
+    step_norm = np.diff(table_u * table_u + table_v * table_v)
+
+    index = np.zeros(u.shape, dtype=np.intp)
+    size = len(table)
+    while size > 1:
+        half = size // 2
+        mid = index + (half - 1)
+        falling = u * step_u.take(mid) + v * step_v.take(mid) > step_norm.take(mid)
+        index += half * falling
+        size -= half
+    return index
+
+
+def uv_to_CCT_DUV_Ohno2013(u, v):
+    """CIE 1960 UCS to CCT and DUV (Ohno 2013).
+
+    Triangular solution near the locus, parabolic one beyond 0.002 DUV,
+    over a precomputed Planckian table from 1000K to 100000K. Results match
+    colour-science ``uv_to_CCT_Ohno2013`` with its default table.
+
+    Args:
+        u (array_like): CIE 1960 UCS coordinates u
+        v (array_like): CIE 1960 UCS coordinates v
+
+    Returns:
+        tuple: (cct, duv) arrays
+
+    Example:
+        >>> from chroma_spec import planckian
+        >>> cct, duv = planckian.uv_to_CCT_DUV_Ohno2013([0.1978], [0.3122])
+        >>> cct.round(2).tolist(), duv.round(6).tolist()
+        ([6507.47], [0.003223])
+    """
+    table = planckian_table()
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    index = np.clip(_nearest(table, u, v), 1, len(table) - 2)
+
+    tp, up, vp = table[index - 1, 0], table[index - 1, 1], table[index - 1, 2]
+    ti, ui, vi = table[index, 0], table[index, 1], table[index, 2]
+    tn, un, vn = table[index + 1, 0], table[index + 1, 1], table[index + 1, 2]
+    dp = np.hypot(up - u, vp - v)
+    di = np.hypot(ui - u, vi - v)
+    dn = np.hypot(un - u, vn - v)
+
+    # Triangular solution.
+    ln = np.hypot(un - up, vn - vp)
+    x = (dp**2 - dn**2 + ln**2) / (2 * ln)
+    cct_t = tp + (tn - tp) * (x / ln)
+    sign = np.sign(v - (vp + (vn - vp) * (x / ln)))
+    duv_t = np.sqrt(np.maximum(dp**2 - x**2, 0)) * sign
+
+    # Parabolic solution.
+    xx = (tn - ti) * (tp - tn) * (ti - tp)
+    a = (tp * (dn - di) + ti * (dp - dn) + tn * (di - dp)) / xx
+    b = -(tp**2 * (dn - di) + ti**2 * (dp - dn) + tn**2 * (di - dp)) / xx
+    c = (
+        -(
+            dp * (tn - ti) * ti * tn
+            + di * (tp - tn) * tp * tn
+            + dn * (ti - tp) * tp * ti
+        )
+        / xx
+    )
+    cct_p = -b / (2 * a)
+    duv_p = (a * cct_p**2 + b * cct_p + c) * sign
+
+    parabolic = np.abs(duv_t) >= PARABOLIC_DUV
+    return np.where(parabolic, cct_p, cct_t), np.where(parabolic, duv_p, duv_t)
+
+
+def xy_to_CCT_DUV_Ohno2013(x, y):
+    """CIE 1931 to CCT and DUV (Ohno 2013).
+
+    Args:
+        x (array_like): CIE 1931 chromacity coordinates x
+        y (array_like): CIE 1931 chromacity coordinates y
+
+    Returns:
+        tuple: (cct, duv) arrays
+
+    Example:
+        >>> from chroma_spec import planckian
+        >>> cct, duv = planckian.xy_to_CCT_DUV_Ohno2013([0.3604], [0.3339])
+        >>> cct.round(2).tolist(), duv.round(4).tolist()
+        ([4310.39], [-0.0151])
+    """
+    return uv_to_CCT_DUV_Ohno2013(*utils.xy_to_uv_array(x, y))
@@ -0,0 +1,269 @@
+"""chroma-spec profiling."""
+
+import contextlib
+import cProfile
+import json
+import logging
+import sys
+import time
+from importlib import metadata
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Windows, memory high-water marks are not reported.
+    resource = None
+
+PROFILE_VERSION = "0.0.1"
+PERCENTILES = (50, 90, 99)
+
+_enabled = False
+_timings = dict()
+_memory = dict()
+
+
+def enable(enabled=True):
+    """Start or stop recording stages, everything recorded is kept.
+
+    Args:
+        enabled (bool): Flag to record stages
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    """Whether stages are recorded.
+
+    Returns:
+        bool: True while recording
+    """
+    return _enabled
+
+
+def _max_rss(children=False):
+    """Memory high-water mark of this process, or of its children.
+
+    Args:
+        children (bool): Flag to measure the terminated child processes
+
+    Returns:
+        int: Maximum resident set size in KiB, None if not available
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF,
+    )
+    # macOS reports bytes, Linux and the BSDs KiB.
+    if sys.platform == "darwin":
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a stage, along with the memory high-water mark once done.
+
+    Nothing is recorded unless enabled, the cost is then a flag check.
+
+    Args:
+        name (string): Stage name
+
+    Yields:
+        None: Stage body
+
+    Example:
+        >>> from chroma_spec import profiling
+        >>> with profiling.stage("chroma"):
+        ...     pass
+    """
+    if _enabled is False:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.setdefault(name, []).append(time.perf_counter() - start)
+        rss = _max_rss()
+        if rss is not None:
+            _memory[name] = max(_memory.get(name, 0), rss)
+
+
+def iterate(name, iterable):
+    """Time the production of every item of an iterable, as a stage.
+
+    The last read, which finds the iterable exhausted, is counted too.
+
+    Args:
+        name (string): Stage name
+        iterable (iterable): Items, read lazily
+
+    Yields:
+        object: Items of the iterable
+    """
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
+
+
+def collect():
+    """Stages recorded so far, then forgotten.
+
+    Returns:
+        dict: timings and memory, per stage
+    """
+    state = {"timings": dict(_timings), "memory": dict(_memory)}
+    _timings.clear()
+    _memory.clear()
+    return state
+
+
+def merge(state):
+    """Add stages recorded elsewhere, by a worker process.
+
+    Args:
+        state (dict): Recorded stages, see collect
+    """
+    for name, timings in state["timings"].items():
+        _timings.setdefault(name, []).extend(timings)
+    for name, memory in state["memory"].items():
+        _memory[name] = max(_memory.get(name, 0), memory)
+
+
+def remote(func, enabled, arg):
+    """Worker entry point, call a function and return its recorded stages.
+
+    Args:
+        func (callable): Function of one argument
+        enabled (bool): Flag to record stages
+        arg (object): Function argument
+
+    Returns:
+        tuple: Function result and its recorded stages, see collect
+    """
+    enable(enabled)
+    collect()
+    result = func(arg)
+    return result, collect()
+
+
+def merged(results):
+    """Unwrap remote results, merging their stages on the way.
+
+    Args:
+        results (iterable): remote results
+
+    Yields:
+        object: Function results
+    """
+    for result, state in results:
+        merge(state)
+        yield result
+
+
+def _version(name):
+    """Version of an installed distribution.
+
+    Args:
+        name (string): Distribution name
+
+    Returns:
+        string: Version, None when running from a source tree
+    """
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def report(wall=None):
+    """Summary of the recorded stages.
+
+    Args:
+        wall (float, optional): Wall-clock time of the whole run
+
+    Returns:
+        dict: Timings in seconds and memory high-water marks in KiB, None
+        where the platform does not report them
+
+    Example:
+        >>> from chroma_spec import profiling
+        >>> sorted(profiling.report())
+        ['max_rss_kib', 'max_rss_kib_children', 'stages', 'version', 'versions', 'wall']
+    """
+    stages = dict()
+    for name, timings in sorted(_timings.items()):
+        timings = np.asarray(timings)
+        stages[name] = {
+            "count": len(timings),
+            "total": float(timings.sum()),
+            "mean": float(timings.mean()),
+            "max": float(timings.max()),
+            "max_rss_kib": _memory.get(name),
+        }
+        values = np.percentile(timings, PERCENTILES).tolist()
+        for idx, percentile in enumerate(PERCENTILES):
+            stages[name]["p" + str(percentile)] = values[idx]
+
+    return {
+        "version": PROFILE_VERSION,
+        "versions": {
+            name: _version(name)
+            for name in ("chroma-spec", "colour-science", "matplotlib", "numpy")
+        },
+        "wall": wall,
+        "stages": stages,
+        "max_rss_kib": _max_rss(),
+        "max_rss_kib_children": _max_rss(children=True),
+    }
+
+
+@contextlib.contextmanager
+def profile(outfile, cprofile_file=None):
+    """Record the stages of a run, then write a JSON report.
+
+    Args:
+        outfile (string): JSON report file, "-" for stderr
+        cprofile_file (string, optional): cProfile statistics file, for pstats
+
+    Yields:
+        None: Profiled run
+
+    Example:
+        >>> from chroma_spec import profiling, utils
+        >>> with profiling.profile("/tmp/profile.json", "/tmp/profile.prof"):
+        ...     cct = utils.xy_to_CCT(0.3604, 0.3339)
+    """
+    collect()
+    enable()
+    profiler = None
+    if cprofile_file is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_file)
+        enable(False)
+
+        content = json.dumps(report(wall), indent=2)
+        if outfile == "-":
+            sys.stderr.write(content + "\n")
+        else:
+            with open(outfile, "w") as o:
+                o.write(content + "\n")
+        logging.debug("Profile --> " + str(outfile))
+        collect()
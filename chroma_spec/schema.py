@@ -0,0 +1,288 @@
+"""chroma-spec schema."""
+
+import functools
+import json
+import pathlib
+
+MAX_REPORTED_ERRORS = 20
+ANNOTATIONS = ("$schema", "id", "title", "description", "default")
+TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+
+def _package_file(name):
+    """Path of a data file shipped with the package.
+
+    Args:
+        name (string): File name, in the package directory
+
+    Returns:
+        string: File path
+    """
+    try:
+        from importlib.resources import files
+    except ImportError:  # pragma: no cover
+        # Python 3.8, the package is installed as plain files.
+        return str(pathlib.Path(__file__).with_name(name))
+    return str(files(__package__).joinpath(name))
+
+
+# SOTC schema, shipped with the package: commands run from any directory.
+SCHEMA = _package_file("sotc.schema")
+
+
+class SchemaError(ValueError):
+    """Records of a database that do not match its schema.
+
+    Every error of the database is kept in errors, the message only lists
+    the first MAX_REPORTED_ERRORS of them.
+    """
+
+    def __init__(self, source, errors):
+        """Keep validation errors.
+
+        Args:
+            source (string): Validated database
+            errors (list): Error messages, with the path of the invalid value
+        """
+        super(SchemaError, self).__init__(source, errors)
+        self.source = source
+        self.errors = errors
+
+    def __str__(self):
+        """Error count, then the first errors."""
+        lines = self.errors[:MAX_REPORTED_ERRORS]
+        if len(self.errors) > MAX_REPORTED_ERRORS:
+            lines = lines + ["... " + str(len(self.errors) - len(lines)) + " more"]
+        return (
+            str(self.source)
+            + ": "
+            + str(len(self.errors))
+            + " schema errors\n  "
+            + "\n  ".join(lines)
+        )
+
+
+def _check_type(names):
+    """Compile a type keyword.
+
+    Args:
+        names (object): Type name, or list of type names
+
+    Returns:
+        callable: Check of a value, see compile_schema
+    """
+    if isinstance(names, str):
+        names = [names]
+    if "any" in names:
+        return None
+
+    types = tuple(t for name in names for t in TYPES[name])
+    # bool is an int for Python, not for JSON.
+    allow_bool = "boolean" in names
+    message = " is not of type " + ", ".join(repr(name) for name in names)
+
+    def check(value, path, errors):
+        if not isinstance(value, types) or (
+            isinstance(value, bool) and allow_bool is False
+        ):
+            errors.append(path + ": " + repr(value) + message)
+            return False
+        return True
+
+    return check
+
+
+def _check_enum(values):
+    """Compile an enum keyword.
+
+    Args:
+        values (list): Allowed values
+
+    Returns:
+        callable: Check of a value, see compile_schema
+    """
+    allowed = list(values)
+    message = " is not one of " + repr(allowed)
+
+    def check(value, path, errors):
+        if value not in allowed:
+            errors.append(path + ": " + repr(value) + message)
+        return True
+
+    return check
+
+
+def _check_bounds(schema):
+    """Compile the minimum and maximum keywords of a number.
+
+    Args:
+        schema (dict): Number schema
+
+    Returns:
+        callable: Check of a value, see compile_schema
+    """
+    low = schema.get("minimum", float("-inf"))
+    high = schema.get("maximum", float("inf"))
+    exclusive_low = schema.get("exclusiveMinimum", False)
+    exclusive_high = schema.get("exclusiveMaximum", False)
+
+    def check(value, path, errors):
+        if not isinstance(value, (int, float)):
+            return True
+        if value < low or (exclusive_low and value == low):
+            errors.append(path + ": " + repr(value) + " is less than " + repr(low))
+        if value > high or (exclusive_high and value == high):
+            errors.append(path + ": " + repr(value) + " is more than " + repr(high))
+        return True
+
+    return check
+
+
+def _check_properties(schema):
+    """Compile the properties and additionalProperties keywords of an object.
+
+    Args:
+        schema (dict): Object schema
+
+    Returns:
+        callable: Check of a value, see compile_schema
+    """
+    properties = [
+        (name, "." + name, bool(sub.get("required", False)), compile_schema(sub))
+        for name, sub in schema.get("properties", dict()).items()
+    ]
+    closed = schema.get("additionalProperties", True) is False
+    names = set(schema.get("properties", dict()))
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            return True
+        for name, suffix, required, check_property in properties:
+            if name in value:
+                check_property(value[name], path + suffix, errors)
+            elif required:
+                errors.append(path + ": " + repr(name) + " is a required property")
+        if closed:
+            for name in sorted(set(value) - names):
+                errors.append(path + ": unexpected property " + repr(name))
+        return True
+
+    return check
+
+
+def _check_items(items):
+    """Compile the items keyword of an array.
+
+    Args:
+        items (dict): Schema of every item
+
+    Returns:
+        callable: Check of a value, see compile_schema
+    """
+    check_item = compile_schema(items)
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            return True
+        for idx, item in enumerate(value):
+            check_item(item, path + "[" + str(idx) + "]", errors)
+        return True
+
+    return check
+
+
+KEYWORDS = {
+    "type": lambda schema: _check_type(schema["type"]),
+    "enum": lambda schema: _check_enum(schema["enum"]),
+    "minimum": _check_bounds,
+    "maximum": _check_bounds,
+    "exclusiveMinimum": None,
+    "exclusiveMaximum": None,
+    "properties": _check_properties,
+    "additionalProperties": _check_properties,
+    "items": lambda schema: _check_items(schema["items"]),
+    "required": None,
+}
+
+
+def compile_schema(schema):
+    """Compile a JSON schema into a validation function.
+
+    Only the Draft 3 keywords of SOTC schemas are supported: type, enum,
+    minimum, maximum, properties (with required), additionalProperties and
+    items. The schema is walked once, validating a value then runs a fixed
+    list of checks per level, with no keyword lookup.
+
+    Args:
+        schema (dict): JSON schema
+
+    Returns:
+        callable: Validation of a value, errors are appended to a list
+
+    Raises:
+        ValueError: Unsupported schema keyword
+
+    Example:
+        >>> from chroma_spec import schema
+        >>> check = schema.compile_schema({"type": "number", "minimum": 0})
+        >>> errors = []
+        >>> check(-1, "lux", errors)
+        >>> errors
+        ['lux: -1 is less than 0']
+    """
+    factories = []
+    # Type first, type errors make the other checks irrelevant.
+    for keyword in sorted(schema, key=lambda k: k != "type"):
+        if keyword in ANNOTATIONS:
+            continue
+        if keyword not in KEYWORDS:
+            raise ValueError("Unsupported schema keyword: " + keyword)
+        factory = KEYWORDS[keyword]
+        if factory is not None and factory not in factories:
+            factories.append(factory)
+
+    checks = [factory(schema) for factory in factories]
+    checks = [c for c in checks if c is not None]
+
+    def validate(value, path, errors):
+        for check in checks:
+            if check(value, path, errors) is False:
+                return
+
+    return validate
+
+
+@functools.lru_cache(maxsize=None)
+def load_validators(path):
+    """Compiled validators of a SOTC schema, top-level and per flashlight.
+
+    The top-level validator expects the flashlights array to be empty,
+    flashlights are validated one at a time while streamed.
+
+    Args:
+        path (string): SOTC JSON schema file
+
+    Returns:
+        tuple: (top-level, flashlight) validation functions
+
+    Example:
+        >>> from chroma_spec import schema
+        >>> header, flashlight = schema.load_validators(schema.SCHEMA)
+        >>> errors = []
+        >>> flashlight({"id": "001"}, "flashlights[0]", errors)
+        >>> errors[0]
+        "flashlights[0]: 'model' is a required property"
+    """
+    with open(path) as j:
+        content = json.load(j)
+
+    item_schema = content["properties"]["flashlights"]["items"]
+    return compile_schema(content), compile_schema(item_schema)
@@ -0,0 +1,190 @@
+"""chroma-spec server."""
+
+import base64
+import http.server
+import io
+import json
+import logging
+import pathlib
+import socketserver
+import stat
+
+from . import spec
+
+HOST = "127.0.0.1"
+PORT = 8000
+FORMATS = {"svg": "image/svg+xml", "png": "image/png", "webp": "image/webp"}
+# Windows has no Unix sockets, render requests are served over TCP only.
+UNIX_SOCKETS = hasattr(socketserver, "UnixStreamServer")
+
+
+def render(x, y, model, zoom=False, fmt="svg"):
+    """Render a measure in memory.
+
+    Args:
+        x (float): CIE 1931 chromacity coordinate x
+        y (float): CIE 1931 chromacity coordinate y
+        model (string): Measure description
+        zoom (bool): Flag to enable zoom
+        fmt (string): Image format, see FORMATS
+
+    Returns:
+        dict: model, cct, duv, format, mime type and base64 encoded image
+
+    Example:
+        >>> from chroma_spec import server
+        >>> server.render(0.3604, 0.3339, "PL47MU")["cct"]
+        4330.655950072925
+    """
+    stream = io.BytesIO()
+    cct, duv = spec.render_chroma_spec(x, y, model, stream, zoom=zoom, fmt=fmt)
+    return {
+        "model": model,
+        "cct": cct,
+        "duv": duv,
+        "format": fmt,
+        "mime": FORMATS[fmt],
+        "image": base64.b64encode(stream.getvalue()).decode("ascii"),
+    }
+
+
+class RenderHandler(http.server.BaseHTTPRequestHandler):
+    """Render requests handler.
+
+    ``POST /render`` takes a JSON object with x, y and model, optionally
+    zoom (a boolean) and format (svg, png or webp). The reply is the JSON
+    object of render, or an error message: 400 for invalid requests and
+    measures that cannot be rendered, 500 for any other render error.
+    """
+
+    def do_POST(self):  # noqa: N802
+        """Render a measure."""
+        if self.path != "/render":
+            self._reply(404, {"error": "Not found: " + self.path})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            query = json.loads(self.rfile.read(length))
+            x, y = float(query["x"]), float(query["y"])
+            model = str(query["model"])
+            zoom = query.get("zoom", False)
+            if not isinstance(zoom, bool):
+                raise TypeError("zoom must be a boolean: " + json.dumps(zoom))
+            fmt = query.get("format", "svg")
+            if fmt not in FORMATS:
+                raise ValueError("Unsupported format: " + str(fmt))
+        except (KeyError, TypeError, ValueError) as err:
+            self._reply(400, {"error": type(err).__name__ + ": " + str(err)})
+            return
+
+        try:
+            content = render(x, y, model, zoom=zoom, fmt=fmt)
+        except (ArithmeticError, ValueError) as err:
+            # Chromaticities out of the domain of the CCT approximations.
+            self._reply(400, {"error": type(err).__name__ + ": " + str(err)})
+            return
+        except Exception as err:
+            logging.exception("Render failed: " + json.dumps(query))
+            self._reply(500, {"error": type(err).__name__ + ": " + str(err)})
+            return
+        self._reply(200, content)
+
+    def _reply(self, code, content):
+        """Send a JSON response.
+
+        Args:
+            code (int): HTTP status code
+            content (dict): Response content
+        """
+        body = json.dumps(content).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Requests are logged at debug level."""
+        logging.debug(format % args)
+
+
+def _remove_socket(path):
+    """Remove a Unix socket, leaving any other kind of file alone.
+
+    Args:
+        path (string): Unix socket
+    """
+    path = pathlib.Path(path)
+    if path.exists() and stat.S_ISSOCK(path.stat().st_mode):
+        path.unlink()
+
+
+class UnixHTTPServer(
+    socketserver.UnixStreamServer if UNIX_SOCKETS else socketserver.TCPServer,
+):
+    """HTTP server over a Unix socket, removed on close, see UNIX_SOCKETS."""
+
+    def server_bind(self):
+        """Bind the socket, replacing a stale one."""
+        _remove_socket(self.server_address)
+        super(UnixHTTPServer, self).server_bind()
+
+    def server_close(self):
+        """Close and remove the socket."""
+        super(UnixHTTPServer, self).server_close()
+        _remove_socket(self.server_address)
+
+
+def make_server(host=HOST, port=PORT, socket_path=None):
+    """Render server, warmed up.
+
+    The rendering libraries are imported and the background is cached before
+    the first request, every request then only draws its measure. Requests
+    are rendered one at a time: plotting styles are process-wide.
+
+    Args:
+        host (string): TCP host
+        port (int): TCP port, 0 for any free port
+        socket_path (string, optional): Unix socket, instead of TCP
+
+    Returns:
+        socketserver.BaseServer: Render server
+
+    Raises:
+        ValueError: Unix socket without Unix sockets support
+
+    Example:
+        >>> from chroma_spec import server
+        >>> with server.make_server(port=0) as httpd:
+        ...     httpd.server_address[0]
+        '127.0.0.1'
+    """
+    if socket_path is not None and not UNIX_SOCKETS:
+        raise ValueError("Unix sockets are not supported on this platform")
+
+    from colour.plotting import render  # noqa: F401
+
+    from . import background
+
+    background.load_background(background.SPEC_SIZE, spectral_locus_labels=[])
+
+    if socket_path is not None:
+        return UnixHTTPServer(str(socket_path), RenderHandler)
+    return http.server.HTTPServer((host, port), RenderHandler)
+
+
+def serve(host=HOST, port=PORT, socket_path=None):
+    """Serve render requests until interrupted.
+
+    Args:
+        host (string): TCP host
+        port (int): TCP port, 0 for any free port
+        socket_path (string, optional): Unix socket, instead of TCP
+    """
+    with make_server(host, port, socket_path) as httpd:
+        logging.info("Serving on " + str(httpd.server_address))
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Server stopped")
@@ -0,0 +1,135 @@
+"""chroma-spec sharding."""
+
+import hashlib
+import logging
+import os
+import pathlib
+import shutil
+
+from . import manifest
+
+
+def parse_shard(text):
+    """Parse a shard specification.
+
+    Args:
+        text (string): Shard as "i/N", 1 <= i <= N
+
+    Returns:
+        tuple: (index, count) integers
+
+    Raises:
+        ValueError: Invalid shard specification
+
+    Example:
+        >>> from chroma_spec import sharding
+        >>> sharding.parse_shard("2/8")
+        (2, 8)
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError("Shard must be i/N: " + repr(text)) from None
+    if not 1 <= index <= count:
+        raise ValueError("Shard index must be within 1 and N: " + repr(text))
+    return index, count
+
+
+def shard_of(model, count):
+    """Shard of a flashlight, from a stable hash of its model.
+
+    Graphs are keyed by model, flashlights of the same model share an
+    output directory: they go to the same shard, which alone writes it.
+    The hash does not depend on the process, the machine or the database
+    order: every node computes the same partition without coordination.
+
+    Args:
+        model (string): Flashlight model
+        count (int): Number of shards
+
+    Returns:
+        int: Shard index, 1 <= index <= count
+
+    Example:
+        >>> from chroma_spec import sharding
+        >>> sharding.shard_of("SP10Pro", 3)
+        2
+    """
+    key = hashlib.sha256(model.encode()).digest()
+    return int.from_bytes(key[:8], "big") % count + 1
+
+
+def select(flashlights, shard=None):
+    """Flashlights of a shard.
+
+    Args:
+        flashlights (iterable): Flashlight records
+        shard (tuple, optional): (index, count), see parse_shard, all if None
+
+    Yields:
+        flashlight.Flashlight: Flashlight records of the shard
+    """
+    if shard is None:
+        yield from flashlights
+        return
+
+    index, count = shard
+    for fl in flashlights:
+        if shard_of(fl.model, count) == index:
+            yield fl
+
+
+def merge(shard_dirs, outdir):
+    """Merge the output directories of shards into a single one.
+
+    Graphs listed in the shard manifests are copied along with their
+    digests into the output directory manifest. Graphs already up to date
+    in the output directory are left untouched, merging is incremental.
+
+    Args:
+        shard_dirs (list): Shard output directories
+        outdir (string): Output directory
+
+    Returns:
+        int: Number of copied graphs
+
+    Raises:
+        ValueError: Same graph from different inputs in two shards
+
+    Example:
+        >>> from chroma_spec import sharding
+        >>> sharding.merge([], "/tmp")
+        0
+    """
+    mf = manifest.Manifest(outdir)
+    sources = dict()
+    copied = 0
+    try:
+        for shard_dir in shard_dirs:
+            for key, content_digest in manifest.Manifest(shard_dir).items():
+                source = pathlib.Path(shard_dir, key)
+                if not source.exists():
+                    logging.warning("Missing shard graph: " + str(source))
+                    continue
+                previous = sources.setdefault(key, (content_digest, source))
+                if previous[0] != content_digest:
+                    raise ValueError(
+                        "Conflicting shard graphs: "
+                        + str(previous[1])
+                        + ", "
+                        + str(source),
+                    )
+
+                target = pathlib.Path(outdir, key)
+                if mf.is_current(target, content_digest):
+                    continue
+                pathlib.Path.mkdir(target.parent, parents=True, exist_ok=True)
+                tmp_path = target.with_name(target.name + "." + str(os.getpid()))
+                shutil.copyfile(source, tmp_path)
+                os.replace(tmp_path, target)
+                mf.record(target, content_digest)
+                copied += 1
+                logging.info("Merged " + str(source) + " --> " + str(target))
+    finally:
+        mf.save()
+    return copied
@@ -1,22 +1,53 @@
 """chroma-spec."""
 
-import json
+import concurrent.futures
+import contextlib
+import csv
+import functools
 import logging
 import pathlib
-
-import imageio
-import matplotlib.pyplot as plt
-from colour.plotting import plot_planckian_locus_in_chromaticity_diagram_CIE1931, render
-
-from . import utils
-
-
-def stat_chroma_spec(x, y):
+import sys
+
+import numpy as np
+
+from . import database, drift, index, manifest, profiling, sharding, utils
+from .measures import COLUMNS
+
+FORMATS = ("svg", "png", "webp")
+# Measure columns of a graph: description then CIE 1931 x, y.
+MEASURE_ROW = ("mod", "level", "ciex", "ciey")
+MAP_COLORS = ("lux", "ra", "status")
+MAP_BBOX = [0.3, 0.75, 0.25, 0.65]
+MAP_MARGIN = 0.02
+MAP_MARKER_SIZE = 4
+MAP_GRIDSIZE = 100
+CSV_FORMATS = {
+    "ciex": "%.6f",
+    "ciey": "%.6f",
+    "lux": "%g",
+    "ra": "%g",
+    "cct": "%.3f",
+    "duv": "%.8f",
+    "up": "%.8f",
+    "vp": "%.8f",
+    "duvp": "%.8f",
+    "step": "%.8f",
+    "days": "%g",
+    "shift": "%.8f",
+    "rate": "%.8f",
+}
+
+# colour, matplotlib and imageio take seconds to import, they are only
+# imported once a graph is actually rendered.
+
+
+def stat_chroma_spec(x, y, method="McCamy 1992"):
     """Compute a chromatic properties.
 
     Args:
         x (float): CIE 1931 chromacity coordinate x
         y (float): CIE 1931 chromacity coordinate x
+        method (string): CCT method, see utils.CCT_METHODS
 
     Returns:
         tuple (cct, duv): cct and duv numerical values
@@ -26,18 +57,31 @@ def stat_chroma_spec(x, y):
         >>> spec.stat_chroma_spec(0.3604, 0.3339)
         (4330.655950072925, -0.015143925038518163)
     """
-    cct = utils.xy_to_CCT(x, y)
-    duv = utils.xy_to_DUV(x, y)
+    with profiling.stage("chroma"):
+        cct, duv, _, _ = utils.xy_to_chroma(x, y, method)
 
-    cct_str = "%4.0f" % cct
-    duv_str = "%.4f" % duv
     logging.info(
-        "[" + str(x) + "; " + str(y) + "] --> CCT: " + cct_str + "K - DUV: " + duv_str,
+        "["
+        + str(x)
+        + "; "
+        + str(y)
+        + "] --> CCT: "
+        + "%4.0f" % cct
+        + "K - DUV: "
+        + "%.4f" % duv,
     )
     return cct, duv
 
 
-def plot_chroma_spec(x, y, fl, outdir, zoom=False):
+def plot_chroma_spec(
+    x,
+    y,
+    fl,
+    outdir,
+    zoom=False,
+    fmt="svg",
+    rasterize_background=False,
+):
     """Generate a chromatic graph.
 
     Args:
@@ -46,54 +90,98 @@ def plot_chroma_spec(x, y, fl, outdir, zoom=False):
         fl (string): Measure description
         outdir (string): Output directory where the graph will be saved
         zoom (bool): Flag to enable zoom
+        fmt (string): Image format, see FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
 
     Example:
         >>> from chroma_spec import spec
-        >>> spec.plot_chroma_spec(0.3604, 0.3339, "PL47MU", "/tmp")
+        >>> spec.plot_chroma_spec(0.3604, 0.3339, "PL47MU", "/tmp", fmt="webp")
     """
-    xy = [x, y]
+    render_chroma_spec(
+        x,
+        y,
+        fl,
+        pathlib.Path(outdir, fl + "." + fmt),
+        zoom=zoom,
+        fmt=fmt,
+        rasterize_background=rasterize_background,
+    )
 
-    cct, duv = stat_chroma_spec(x, y)
 
-    cct_str = "%4.0f" % cct
-    duv_str = "%.4f" % duv
+def render_chroma_spec(
+    x,
+    y,
+    fl,
+    output,
+    zoom=False,
+    fmt="svg",
+    rasterize_background=False,
+):
+    """Render a chromatic graph into a file or a binary stream.
 
-    label = (
-        fl
-        + " ["
-        + str(x)
-        + "; "
-        + str(y)
-        + "]\nCCT: "
-        + cct_str
-        + "K\nDUV: "
-        + duv_str
-        + "\n"
-    )
+    Raster formats are drawn by Agg. Vector graphs may embed the diagram
+    background as an image, only the measure and text stay vector: the
+    spectral locus fill is by far the largest part of an svg.
+
+    Args:
+        x (float): CIE 1931 chromacity coordinate x
+        y (float): CIE 1931 chromacity coordinate x
+        fl (string): Measure description
+        output (string): Output file or binary stream
+        zoom (bool): Flag to enable zoom
+        fmt (string): Image format, see FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+
+    Returns:
+        tuple (cct, duv): cct and duv numerical values
+
+    Example:
+        >>> import io
+        >>> from chroma_spec import spec
+        >>> spec.render_chroma_spec(0.3604, 0.3339, "PL47MU", io.BytesIO())
+        (4330.655950072925, -0.015143925038518163)
+    """
+    xy = [x, y]
+
+    cct, duv = stat_chroma_spec(x, y)
+    label = utils.chroma_label(fl, x, y, cct, duv)
 
     if zoom is True:
         bbox = [x - 0.08, x + 0.08, y - 0.08, y + 0.08]
     else:
         bbox = [0.3, 0.75, 0.25, 0.65]
 
-    fig = plt.figure(figsize=(1280 / 100, 1000 / 100), dpi=100)
-
-    figure, axes = plot_planckian_locus_in_chromaticity_diagram_CIE1931(
-        {fl: xy},
-        spectral_locus_labels=[],
-        standalone=False,
-        axes=fig.gca(),
-    )
-
-    render(
-        axes=axes,
-        bounding_box=bbox,
-        filename=pathlib.Path(outdir, fl + ".svg"),
-        title=label,
-    )
+    from colour.plotting import render
+
+    from . import background
+
+    with background.figure_context(spectral_locus_labels=[]) as (figure, axes):
+        if rasterize_background is True:
+            background.rasterize_background(axes)
+        with profiling.stage("plot"):
+            background.plot_points(axes, {fl: xy})
+        with profiling.stage("render"):
+            render(
+                figure=figure,
+                axes=axes,
+                standalone=False,
+                bounding_box=bbox,
+                title=label,
+            )
+        with profiling.stage("save"):
+            figure.savefig(output, format=fmt)
+    return cct, duv
 
 
-def chroma_spec_single(x, y, fl, outdir, zoom=False):
+def chroma_spec_single(
+    x,
+    y,
+    fl,
+    outdir,
+    zoom=False,
+    fmt="svg",
+    rasterize_background=False,
+):
     """Chromatic graph for a given measure.
 
     Args:
@@ -102,111 +190,780 @@ def chroma_spec_single(x, y, fl, outdir, zoom=False):
         fl (string): Measure description
         outdir (string): Output directory where the graph will be saved
         zoom (bool): Flag to enable zoom
+        fmt (string): Image format, see FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
 
     Example:
         >>> from chroma_spec import spec
         >>> spec.chroma_spec_single(0.3604, 0.3339, "PL47MU", "/tmp")
     """
-    plot_chroma_spec(x, y, fl, outdir, zoom=zoom)
+    plot_chroma_spec(x, y, fl, outdir, zoom, fmt, rasterize_background)
+
+
+def _plot_job(job):
+    """Process pool entry point of chroma_spec_batch.
+
+    Args:
+        job (tuple): plot_chroma_spec arguments
+
+    Returns:
+        pathlib.Path: Generated graph
+    """
+    plot_chroma_spec(*job)
+    return pathlib.Path(job[3], job[2] + "." + job[5])
+
+
+def graph_digest(inputs, rasterize_background=False):
+    """Digest of the inputs of a graph, see manifest.digest.
+
+    Args:
+        inputs (list): JSON serializable graph inputs
+        rasterize_background (bool): Flag of a rasterized svg background
+
+    Returns:
+        string: Hexadecimal SHA-256 digest
+    """
+    if rasterize_background is True:
+        inputs = inputs + ["rasterize_background"]
+    return manifest.digest(inputs)
 
 
-def chroma_spec_batch(indb, outdir):
+def _init_worker():
+    """Process pool initializer, per measure logs are left to the parent."""
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def chroma_spec_batch(
+    indb,
+    outdir,
+    jobs=1,
+    force=False,
+    fmt="svg",
+    rasterize_background=False,
+    shard=None,
+):
     """Chromatic graphs of all measures from a database.
 
+    Graphs that are up to date with the output directory manifest are
+    skipped. Measures that share a graph are rendered once, see
+    manifest.Manifest.claim.
+
     Args:
         indb (string): Input database file
         outdir (string): Output directory
+        jobs (int): Number of rendering processes, 0 for one per CPU
+        force (bool): Flag to regenerate up to date graphs
+        fmt (string): Image format, see FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+        shard (tuple, optional): (index, count) flashlights, see sharding
 
     Example:
         >>> from chroma_spec import spec
         >>> spec.chroma_spec_batch("data/sotc.json", "/tmp")
     """
-    with open(indb) as i:
-        fldb = json.load(i)
-
-    for fl in fldb["flashlights"]:
-        fl_path = pathlib.Path(outdir, fl["model"])
+    mf = manifest.Manifest(outdir, force=force)
+    plot_jobs = []
+    digests = []
+    flashlights = sharding.select(database.iter_flashlights(indb), shard)
+    for fl in profiling.iterate("load", flashlights):
+        fl_path = pathlib.Path(outdir, fl.model)
         pathlib.Path.mkdir(fl_path, exist_ok=True)
 
-        for rec in fl["measures"]:
-            rec_fname = fl["model"] + "_" + rec["mod"] + "_" + rec["level"]
-            plot_chroma_spec(rec["ciex"], rec["ciey"], rec_fname, fl_path)
+        for mod, level, x, y in fl.table.rows(MEASURE_ROW):
+            rec_fname = fl.model + "_" + mod + "_" + level
+            rec_file = pathlib.Path(fl_path, rec_fname + "." + fmt)
+            if not mf.claim(rec_file):
+                continue
+            with profiling.stage("digest"):
+                rec_digest = graph_digest(
+                    [x, y, rec_fname, "spec"],
+                    rasterize_background,
+                )
+                current = mf.is_current(rec_file, rec_digest)
+            if current:
+                continue
+            plot_jobs.append(
+                (
+                    x,
+                    y,
+                    rec_fname,
+                    fl_path,
+                    False,
+                    fmt,
+                    rasterize_background,
+                ),
+            )
+            digests.append(rec_digest)
+
+    if jobs == 1:
+        _collect(map(_plot_job, plot_jobs), digests, mf)
+        return
 
+    from . import background
 
-def chroma_spec_evol(indb, outdir):
+    # Warm the background cache once, forked workers inherit it.
+    background.load_background(background.SPEC_SIZE, spectral_locus_labels=[])
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs or None,
+        initializer=_init_worker,
+    ) as executor:
+        # Stages recorded by the workers are merged back.
+        job = functools.partial(profiling.remote, _plot_job, profiling.is_enabled())
+        _collect(profiling.merged(executor.map(job, plot_jobs)), digests, mf)
+
+
+def _collect(results, digests, mf):
+    """Record and log the progress of a batch, in submission order.
+
+    The manifest is saved even if the batch fails midway.
+
+    Args:
+        results (iterable): Generated graphs
+        digests (list): Digests of the graphs inputs
+        mf (manifest.Manifest): Output directory manifest
+    """
+    try:
+        for idx, path in enumerate(results):
+            mf.record(path, digests[idx])
+            logging.info(
+                "[" + str(idx + 1) + "/" + str(len(digests)) + "] " + str(path),
+            )
+    finally:
+        mf.save()
+
+
+def chroma_spec_evol(
+    indb,
+    outdir,
+    force=False,
+    fmt="svg",
+    rasterize_background=False,
+    shard=None,
+    show_drift=False,
+):
     """Chromatic graph for a given model evolution.
 
+    Graphs that are up to date with the output directory manifest are
+    skipped. Flashlights of the same model share a graph, see
+    manifest.Manifest.claim.
+
     Args:
         indb (string): Input database file
         outdir (string): Output directory
+        force (bool): Flag to regenerate up to date graphs
+        fmt (string): Image format, see FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+        shard (tuple, optional): (index, count) flashlights, see sharding
+        show_drift (bool): Flag to draw the steps between measures, see drift
 
     Example:
         >>> from chroma_spec import spec
         >>> spec.chroma_spec_evol("data/sotc.json", "/tmp")
     """
-    with open(indb) as i:
-        fldb = json.load(i)
+    mf = manifest.Manifest(outdir, force=force)
+    steps = dict()
+    if show_drift is True:
+        steps = _evol_steps(indb)
+    flashlights = sharding.select(database.iter_flashlights(indb), shard)
+    try:
+        for fl in profiling.iterate("load", flashlights):
+            fl_path = pathlib.Path(outdir, fl.model)
+            pathlib.Path.mkdir(fl_path, exist_ok=True)
+            fl_file = pathlib.Path(fl_path, fl.model + "." + fmt)
+            if not mf.claim(fl_file):
+                continue
+            with profiling.stage("digest"):
+                fl_dict = evol_points(fl)
+                inputs = [fl_dict, fl.model, "evol"]
+                if show_drift is True:
+                    inputs.append(steps.get(fl.id, []))
+                fl_digest = graph_digest(inputs, rasterize_background)
+                current = mf.is_current(fl_file, fl_digest)
+            if current:
+                continue
+
+            render_chroma_evol(
+                fl_dict,
+                fl.model,
+                fl_file,
+                fmt,
+                rasterize_background,
+                steps.get(fl.id),
+            )
+            mf.record(fl_file, fl_digest)
+    finally:
+        mf.save()
 
-    for fl in fldb["flashlights"]:
-        fl_path = pathlib.Path(outdir, fl["model"])
-        pathlib.Path.mkdir(fl_path, exist_ok=True)
-        fl_dict = dict()
-        for rec in fl["measures"]:
-            rec_xy = [rec["ciex"], rec["ciey"]]
-            rec_fl = rec["mod"] + " " + rec["level"]
-            fl_dict[rec_fl] = rec_xy
-
-        figure, axes = plot_planckian_locus_in_chromaticity_diagram_CIE1931(
-            fl_dict,
-            standalone=False,
-        )
-        render(
-            axes=axes,
-            bounding_box=[0.32, 0.42, 0.32, 0.42],
-            filename=pathlib.Path(fl_path, fl["model"] + ".svg"),
-            title=fl["model"],
-        )
+
+def evol_points(fl):
+    """Measures of a flashlight, as evol graph points.
+
+    Args:
+        fl (flashlight.Flashlight): Flashlight
+
+    Returns:
+        dict: Measure descriptions (mod and level) mapped to [x, y]
+    """
+    fl_dict = dict()
+    for mod, level, x, y in fl.table.rows(MEASURE_ROW):
+        fl_dict[mod + " " + level] = [x, y]
+    return fl_dict
+
+
+def _evol_steps(indb):
+    """Steps between the consecutive measures of every flashlight.
+
+    Args:
+        indb (string): Input database file
+
+    Returns:
+        dict: Flashlight ids mapped to [x0, y0, x1, y1, outlier] steps
+    """
+    with profiling.stage("load"):
+        columns = _measure_columns(indb)
+    with profiling.stage("drift"):
+        analysis = drift.analyze(columns)
+    rows = np.flatnonzero(analysis["previous"] >= 0)
+    previous = analysis["previous"][rows]
+    segments = np.stack(
+        [
+            columns["ciex"][previous],
+            columns["ciey"][previous],
+            columns["ciex"][rows],
+            columns["ciey"][rows],
+            analysis["outlier"][rows],
+        ],
+        axis=1,
+    ).tolist()
+
+    steps = dict()
+    for idx, fl_id in enumerate(columns["id"][rows].tolist()):
+        steps.setdefault(fl_id, []).append(segments[idx])
+    return steps
+
+
+def render_chroma_evol(
+    points,
+    model,
+    output,
+    fmt="svg",
+    rasterize_background=False,
+    steps=None,
+):
+    """Render the evolution graph of a model into a file or a binary stream.
+
+    Args:
+        points (dict): Measure descriptions mapped to CIE 1931 [x, y]
+        model (string): Flashlight model
+        output (string): Output file or binary stream
+        fmt (string): Image format, see FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+        steps (list, optional): Drift steps overlay, see background.plot_steps
+
+    Example:
+        >>> import io
+        >>> from chroma_spec import spec
+        >>> spec.render_chroma_evol({"og": [0.3604, 0.3339]}, "PL47MU", io.BytesIO())
+    """
+    from colour.plotting import render
+
+    from . import background
+
+    with background.figure_context(background.EVOL_SIZE) as (figure, axes):
+        if rasterize_background is True:
+            background.rasterize_background(axes)
+        with profiling.stage("plot"):
+            if steps:
+                background.plot_steps(axes, steps)
+            background.plot_points(axes, points)
+        with profiling.stage("render"):
+            render(
+                figure=figure,
+                axes=axes,
+                standalone=False,
+                bounding_box=[0.32, 0.42, 0.32, 0.42],
+                title=model,
+            )
+        with profiling.stage("save"):
+            figure.savefig(output, format=fmt)
+
+
+def chroma_spec_map(
+    indb,
+    outfile,
+    color_by=None,
+    density=False,
+    rasterize_background=False,
+    schema=None,
+):
+    """Collection map, every measure of a database on a single graph.
+
+    Measures are loaded as columns and drawn as one scatter collection, or
+    binned into a hexagonal density layer, without per-measure annotations:
+    the map stays fast with hundreds of thousands of measures. The image
+    format follows the output file suffix.
+
+    Args:
+        indb (string): Input database file
+        outfile (string): Output graph file
+        color_by (string, optional): Measure color, see MAP_COLORS
+        density (bool): Flag to draw a density layer instead of a scatter
+        rasterize_background (bool): Flag to rasterize the svg background
+        schema (string, optional): SOTC JSON schema file, checked while loading
+
+    Raises:
+        ValueError: Unsupported output file suffix
+
+    Example:
+        >>> from chroma_spec import spec
+        >>> spec.chroma_spec_map("data/sotc.json", "/tmp/sotc.svg", color_by="ra")
+    """
+    fmt = pathlib.Path(outfile).suffix[1:]
+    if fmt not in FORMATS:
+        raise ValueError("Unsupported graph format: " + str(outfile))
+
+    with profiling.stage("load"):
+        arrays = database.load_columns(indb, schema)
+    columns = {name: arrays[name] for name in ("ciex", "ciey", "lux", "ra")}
+    status = database.column(arrays, "fl_status")
+    columns["status"] = np.repeat(status, np.diff(arrays["fl_offsets"]))
+
+    render_chroma_map(
+        columns,
+        outfile,
+        color_by=color_by,
+        density=density,
+        fmt=fmt,
+        rasterize_background=rasterize_background,
+    )
+    logging.info(str(len(columns["ciex"])) + " measures --> " + str(outfile))
+
+
+def render_chroma_map(
+    columns,
+    output,
+    color_by=None,
+    density=False,
+    fmt="svg",
+    rasterize_background=False,
+):
+    """Render a collection map into a file or a binary stream.
+
+    The measure layer is rasterized in vector outputs, whatever the number
+    of measures, and markers are drawn without edges, which halves the
+    drawing time of large collections.
+
+    Args:
+        columns (dict): Measure columns, ciex, ciey and the color_by column
+        output (string): Output file or binary stream
+        color_by (string, optional): Measure color, see MAP_COLORS
+        density (bool): Flag to draw a density layer instead of a scatter
+        fmt (string): Image format, see FORMATS
+        rasterize_background (bool): Flag to rasterize the svg background
+
+    Example:
+        >>> import io
+        >>> from chroma_spec import spec
+        >>> columns = {"ciex": [0.3604, 0.3418], "ciey": [0.3339, 0.3518]}
+        >>> spec.render_chroma_map(columns, io.BytesIO(), density=True)
+    """
+    import matplotlib
+    from colour.plotting import CONSTANTS_COLOUR_STYLE, render
+
+    from . import background
+
+    x = np.asarray(columns["ciex"], dtype=np.float64)
+    y = np.asarray(columns["ciey"], dtype=np.float64)
+    bbox = _map_bbox(x, y)
+    with background.figure_context(spectral_locus_labels=[]) as (figure, axes):
+        if rasterize_background is True:
+            background.rasterize_background(axes)
+
+        if density is True:
+            layer = axes.hexbin(
+                x,
+                y,
+                gridsize=MAP_GRIDSIZE,
+                extent=bbox,
+                mincnt=1,
+                bins="log",
+            )
+            figure.colorbar(layer, ax=axes, label="measures")
+        elif color_by == "status":
+            categories, codes = np.unique(columns["status"], return_inverse=True)
+            layer = axes.scatter(
+                x,
+                y,
+                c=codes,
+                s=MAP_MARKER_SIZE,
+                linewidths=0,
+                cmap="tab10",
+            )
+            handles = layer.legend_elements(num=None)[0]
+            axes.legend(handles, categories.tolist(), title="status")
+        elif color_by is not None:
+            layer = axes.scatter(
+                x,
+                y,
+                c=columns[color_by],
+                s=MAP_MARKER_SIZE,
+                linewidths=0,
+                cmap=matplotlib.colormaps["viridis"].with_extremes(bad="grey"),
+                plotnonfinite=True,
+            )
+            figure.colorbar(layer, ax=axes, label=color_by)
+        else:
+            layer = axes.scatter(
+                x,
+                y,
+                s=MAP_MARKER_SIZE,
+                linewidths=0,
+                color=CONSTANTS_COLOUR_STYLE.colour.darkest,
+            )
+        layer.set_rasterized(True)
+
+        with profiling.stage("render"):
+            render(
+                figure=figure,
+                axes=axes,
+                standalone=False,
+                bounding_box=bbox,
+                title=str(len(x)) + " measures",
+            )
+        with profiling.stage("save"):
+            figure.savefig(output, format=fmt)
 
 
-def chroma_spec_gifs(indb, outdir):
+def _map_bbox(x, y):
+    """Bounding box of a collection map, around its measures.
+
+    Args:
+        x (numpy.ndarray): CIE 1931 chromacity coordinates x
+        y (numpy.ndarray): CIE 1931 chromacity coordinates y
+
+    Returns:
+        list: [xmin, xmax, ymin, ymax], MAP_BBOX without finite measures
+    """
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.any():
+        return MAP_BBOX
+
+    x, y = x[finite], y[finite]
+    return [
+        float(x.min()) - MAP_MARGIN,
+        float(x.max()) + MAP_MARGIN,
+        float(y.min()) - MAP_MARGIN,
+        float(y.max()) + MAP_MARGIN,
+    ]
+
+
+def chroma_spec_gifs(indb, outdir, force=False, keep_frames=False, shard=None):
     """Chromatic graphs gifs of all multi-measure entries from a database.
 
+    Frames are rasterized in memory and streamed into the gif. Gifs that are
+    up to date with the output directory manifest are skipped. Flashlights
+    of the same model share a gif, see manifest.Manifest.claim.
+
     Args:
         indb (string): Input database file
         outdir (string): Output directory
+        force (bool): Flag to regenerate up to date gifs
+        keep_frames (bool): Flag to also write every frame as png
+        shard (tuple, optional): (index, count) flashlights, see sharding
 
     Example:
         >>> from chroma_spec import spec
         >>> spec.chroma_spec_gifs("data/sotc.json", "/tmp")
     """
-    with open(indb) as i:
-        fldb = json.load(i)
-
-    for fl in fldb["flashlights"]:
-        fl_path = pathlib.Path(outdir, fl["model"])
-        pathlib.Path.mkdir(fl_path, exist_ok=True)
-        if len(fl["measures"]) >= 2:
-            frames = []
-            for rec in fl["measures"]:
-                rec_fname = rec["mod"] + "_" + rec["level"]
-                figure, axes = plot_planckian_locus_in_chromaticity_diagram_CIE1931(
-                    {rec_fname: [rec["ciex"], rec["ciey"]]},
-                    standalone=False,
-                )
-                render(
-                    axes=axes,
-                    bounding_box=[0.3, 0.4, 0.3, 0.4],
-                    filename=pathlib.Path(fl_path, rec_fname + ".png"),
-                    title=fl["model"],
-                )
-                frames.append(imageio.imread(pathlib.Path(fl_path, rec_fname + ".png")))
-            imageio.mimsave(
-                pathlib.Path(fl_path, fl["model"] + ".gif"),
-                frames,
+    import imageio
+
+    mf = manifest.Manifest(outdir, force=force)
+    flashlights = sharding.select(database.iter_flashlights(indb), shard)
+    try:
+        for fl in profiling.iterate("load", flashlights):
+            fl_path = pathlib.Path(outdir, fl.model)
+            pathlib.Path.mkdir(fl_path, exist_ok=True)
+            if len(fl.table) < 2:
+                continue
+
+            fl_file = pathlib.Path(fl_path, fl.model + ".gif")
+            if not mf.claim(fl_file):
+                continue
+            fl_frames = [
+                [mod + "_" + level, x, y]
+                for mod, level, x, y in fl.table.rows(MEASURE_ROW)
+            ]
+            fl_inputs = [fl_frames, fl.model, "gifs"]
+            if keep_frames is True:
+                # Frame pngs are outputs of the gif entry too.
+                fl_inputs.append("frames")
+            with profiling.stage("digest"):
+                fl_digest = manifest.digest(fl_inputs)
+                current = mf.is_current(fl_file, fl_digest)
+            if current:
+                continue
+
+            with imageio.get_writer(
+                fl_file,
                 format="GIF",
+                mode="I",
                 duration=1000,
                 loop=3,
+            ) as writer:
+                for rec_fname, x, y in fl_frames:
+                    frame = _gif_frame(fl.model, rec_fname, x, y)
+                    with profiling.stage("save"):
+                        writer.append_data(frame)
+                        if keep_frames is True:
+                            imageio.imwrite(
+                                pathlib.Path(fl_path, rec_fname + ".png"), frame
+                            )
+            mf.record(fl_file, fl_digest)
+    finally:
+        mf.save()
+
+
+def _gif_frame(model, rec_fname, x, y):
+    """Rasterize a gif frame.
+
+    Args:
+        model (string): Flashlight model
+        rec_fname (string): Measure description
+        x (float): CIE 1931 chromacity coordinate x
+        y (float): CIE 1931 chromacity coordinate y
+
+    Returns:
+        numpy.ndarray: RGBA frame
+    """
+    from colour.plotting import render
+
+    from . import background
+
+    with background.figure_context(background.EVOL_SIZE) as (figure, axes):
+        with profiling.stage("plot"):
+            background.plot_points(axes, {rec_fname: [x, y]})
+        with profiling.stage("render"):
+            render(
+                figure=figure,
+                axes=axes,
+                standalone=False,
+                bounding_box=[0.3, 0.4, 0.3, 0.4],
+                title=model,
             )
+        with profiling.stage("rasterize"):
+            return background.rasterize(figure)
+
+
+def chroma_spec_stats(indb, outfile, fmt="csv", method="McCamy 1992", schema=None):
+    """Chromatic properties of all measures, as a table.
+
+    CCT, DUV and CIE 1976 u'v' coordinates (up, vp) are computed in bulk,
+    no graph is rendered and nothing is logged per measure.
+
+    Args:
+        indb (string): Input database file, "-" reads x y pairs from stdin
+        outfile (string): Output table file, "-" for stdout
+        fmt (string): Output format, "csv" or "npz" (columnar)
+        method (string): CCT method, see utils.CCT_METHODS
+        schema (string, optional): SOTC JSON schema file, checked while loading
+
+    Raises:
+        ValueError: stdin values that are not x y number pairs
+
+    Example:
+        >>> from chroma_spec import spec
+        >>> spec.chroma_spec_stats("data/sotc.json", "/tmp/sotc.csv")
+    """
+    with profiling.stage("load"):
+        if indb == "-":
+            pairs = sys.stdin.read().replace(",", " ").split()
+            if len(pairs) % 2:
+                raise ValueError(
+                    "Expected x y pairs, got an odd number of values: "
+                    + str(len(pairs)),
+                )
+            xy = np.array(pairs, dtype=np.float64).reshape(-1, 2)
+            columns = {"ciex": xy[:, 0], "ciey": xy[:, 1]}
+        else:
+            columns = _measure_columns(indb, schema)
+
+    with profiling.stage("chroma"):
+        cct, duv, _, _ = utils.xy_to_chroma_array(
+            columns["ciex"],
+            columns["ciey"],
+            method,
+        )
+        up, vp = utils.xy_to_uvp_array(columns["ciex"], columns["ciey"])
+    columns.update(cct=cct, duv=duv, up=up, vp=vp)
+    _write_table(outfile, columns, fmt)
+
+
+def chroma_spec_drift(indb, outfile, fmt="csv", method="McCamy 1992", schema=None):
+    """Chromaticity drift of all measures, as a table.
+
+    Measures are written with their CCT, DUV and drift along the history of
+    their flashlight: step, days, shift, rate and outlier, see
+    drift.analyze. The whole database is analyzed at once.
+
+    Args:
+        indb (string): Input database file
+        outfile (string): Output table file, "-" for stdout
+        fmt (string): Output format, "csv" or "npz" (columnar)
+        method (string): CCT method, see utils.CCT_METHODS
+        schema (string, optional): SOTC JSON schema file, checked while loading
+
+    Example:
+        >>> from chroma_spec import spec
+        >>> spec.chroma_spec_drift("data/sotc.json", "/tmp/drift.csv")
+    """
+    with profiling.stage("load"):
+        columns = _measure_columns(indb, schema)
+    with profiling.stage("chroma"):
+        cct, duv, _, _ = utils.xy_to_chroma_array(
+            columns["ciex"],
+            columns["ciey"],
+            method,
+        )
+    columns.update(cct=cct, duv=duv)
+    with profiling.stage("drift"):
+        analysis = drift.analyze(columns)
+    del analysis["previous"]
+    columns.update(analysis)
+    _write_table(outfile, columns, fmt)
+
+
+def _write_table(outfile, columns, fmt="csv"):
+    """Write measure columns as a table.
+
+    Args:
+        outfile (string): Output table file, "-" for stdout
+        columns (dict): Column names mapped to equal length arrays
+        fmt (string): Output format, "csv" or "npz" (columnar)
+    """
+    with profiling.stage("save"):
+        if fmt == "npz":
+            with _open_output(outfile, binary=True) as o:
+                np.savez(o, **columns)
+        else:
+            with _open_output(outfile) as o:
+                _write_csv(o, columns)
+    logging.debug(
+        str(len(columns["ciex"])) + " measures --> " + str(outfile),
+    )
+
+
+def _write_csv(stream, columns):
+    """Write columns as CSV rows, with a fixed precision per float column.
+
+    Rows are formatted with a single format string, much faster than
+    csv.writer on millions of measures. String columns are quoted once per
+    distinct value.
+
+    Args:
+        stream (file): Text output stream
+        columns (dict): Column names mapped to equal length arrays
+    """
+    csv.writer(stream).writerow(columns)
+    row_format = ",".join(CSV_FORMATS.get(name, "%s") for name in columns) + "\r\n"
+    values = []
+    for column in columns.values():
+        if column.dtype.kind == "U":
+            uniques, inverse = np.unique(column, return_inverse=True)
+            quoted = np.array([_csv_quote(s) for s in uniques.tolist()], dtype=object)
+            values.append(quoted[inverse].tolist())
+        else:
+            values.append(column.tolist())
+    stream.writelines(map(lambda *row: row_format % row, *values))
+
+
+def _csv_quote(value):
+    """Quote a CSV field, the csv.QUOTE_MINIMAL way.
+
+    Args:
+        value (string): Field value
+
+    Returns:
+        string: Field, quoted if it holds a delimiter, quote or line break
+    """
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def chroma_spec_near(indb, x, y, outfile="-", k=5, radius=None, schema=None):
+    """Measures closest to a chromaticity, as a table.
+
+    Measures are looked up in a u'v' grid index, see index.ChromaIndex, and
+    written closest first with their u'v' distance (duvp).
+
+    Args:
+        indb (string): Input database file
+        x (float): CIE 1931 chromacity coordinate x
+        y (float): CIE 1931 chromacity coordinate y
+        outfile (string): Output table file, "-" for stdout
+        k (int): Number of measures, all of them within radius if None
+        radius (float, optional): Largest delta u'v'
+        schema (string, optional): SOTC JSON schema file, checked while loading
+
+    Example:
+        >>> from chroma_spec import spec
+        >>> spec.chroma_spec_near("data/sotc.json", 0.3604, 0.3339, "/tmp/near.csv")
+    """
+    with profiling.stage("load"):
+        columns = _measure_columns(indb, schema)
+    with profiling.stage("index"):
+        chroma_index = index.ChromaIndex(columns["ciex"], columns["ciey"])
+
+    with profiling.stage("query"):
+        if radius is None:
+            rows, distances = chroma_index.nearest(x, y, k)
+        else:
+            rows, distances = chroma_index.within(x, y, radius)
+            rows, distances = rows[:k], distances[:k]
+
+    columns = {name: np.asarray(column)[rows] for name, column in columns.items()}
+    columns["duvp"] = distances
+    with profiling.stage("save"):
+        with _open_output(outfile) as o:
+            _write_csv(o, columns)
+    logging.debug(str(len(rows)) + " measures --> " + str(outfile))
+
+
+def _measure_columns(indb, schema=None):
+    """Measure columns of a database, with their flashlight id and model.
+
+    Args:
+        indb (string): Input database file
+        schema (string, optional): SOTC JSON schema file, checked while loading
+
+    Returns:
+        dict: Column names mapped to arrays, one row per measure
+    """
+    arrays = database.load_columns(indb, schema)
+    rows = np.repeat(np.arange(len(arrays["fl_id"])), np.diff(arrays["fl_offsets"]))
+    columns = {
+        "id": database.column(arrays, "fl_id")[rows],
+        "model": database.column(arrays, "fl_model")[rows],
+    }
+    columns.update({name: database.column(arrays, name) for name in COLUMNS})
+    return columns
+
+
+def _open_output(outfile, binary=False):
+    """Open an output file, "-" for stdout.
+
+    Args:
+        outfile (string): Output file
+        binary (bool): Flag to open in binary mode
+
+    Returns:
+        file: Output stream, stdout is left open on exit
+    """
+    if outfile == "-":
+        return contextlib.nullcontext(sys.stdout.buffer if binary else sys.stdout)
+    if binary is True:
+        return open(outfile, "wb")
+    return open(outfile, "w", newline="")
 
 
 # kang2002 = colour.xy_to_CCT((x, y),'Kang 2002')
@@ -1,16 +1,41 @@
 """chroma-spec utils."""
 
+import functools
 import logging
 import math
+import os
+import pathlib
 import sys
 
+import numpy as np
 
-def xy_to_CCT(x, y):
-    """CIE 1931 to CCT (McCamy's approximation).
+CCT_METHODS = ("McCamy 1992", "Ohno 2013")
+CHROMA_CACHE_SIZE = 4096
+CHROMA_CACHE_DIGITS = 6
+
+
+def _check_method(method):
+    """Check a CCT method name.
+
+    Args:
+        method (string): CCT method, see CCT_METHODS
+
+    Raises:
+        ValueError: Unknown method
+    """
+    if method not in CCT_METHODS:
+        raise ValueError(
+            "Unknown CCT method '" + str(method) + "', use one of " + str(CCT_METHODS)
+        )
+
+
+def xy_to_CCT(x, y, method="McCamy 1992"):
+    """CIE 1931 to CCT (McCamy's approximation by default).
 
     Args:
         x (float): CIE 1931 chromacity coordinate x
         y (float): CIE 1931 chromacity coordinate x
+        method (string): CCT method, see CCT_METHODS
 
     Returns:
         float: Correlated Colour Temperature (CCT)
@@ -20,6 +45,9 @@ def xy_to_CCT(x, y):
         >>> utils.xy_to_CCT(0.3604, 0.3339)
         4330.655950072925
     """
+    if method != "McCamy 1992":
+        return float(xy_to_CCT_array([x], [y], method)[0])
+
     n = (x - 0.3320) / (0.1858 - y)
 
     return 437 * math.pow(n, 3) + 3601 * math.pow(n, 2) + 6861 * n + 5517
@@ -46,12 +74,16 @@ def xy_to_uv(x, y):
     return u, v
 
 
-def xy_to_DUV(x, y):
+def xy_to_DUV(x, y, method="McCamy 1992"):
     """CIE 1931 to DUV.
 
+    Ohno's polynomial approximation of the Planckian locus is used along
+    McCamy's CCT, the exact distance to the locus with Ohno 2013.
+
     Args:
         x (float): CIE 1931 chromacity coordinate x
         y (float): CIE 1931 chromacity coordinate x
+        method (string): CCT method, see CCT_METHODS
 
     Returns:
         float: Delta uv (DUV)
@@ -61,6 +93,9 @@ def xy_to_DUV(x, y):
         >>> utils.xy_to_DUV(0.3604, 0.3339)
         -0.015143925038518163
     """
+    if method != "McCamy 1992":
+        return float(xy_to_DUV_array([x], [y], method)[0])
+
     k6 = -0.00616793
     k5 = 0.0893944
     k4 = -0.5179722
@@ -84,6 +119,302 @@ def xy_to_DUV(x, y):
     return lfp - lbb
 
 
+def xy_to_CCT_array(x, y, method="McCamy 1992"):
+    """CIE 1931 to CCT for arrays of coordinates.
+
+    McCamy's approximation loses accuracy away from 3000-9000K, Ohno 2013
+    looks measures up in a precomputed Planckian table, see planckian.
+
+    Args:
+        x (array_like): CIE 1931 chromacity coordinates x
+        y (array_like): CIE 1931 chromacity coordinates y
+        method (string): CCT method, see CCT_METHODS
+
+    Returns:
+        numpy.ndarray: Correlated Colour Temperatures (CCT)
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> utils.xy_to_CCT_array([0.3604, 0.3418], [0.3339, 0.3518]).round(2).tolist()
+        [4330.66, 5124.41]
+        >>> utils.xy_to_CCT_array([0.3604], [0.3339], "Ohno 2013").round(2).tolist()
+        [4310.39]
+    """
+    _check_method(method)
+    if method == "Ohno 2013":
+        from . import planckian
+
+        return planckian.xy_to_CCT_DUV_Ohno2013(x, y)[0]
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = (x - 0.3320) / (0.1858 - y)
+
+    return 437 * np.power(n, 3) + 3601 * np.power(n, 2) + 6861 * n + 5517
+
+
+def xy_to_uv_array(x, y):
+    """CIE 1931 to uvp chromaticity coordinates for arrays of coordinates.
+
+    Args:
+        x (array_like): CIE 1931 chromacity coordinates x
+        y (array_like): CIE 1931 chromacity coordinates y
+
+    Returns:
+        tuple: (u, v) arrays of uvp chromaticity coordinates
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> u, v = utils.xy_to_uv_array([0.3604, 0.3418], [0.3339, 0.3518])
+        >>> u.round(4).tolist(), v.round(4).tolist()
+        ([0.2293, 0.2091], [0.3187, 0.3229])
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    d = -2 * x + 12 * y + 3
+
+    return (4 * x) / d, (6 * y) / d
+
+
+def xy_to_uvp_array(x, y):
+    """CIE 1931 to CIE 1976 u'v' coordinates, for arrays of coordinates.
+
+    Args:
+        x (array_like): CIE 1931 chromacity coordinates x
+        y (array_like): CIE 1931 chromacity coordinates y
+
+    Returns:
+        tuple: (u', v') arrays
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> u, v = utils.xy_to_uvp_array([0.3604], [0.3339])
+        >>> u.round(4).tolist(), v.round(4).tolist()
+        ([0.2293], [0.4781])
+    """
+    u, v = xy_to_uv_array(x, y)
+    # xy_to_uv_array coordinates are CIE 1960 uv, v' is 1.5 v.
+    return u, 1.5 * v
+
+
+def uv_to_DUV_array(u, v):
+    """Uvp chromaticity coordinates to DUV for arrays of coordinates.
+
+    Args:
+        u (array_like): uvp chromaticity coordinates u
+        v (array_like): uvp chromaticity coordinates v
+
+    Returns:
+        numpy.ndarray: Delta uv (DUV)
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> utils.uv_to_DUV_array([0.22933503], [0.31870824]).round(4).tolist()
+        [-0.0151]
+    """
+    k6 = -0.00616793
+    k5 = 0.0893944
+    k4 = -0.5179722
+    k3 = 1.5317403
+    k2 = -2.4243787
+    k1 = 1.925865
+    k0 = -0.471106
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    lfp = np.sqrt(np.power(u - 0.292, 2) + np.power(v - 0.24, 2))
+    a = np.arccos((u - 0.292) / lfp)
+    lbb = (
+        k6 * np.power(a, 6)
+        + k5 * np.power(a, 5)
+        + k4 * np.power(a, 4)
+        + k3 * np.power(a, 3)
+        + k2 * np.power(a, 2)
+        + k1 * a
+        + k0
+    )
+
+    return lfp - lbb
+
+
+def xy_to_DUV_array(x, y, method="McCamy 1992"):
+    """CIE 1931 to DUV for arrays of coordinates.
+
+    Args:
+        x (array_like): CIE 1931 chromacity coordinates x
+        y (array_like): CIE 1931 chromacity coordinates y
+        method (string): CCT method, see CCT_METHODS
+
+    Returns:
+        numpy.ndarray: Delta uv (DUV)
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> utils.xy_to_DUV_array([0.3604, 0.3418], [0.3339, 0.3518]).round(4).tolist()
+        [-0.0151, 0.0014]
+    """
+    _check_method(method)
+    if method == "Ohno 2013":
+        from . import planckian
+
+        return planckian.xy_to_CCT_DUV_Ohno2013(x, y)[1]
+
+    return uv_to_DUV_array(*xy_to_uv_array(x, y))
+
+
+def xy_to_chroma_array(x, y, method="McCamy 1992"):
+    """CIE 1931 to CCT, DUV and uvp chromaticity coordinates, in one pass.
+
+    Args:
+        x (array_like): CIE 1931 chromacity coordinates x
+        y (array_like): CIE 1931 chromacity coordinates y
+        method (string): CCT method, see CCT_METHODS
+
+    Returns:
+        tuple: (cct, duv, u, v) arrays
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> cct, duv, u, v = utils.xy_to_chroma_array([0.3604], [0.3339])
+        >>> cct.round(2).tolist(), duv.round(4).tolist()
+        ([4330.66], [-0.0151])
+    """
+    _check_method(method)
+    u, v = xy_to_uv_array(x, y)
+    if method == "Ohno 2013":
+        from . import planckian
+
+        return planckian.uv_to_CCT_DUV_Ohno2013(u, v) + (u, v)
+
+    return xy_to_CCT_array(x, y), uv_to_DUV_array(u, v), u, v
+
+
+def _xy_to_chroma(x, y, method):
+    """CIE 1931 to CCT, DUV and uvp chromaticity coordinates, uncached.
+
+    Args:
+        x (float): CIE 1931 chromacity coordinate x
+        y (float): CIE 1931 chromacity coordinate y
+        method (string): CCT method, see CCT_METHODS
+
+    Returns:
+        tuple: (cct, duv, u, v) values
+    """
+    return (xy_to_CCT(x, y, method), xy_to_DUV(x, y, method)) + xy_to_uv(x, y)
+
+
+_chroma_cache = functools.lru_cache(maxsize=CHROMA_CACHE_SIZE)(_xy_to_chroma)
+
+
+def xy_to_chroma(x, y, method="McCamy 1992"):
+    """CIE 1931 to CCT, DUV and uvp chromaticity coordinates, memoized.
+
+    Measures often share coordinates, results are kept in a bounded LRU
+    cache keyed on the coordinates rounded to CHROMA_CACHE_DIGITS decimals,
+    see chroma_cache_info and set_chroma_cache_size.
+
+    Args:
+        x (float): CIE 1931 chromacity coordinate x
+        y (float): CIE 1931 chromacity coordinate y
+        method (string): CCT method, see CCT_METHODS
+
+    Returns:
+        tuple: (cct, duv, u, v) values
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> cct, duv, u, v = utils.xy_to_chroma(0.3604, 0.3339)
+        >>> round(cct, 2), round(duv, 4)
+        (4330.66, -0.0151)
+    """
+    return _chroma_cache(
+        round(float(x), CHROMA_CACHE_DIGITS),
+        round(float(y), CHROMA_CACHE_DIGITS),
+        method,
+    )
+
+
+def chroma_cache_info():
+    """Statistics of the xy_to_chroma cache.
+
+    Returns:
+        functools._CacheInfo: hits, misses, maxsize and currsize
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> utils.chroma_cache_info().maxsize
+        4096
+    """
+    return _chroma_cache.cache_info()
+
+
+def set_chroma_cache_size(maxsize):
+    """Resize the xy_to_chroma cache, clearing it.
+
+    Args:
+        maxsize (int): Number of cached coordinates, None for unbounded
+    """
+    global _chroma_cache
+    _chroma_cache = functools.lru_cache(maxsize=maxsize)(_xy_to_chroma)
+
+
+def chroma_label(name, x, y, cct, duv):
+    """Graph title of a measure.
+
+    Args:
+        name (string): Measure description
+        x (float): CIE 1931 chromacity coordinate x
+        y (float): CIE 1931 chromacity coordinate y
+        cct (float): Correlated Colour Temperature
+        duv (float): Delta uv
+
+    Returns:
+        string: Description, coordinates, CCT and DUV lines
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> print(utils.chroma_label("PL47MU", 0.3604, 0.3339, 4330.66, -0.0151))
+        PL47MU [0.3604; 0.3339]
+        CCT: 4331K
+        DUV: -0.0151
+        <BLANKLINE>
+    """
+    return (
+        name
+        + " ["
+        + str(x)
+        + "; "
+        + str(y)
+        + "]\nCCT: "
+        + "%4.0f" % cct
+        + "K\nDUV: "
+        + "%.4f" % duv
+        + "\n"
+    )
+
+
+def cache_dir():
+    """Directory of the on-disk caches (backgrounds, Planckian tables).
+
+    The ``CHROMA_SPEC_CACHE`` environment variable takes precedence over
+    ``$XDG_CACHE_HOME/chroma-spec`` (``~/.cache/chroma-spec`` by default).
+    Backgrounds are cached as pickles, loading them runs code: the
+    directory must only be writable by its owner.
+
+    Returns:
+        pathlib.Path: Cache directory
+
+    Example:
+        >>> from chroma_spec import utils
+        >>> utils.cache_dir().name
+        'chroma-spec'
+    """
+    if os.environ.get("CHROMA_SPEC_CACHE"):
+        return pathlib.Path(os.environ["CHROMA_SPEC_CACHE"])
+
+    xdg_cache = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(xdg_cache, "chroma-spec")
+
+
 def setup_logger(verbose=False):
     """Setup logger.
 
@@ -22,7 +22,7 @@ package = "chroma_spec"
 python_versions = ["3.10"]
 nox.options.sessions = "lint", "tests", "coverage"
 nox.needs_version = ">= 2023.4.22"
-locations = "chroma_spec", "tests", "docs", "noxfile.py", "docs/conf.py"
+locations = "chroma_spec", "tests", "benchmarks", "docs", "noxfile.py", "docs/conf.py"
 
 
 @session(python=python_versions)
@@ -45,6 +45,27 @@ def tests(session):
             session.notify("coverage", posargs=[])
 
 
+@session(python=python_versions)
+def benchmarks(session):
+    """Benchmarks with pytest-benchmark, compared with the last saved run."""
+    # Runs are saved in .benchmarks, a median 10% slower than the previous
+    # run fails. Large databases run on demand: nox -s benchmarks -- -m large
+    session.install(".")
+    session.install("pytest", "pytest-benchmark")
+    args = session.posargs or ["-m", "not large"]
+    session.run(
+        "pytest",
+        "benchmarks",
+        "--benchmark-disable-gc",
+        "--benchmark-warmup=on",
+        "--benchmark-autosave",
+        "--benchmark-compare",
+        "--benchmark-compare-fail=median:10%",
+        *args,
+        env={"PYTHONHASHSEED": "0", "MPLBACKEND": "Agg", "OMP_NUM_THREADS": "1"},
+    )
+
+
 @session(python=python_versions)
 def coverage(session) -> None:
     """Produce the coverage report."""
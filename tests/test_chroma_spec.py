@@ -1,12 +1,52 @@
 """Test cases for the __main__ module."""
 
+import asyncio
+import base64
+import csv
+import http.server
+import io
 import json
+import os
+import pathlib
+import pickle
+import pstats
+import socket
+import stat
+import subprocess  # noqa: S404
+import sys
+import threading
+import tracemalloc
+import types
+import urllib.error
+import urllib.request
+import zipfile
 
+import colour
+import imageio
 import jsonschema
+import matplotlib.pyplot as plt
+import numpy as np
 import pytest
 from click.testing import CliRunner
 
-from chroma_spec import __main__, flashlight
+from chroma_spec import (
+    __main__,
+    background,
+    database,
+    drift,
+    flashlight,
+    index,
+    manifest,
+    measures,
+    pipeline,
+    planckian,
+    profiling,
+    schema,
+    server,
+    sharding,
+    spec,
+    utils,
+)
 
 
 @pytest.fixture
@@ -15,6 +55,45 @@ def runner() -> CliRunner:
     return CliRunner()
 
 
+@pytest.fixture
+def small_db(tmp_path):
+    """Fixture for a two measures database."""
+    db = {
+        "version": "0.0.1",
+        "flashlights": [
+            {
+                "id": "002",
+                "model": "TS10",
+                "status": "owned",
+                "configuration": "stock",
+                "measures": [
+                    {
+                        "date": "2022-07-21",
+                        "mod": "og",
+                        "level": "1-150",
+                        "lux": 74,
+                        "ra": 100.0,
+                        "ciex": 0.3418,
+                        "ciey": 0.3518,
+                    },
+                    {
+                        "date": "2022-07-22",
+                        "mod": "og",
+                        "level": "lvl5",
+                        "lux": 12,
+                        "ra": 95.0,
+                        "ciex": 0.3553,
+                        "ciey": 0.3661,
+                    },
+                ],
+            },
+        ],
+    }
+    path = tmp_path / "sotc.json"
+    path.write_text(json.dumps(db))
+    return path
+
+
 def test_single(runner: CliRunner, tmp_path) -> None:
     """It exits with a status code of zero."""
     result = runner.invoke(
@@ -51,6 +130,118 @@ def test_batch(runner: CliRunner) -> None:
     assert result.exit_code == 0
 
 
+def test_batch_jobs(runner: CliRunner, tmp_path) -> None:
+    """It renders the same graphs with a process pool."""
+    result = runner.invoke(
+        __main__.main,
+        [
+            "batch",
+            "--indb",
+            "data/sotc.json",
+            "--outdir",
+            tmp_path,
+            "--jobs",
+            "2",
+        ],
+    )
+    assert result.exit_code == 0
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+
+    expected = sorted(
+        pathlib.Path(fl["model"], "_".join((fl["model"], rec["mod"], rec["level"])))
+        for fl in db["flashlights"]
+        for rec in fl["measures"]
+    )
+    rendered = sorted(
+        p.relative_to(tmp_path).with_suffix("") for p in tmp_path.glob("*/*.svg")
+    )
+    assert rendered == expected
+
+
+def test_shard(runner: CliRunner, tmp_path) -> None:
+    """Shards render disjoint flashlights, merged into a single tree."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+    # Another flashlight of a model, its graphs share the model directory.
+    fl = db["flashlights"][0]
+    db["flashlights"].append(
+        dict(fl, id="997", measures=[dict(rec, level="new") for rec in fl["measures"]]),
+    )
+    indb = tmp_path / "sotc.json"
+    indb.write_text(json.dumps(db))
+
+    for part in (1, 2, 3):
+        shard_dir = tmp_path / str(part)
+        shard_dir.mkdir()
+        for command in ("batch", "evol"):
+            result = runner.invoke(
+                __main__.main,
+                [
+                    command,
+                    "--indb",
+                    indb,
+                    "--outdir",
+                    shard_dir,
+                    "--shard",
+                    str(part) + "/3",
+                ],
+            )
+            assert result.exit_code == 0
+
+    shards = [
+        sorted(p.name for p in (tmp_path / str(part)).iterdir() if p.is_dir())
+        for part in (1, 2, 3)
+    ]
+    assert sorted(sum(shards, [])) == sorted({fl["model"] for fl in db["flashlights"]})
+    assert all(shards)
+
+    outdir = tmp_path / "SOTC"
+    outdir.mkdir()
+    result = runner.invoke(
+        __main__.main,
+        ["merge"] + [str(tmp_path / part) for part in "123"] + ["--outdir", outdir],
+    )
+    assert result.exit_code == 0
+    expected = sorted(
+        {
+            fl["model"] + "/" + "_".join((fl["model"], rec["mod"], rec["level"]))
+            for fl in db["flashlights"]
+            for rec in fl["measures"]
+        }
+        | {fl["model"] + "/" + fl["model"] for fl in db["flashlights"]},
+    )
+    merged = manifest.Manifest(outdir).items()
+    assert [key[: -len(".svg")] for key, _ in merged] == expected
+    assert all((outdir / key).exists() for key, _ in merged)
+    # Up to date graphs are not copied again.
+    assert sharding.merge([tmp_path / "1"], outdir) == 0
+
+    # Graphs that went missing are skipped, conflicting ones fail.
+    graphs = manifest.Manifest(tmp_path / "1").items()
+    key = graphs[0][0]
+    (tmp_path / "1" / key).unlink()
+    (tmp_path / "partial").mkdir()
+    assert sharding.merge([tmp_path / "1"], tmp_path / "partial") == len(graphs) - 1
+    key = graphs[1][0]
+    conflict = manifest.Manifest(tmp_path / "2")
+    conflict.record(tmp_path / "2" / key, "0" * 64)
+    conflict.save()
+    (tmp_path / "2" / key).parent.mkdir(exist_ok=True)
+    (tmp_path / "2" / key).write_text("<svg/>")
+    result = runner.invoke(
+        __main__.main,
+        ["merge", str(tmp_path / "1"), str(tmp_path / "2"), "--outdir", tmp_path],
+    )
+    assert result.exit_code == 1
+    assert "Conflicting shard graphs" in result.output
+
+    for shard in ("4/3", "0/3", "1"):
+        result = runner.invoke(__main__.main, ["gifs", "--shard", shard])
+        assert result.exit_code == 2
+        assert "Shard" in result.output
+
+
 def test_evol(runner: CliRunner) -> None:
     """It exits with a status code of zero."""
     result = runner.invoke(
@@ -81,12 +272,31 @@ def test_gifs(runner: CliRunner) -> None:
     assert result.exit_code == 0
 
 
+def test_gifs_frames(runner: CliRunner, small_db, tmp_path) -> None:
+    """It streams in-memory frames into the gif, pngs are optional."""
+    result = runner.invoke(
+        __main__.main,
+        ["gifs", "--indb", small_db, "--outdir", tmp_path],
+    )
+    assert result.exit_code == 0
+    assert len(imageio.mimread(tmp_path / "TS10" / "TS10.gif")) == 2
+    assert not list(tmp_path.glob("TS10/*.png"))
+
+    result = runner.invoke(
+        __main__.main,
+        ["gifs", "--indb", small_db, "--outdir", tmp_path, "--frames"],
+    )
+    assert result.exit_code == 0
+    frame = imageio.imread(tmp_path / "TS10" / "og_lvl5.png")
+    assert frame.shape == (640, 640, 4)
+
+
 def test_db_schema():
     """Validate sotc.json with schema."""
     with open("data/sotc.json") as i:
         db = json.load(i)
 
-    with open("data/sotc.schema") as j:
+    with open(database.SCHEMA) as j:
         schema = json.load(j)
 
     jsonschema.validate(instance=db, schema=schema)
@@ -115,7 +325,7 @@ def test_db_schema_2fail():
         ],
     }
 
-    with open("data/sotc.schema") as j:
+    with open(database.SCHEMA) as j:
         schema = json.load(j)
 
     with pytest.raises(jsonschema.exceptions.ValidationError) as exc:
@@ -143,7 +353,12 @@ def test_flashlight():
     }
 
     fl = flashlight.Flashlight(properties)
-    fl.get_plot(0)
+    fignums = plt.get_fignums()
+    figure, axes = fl.get_plot(0)
+    assert axes.get_title() == utils.chroma_label(
+        "TS10", 0.3418, 0.3518, 5124.413540561434, 0.0014487684494922798
+    )
+    assert plt.get_fignums() == fignums
 
     assert fl.model == "TS10"
     assert fl.status == "stolen"
@@ -152,3 +367,1153 @@ def test_flashlight():
     assert duv == 0.0014487684494922798
     cct = fl.get_cct(0)
     assert cct == 5124.413540561434
+    np.testing.assert_allclose(fl.get_ccts(), [cct])
+    np.testing.assert_allclose(fl.get_duvs(), [duv])
+    assert fl.measures == properties["measures"]
+    assert not hasattr(fl, "__dict__")
+    fl.release_plot()
+
+
+def test_flashlight_plot(tmp_path):
+    """Measures of a flashlight are plotted on a single prepared figure."""
+    measures = [
+        {"date": "2022-07-21", "mod": "og", "level": "high", "ciex": x, "ciey": y}
+        for x, y in [(0.3418, 0.3518), (0.3604, 0.3339)]
+    ]
+    fl = flashlight.Flashlight(
+        {
+            "id": "002",
+            "model": "TS10",
+            "status": "stolen",
+            "configuration": "stock",
+            "measures": measures,
+        },
+    )
+    first, axes = fl.get_plot(0)
+    lines, texts = len(axes.lines), len(axes.texts)
+    figure, axes = fl.get_plot(1)
+    assert figure is first
+    assert (len(axes.lines), len(axes.texts)) == (lines, texts)
+    assert axes.get_title() == utils.chroma_label(
+        "TS10", 0.3604, 0.3339, fl.get_cct(1), fl.get_duv(1)
+    )
+    assert axes.lines[-1].get_xydata().tolist() == [[0.3604, 0.3339]]
+
+    # Blitted frames match a full redraw of the figure.
+    image = fl.rasterize_plot(1)
+    output = io.BytesIO()
+    figure.savefig(output, format="png")
+    output.seek(0)
+    np.testing.assert_array_equal(image, imageio.imread(output))
+    assert not np.array_equal(fl.rasterize_plot(0), image)
+
+    fl.save_plot(0, tmp_path / "0.svg")
+    fl.save_plot(1, tmp_path / "1.png", fmt="png")
+    assert b"TS10" in (tmp_path / "0.svg").read_bytes()
+    np.testing.assert_array_equal(imageio.imread(tmp_path / "1.png"), image)
+
+    fl.release_plot()
+    fl.release_plot()
+    assert fl.get_plot(0)[0] is not figure
+    fl.release_plot()
+
+
+def test_chroma_cache(runner: CliRunner) -> None:
+    """Chromatic properties are memoized on rounded coordinates."""
+    utils.set_chroma_cache_size(2)
+    try:
+        assert utils.xy_to_chroma(0.3604, 0.3339) == (
+            (utils.xy_to_CCT(0.3604, 0.3339), utils.xy_to_DUV(0.3604, 0.3339))
+            + utils.xy_to_uv(0.3604, 0.3339)
+        )
+        utils.xy_to_chroma(np.float64(0.3604), 0.33390000001)
+        utils.xy_to_chroma(0.3604, 0.3339, "Ohno 2013")
+        utils.xy_to_chroma(0.3418, 0.3518)
+        info = utils.chroma_cache_info()
+        assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 3, 2, 2)
+    finally:
+        utils.set_chroma_cache_size(utils.CHROMA_CACHE_SIZE)
+
+    result = runner.invoke(
+        __main__.main,
+        ["--memo-size", "0", "near", "--CIEx", "0.3604", "--CIEy", "0.3339"],
+    )
+    assert result.exit_code == 0
+    assert utils.chroma_cache_info().maxsize == 0
+    utils.set_chroma_cache_size(utils.CHROMA_CACHE_SIZE)
+
+
+def test_measure_table():
+    """Measures round-trip through columns, derived columns are cached."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+
+    tables = [
+        measures.MeasureTable.from_records(fl["measures"]) for fl in db["flashlights"]
+    ]
+    table = measures.MeasureTable.concatenate(tables)
+    assert table.records() == [
+        rec for fl in db["flashlights"] for rec in fl["measures"]
+    ]
+    assert table.cct is table.cct
+    assert table.duv is table.duv
+    np.testing.assert_allclose(table.duv, utils.xy_to_DUV_array(table.ciex, table.ciey))
+    assert table.mod.dtype.kind == "U"
+
+    fl = flashlight.Flashlight(dict(db["flashlights"][0], measures=tables[0]))
+    assert fl.table is tables[0]
+    assert len(measures.MeasureTable.concatenate([])) == 0
+
+    # Optional fields are columns, others are kept per row.
+    assert table.idx.tolist()[3:6] == ["", "", "01"]
+    assert np.isnan(table.measured_cct[0]) and table.measured_u[-1] > 0
+    rec = dict(db["flashlights"][0]["measures"][0], note="recalibrated")
+    noted = measures.MeasureTable.from_records([rec, rec])
+    assert noted.record(1) == rec
+    view = measures.MeasureTable.concatenate([table, noted.view(1, 2)]).view(
+        len(table) - 1,
+        len(table) + 1,
+    )
+    assert view.records() == [table.record(len(table) - 1), rec]
+    with pytest.raises(AttributeError):
+        view.note
+
+
+def test_measure_memory(tmp_path):
+    """Measure columns take a fraction of the memory of their records."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+    db["flashlights"] = [
+        dict(fl, id=fl["id"] + "-" + str(copy))
+        for copy in range(200)
+        for fl in db["flashlights"]
+    ]
+    content = json.dumps(db)
+    indb = tmp_path / "sotc.json"
+    indb.write_text(content)
+    count = sum(len(fl["measures"]) for fl in db["flashlights"])
+
+    def size(load):
+        tracemalloc.start()
+        loaded = load()
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+        return traced / count
+
+    records = size(lambda: json.loads(content))
+    # About 950 bytes per measure as records, 110 as columns, 300 as
+    # flashlights whose tables are views of shared columns.
+    assert size(lambda: database.load_table(indb)) < records / 6
+    assert size(lambda: list(database.iter_flashlights(indb))) < records / 2.5
+
+
+def test_xy_to_chroma_array():
+    """Vectorized chromatic properties match the scalar ones."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+
+    x = [rec["ciex"] for fl in db["flashlights"] for rec in fl["measures"]]
+    y = [rec["ciey"] for fl in db["flashlights"] for rec in fl["measures"]]
+
+    cct, duv, u, v = utils.xy_to_chroma_array(x, y)
+
+    np.testing.assert_allclose(cct, list(map(utils.xy_to_CCT, x, y)))
+    np.testing.assert_allclose(duv, list(map(utils.xy_to_DUV, x, y)))
+    np.testing.assert_allclose([u, v], np.transpose(list(map(utils.xy_to_uv, x, y))))
+    np.testing.assert_allclose(utils.xy_to_DUV_array(x, y), duv)
+
+
+def test_ohno2013(tmp_path, monkeypatch):
+    """Ohno 2013 agrees with colour-science, the table is cached on disk."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+
+    x = [rec["ciex"] for fl in db["flashlights"] for rec in fl["measures"]]
+    y = [rec["ciey"] for fl in db["flashlights"] for rec in fl["measures"]]
+
+    cct, duv, u, v = utils.xy_to_chroma_array(x, y, "Ohno 2013")
+    expected = colour.temperature.uv_to_CCT_Ohno2013(np.stack([u, v], axis=-1))
+    np.testing.assert_allclose(cct, expected[:, 0], rtol=1e-9)
+    np.testing.assert_allclose(duv, expected[:, 1], rtol=0, atol=1e-9)
+    assert utils.xy_to_CCT(x[0], y[0], "Ohno 2013") == cct[0]
+    assert utils.xy_to_DUV(x[0], y[0], "Ohno 2013") == duv[0]
+    np.testing.assert_allclose(utils.xy_to_DUV_array(x, y, "Ohno 2013"), duv)
+    with pytest.raises(ValueError, match="Robertson 1968"):
+        utils.xy_to_CCT(x[0], y[0], "Robertson 1968")
+
+    # Points beyond the table ends stay on its first and last segments.
+    cct, _ = planckian.uv_to_CCT_DUV_Ohno2013([0.449, 0.1806], [0.3547, 0.2658])
+    assert cct[0] < planckian.TABLE_START and cct[1] > planckian.TABLE_END
+
+    monkeypatch.delenv("CHROMA_SPEC_CACHE", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert utils.cache_dir() == tmp_path / "chroma-spec"
+
+    monkeypatch.setenv("CHROMA_SPEC_CACHE", str(tmp_path))
+    built = planckian.planckian_table.__wrapped__()
+    assert len(list(tmp_path.glob("planckian_*.npy"))) == 1
+    np.testing.assert_array_equal(planckian.planckian_table.__wrapped__(), built)
+
+    monkeypatch.setenv("CHROMA_SPEC_CACHE", str(tmp_path / "sotc.json"))
+    (tmp_path / "sotc.json").touch()
+    np.testing.assert_array_equal(planckian.planckian_table.__wrapped__(), built)
+
+
+def test_background_cache(tmp_path, monkeypatch):
+    """Backgrounds are drawn once, then served from memory and disk."""
+    monkeypatch.setenv("CHROMA_SPEC_CACHE", str(tmp_path))
+    monkeypatch.setattr(background, "_backgrounds", dict())
+
+    data = background.load_background(background.EVOL_SIZE)
+    assert background.load_background(background.EVOL_SIZE) is data
+    assert len(list(tmp_path.glob("background-*.pickle"))) == 1
+
+    monkeypatch.setattr(background, "_backgrounds", dict())
+    assert background.load_background(background.EVOL_SIZE) == data
+
+    figure, axes = background.new_figure(background.EVOL_SIZE)
+    background.plot_points(axes, {"TS10": [0.3418, 0.3518]})
+    assert len(axes.get_lines()) == len(pickle.loads(data).axes[0].get_lines()) + 1
+
+    # Truncated or corrupt cache files are drawn again.
+    (path,) = tmp_path.glob("background-*.pickle")
+    content = path.read_bytes()
+    for corrupt in (content[:-1], content[:-1] + b"\0", b""):
+        path.write_bytes(corrupt)
+        monkeypatch.setattr(background, "_backgrounds", dict())
+        redrawn = background.load_background(background.EVOL_SIZE)
+        assert background._read_cache(path) == redrawn
+
+    monkeypatch.setenv("CHROMA_SPEC_CACHE", str(tmp_path / "background.txt"))
+    monkeypatch.setattr(background, "_backgrounds", dict())
+    (tmp_path / "background.txt").touch()
+    assert background.load_background(background.EVOL_SIZE, spectral_locus_labels=[])
+
+
+def test_incremental(small_db, tmp_path):
+    """Reruns only regenerate graphs whose inputs changed."""
+    outdir = tmp_path / "SOTC"
+    outdir.mkdir()
+    spec.chroma_spec_batch(small_db, outdir)
+    spec.chroma_spec_evol(small_db, outdir)
+    spec.chroma_spec_gifs(small_db, outdir)
+
+    graphs = sorted(outdir.glob("TS10/TS10*.*"))
+    assert [p.name for p in graphs] == [
+        "TS10.gif",
+        "TS10.svg",
+        "TS10_og_1-150.svg",
+        "TS10_og_lvl5.svg",
+    ]
+    mtimes = {p.name: p.stat().st_mtime_ns for p in graphs}
+
+    spec.chroma_spec_batch(small_db, outdir)
+    spec.chroma_spec_evol(small_db, outdir)
+    spec.chroma_spec_gifs(small_db, outdir)
+    assert {p.name: p.stat().st_mtime_ns for p in graphs} == mtimes
+
+    db = json.loads(small_db.read_text())
+    db["flashlights"][0]["measures"][1]["ciex"] = 0.3554
+    small_db.write_text(json.dumps(db))
+    spec.chroma_spec_batch(small_db, outdir)
+    changed = {p.name for p in graphs if p.stat().st_mtime_ns != mtimes[p.name]}
+    assert changed == {"TS10_og_lvl5.svg"}
+
+    (outdir / manifest.MANIFEST_NAME).write_text("{")
+    assert not manifest.Manifest(outdir).is_current(graphs[2], "")
+    (outdir / manifest.MANIFEST_NAME).write_text('{"version": "0.0.0"}')
+    assert not manifest.Manifest(outdir).is_current(graphs[2], "")
+    spec.chroma_spec_batch(small_db, outdir, force=True)
+    assert graphs[2].stat().st_mtime_ns != mtimes[graphs[2].name]
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/statm"),
+    reason="Resident memory is read from procfs.",
+)
+def test_batch_memory(tmp_path):
+    """Benchmark resident memory, it stays flat across renders."""
+
+    def rss():
+        with open("/proc/self/statm") as i:
+            return int(i.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    for idx in range(3):
+        spec.plot_chroma_spec(0.3604, 0.3339, "warmup" + str(idx), tmp_path)
+    fignums = plt.get_fignums()
+    before = rss()
+
+    for idx in range(20):
+        spec.plot_chroma_spec(0.3604, 0.3339, "PL47MU" + str(idx), tmp_path)
+
+    # Leaking every figure costs about 8 MiB per render.
+    assert rss() - before < 40 * 2**20
+    assert plt.get_fignums() == fignums
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, database.CHUNK_SIZE])
+def test_iter_flashlights(tmp_path, chunk_size):
+    """Streamed flashlights match the whole database."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+
+    streamed = list(database.iter_flashlights("data/sotc.json", chunk_size))
+    assert [fl.id for fl in streamed] == [fl["id"] for fl in db["flashlights"]]
+    assert [fl.measures for fl in streamed] == [
+        fl["measures"] for fl in db["flashlights"]
+    ]
+
+    jsonl = tmp_path / "sotc.jsonl"
+    jsonl.write_text("\n".join(json.dumps(fl) for fl in db["flashlights"]) + "\n\n")
+    assert [fl.model for fl in database.iter_flashlights(jsonl)] == [
+        fl.model for fl in streamed
+    ]
+
+
+def test_iter_flashlights_layout(tmp_path):
+    """Any top-level key order is streamed, malformed input raises."""
+    path = tmp_path / "sotc.json"
+    for content, models in [
+        ("{ }", []),
+        ('{"flashlights": [], "version": "0.0.1"}', []),
+        ('{"x": [1, {"y": 2}], "flashlights": [{"model": 1e3}]}', [1000.0]),
+    ]:
+        path.write_text(content)
+        records = database._iter_json(open(path), chunk_size=1)
+        assert [fl["model"] for fl in records] == models
+
+    for content in ['{"flashlights": [{} {}]}', '{"flashlights": [{"id": ]}', "{"]:
+        path.write_text(content)
+        with pytest.raises(ValueError):
+            list(database._iter_json(open(path), chunk_size=1))
+
+
+def test_convert(runner: CliRunner, tmp_path) -> None:
+    """Binary databases are memory-mapped and stream the same flashlights."""
+    outdb = tmp_path / "sotc.npz"
+    result = runner.invoke(
+        __main__.main,
+        ["convert", "--indb", "data/sotc.json", "--outdb", outdb],
+    )
+    assert result.exit_code == 0
+
+    streamed = list(database.iter_flashlights("data/sotc.json"))
+    mapped = list(database.iter_flashlights(outdb))
+    assert [fl.id for fl in mapped] == [fl.id for fl in streamed]
+    assert [fl.status for fl in mapped] == [fl.status for fl in streamed]
+    assert [fl.measures for fl in mapped] == [fl.measures for fl in streamed]
+    assert isinstance(mapped[0].table.ciex.base, np.memmap)
+
+    table = database.load_table(outdb)
+    assert table.records() == database.load_table("data/sotc.json").records()
+    assert str(database.open_npz(outdb)["version"][0]) == "0.0.1"
+
+    result = runner.invoke(
+        __main__.main,
+        ["evol", "--indb", outdb, "--outdir", tmp_path],
+    )
+    assert result.exit_code == 0
+    assert (tmp_path / "TS10" / "TS10.svg").exists()
+
+    # Fields outside of the schema are stored per row, decoded with records.
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+    db["flashlights"][1]["measures"][0]["note"] = "recalibrated"
+    indb = tmp_path / "noted.json"
+    indb.write_text(json.dumps(db))
+    database.convert(indb, outdb)
+    arrays = database.open_npz(outdb)
+    assert arrays["extra_rows"].tolist() == [3]
+    assert isinstance(arrays["extra"], np.memmap)
+    mapped = list(database.iter_flashlights(outdb))
+    assert mapped[1].measures == db["flashlights"][1]["measures"]
+    assert database.load_table(outdb).records() == database.load_table(indb).records()
+
+
+def test_ingest(runner: CliRunner, tmp_path, monkeypatch) -> None:
+    """Ingested records are appended to a log, merged by loaders, compacted."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+    indb = tmp_path / "sotc.json"
+    indb.write_text(json.dumps(db, indent=2) + "\n")
+    content = indb.read_bytes()
+
+    measure = dict(db["flashlights"][0]["measures"][0], level="new", ciex=0.4)
+    records = tmp_path / "records.jsonl"
+    records.write_text(
+        "\n".join(
+            json.dumps(r)
+            for r in [
+                dict(db["flashlights"][0], status="sold", measures=[measure]),
+                dict(db["flashlights"][0], id="011", model="D4V2", measures=[]),
+                dict(db["flashlights"][0], id="011", model="D4V2", measures=[measure]),
+            ]
+        ),
+    )
+    result = runner.invoke(
+        __main__.main,
+        ["ingest", "--indb", indb, "--records", records],
+    )
+    assert result.exit_code == 0
+    # The database is left untouched, records are merged at read time.
+    assert indb.read_bytes() == content
+
+    def check(path):
+        flashlights = list(database.iter_flashlights(path))
+        assert [fl.id for fl in flashlights][-2:] == ["010", "011"]
+        assert flashlights[0].status == "sold"
+        assert flashlights[0].measures[-1] == measure
+        assert flashlights[-1].model == "D4V2"
+        assert flashlights[-1].measures == [measure]
+        table = database.load_table(path)
+        assert len(table) == 17
+        assert table.records()[3] == measure
+
+    check(indb)
+
+    # Nothing is appended unless every record is valid.
+    log = database.log_path(indb)
+    size = log.stat().st_size
+    bad = dict(db["flashlights"][1], status="stolen")
+    for lines in ([json.dumps(bad)], ["{"]):
+        result = runner.invoke(
+            __main__.main,
+            ["ingest", "--indb", indb, "--records", "-"],
+            input="\n".join(lines),
+        )
+        assert result.exit_code == 1
+    assert log.stat().st_size == size
+
+    # A torn record is skipped, the next one starts on its own line.
+    assert database.ingest(indb, []) == 0
+    with open(log, "a") as o:
+        o.write('\n{"id": "0')
+    check(indb)
+    assert database.ingest(indb, []) == 0
+    assert log.read_text().endswith('{"id": "0\n')
+
+    # Databases are compacted in their own format.
+    outdb = tmp_path / "sotc.npz"
+    database.convert("data/sotc.json", outdb)
+    assert isinstance(database.load_columns(outdb)["ciex"], np.memmap)
+    database.log_path(outdb).write_text(log.read_text())
+    check(outdb)
+    assert not isinstance(database.load_columns(outdb)["ciex"], np.memmap)
+    assert database.compact(outdb) == 2
+    check(outdb)
+    assert isinstance(database.load_columns(outdb)["ciex"], np.memmap)
+    assert database.log_path(outdb).read_text() == ""
+
+    lines = tmp_path / "sotc.jsonl"
+    lines.write_text("\n".join(json.dumps(fl) for fl in db["flashlights"]))
+    database.log_path(lines).write_text(log.read_text())
+    assert database.compact(lines) == 2
+    check(lines)
+
+    result = runner.invoke(__main__.main, ["compact", "--indb", indb])
+    assert result.exit_code == 0
+    check(indb)
+    with open(indb) as i:
+        assert json.load(i)["flashlights"][0]["status"] == "sold"
+    assert database.compact(indb) == 0
+    assert database.compact("data/sotc.json") == 0
+    assert not database.log_path("data/sotc.json").exists()
+
+    # Windows has no fcntl module, logs are not locked.
+    monkeypatch.setattr(database, "fcntl", None)
+    assert database.ingest(indb, [dict(db["flashlights"][0], status="sold")]) == 1
+    assert [fl["status"] for fl in database.iter_records(indb)][0] == "sold"
+    assert database.compact(indb) == 1
+
+
+def test_schema(runner: CliRunner, tmp_path, monkeypatch) -> None:
+    """Every schema error is reported, as jsonschema would, before rendering."""
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+    with open(database.SCHEMA) as j:
+        content = json.load(j)
+
+    db["version"] = 1
+    db["flashlights"][1]["status"] = "stolen"
+    db["flashlights"][1]["configuration"] = True
+    del db["flashlights"][2]["measures"][0]["lux"]
+    db["flashlights"][3]["measures"][0]["ra"] = 120
+    db["flashlights"][3]["measures"][1]["u"] = -1
+    db["flashlights"][4]["measures"] = {}
+    db["flashlights"][5]["measures"][0] = "og"
+    (tmp_path / "bad.json").write_text(json.dumps(db))
+
+    with pytest.raises(schema.SchemaError) as exc:
+        database.validate(tmp_path / "bad.json")
+    # Same errors as jsonschema, but a type error skips the enum check.
+    assert len(list(jsonschema.Draft3Validator(content).iter_errors(db))) == 9
+    assert exc.value.errors[1:] == [
+        "flashlights[1].configuration: True is not of type 'string'",
+        "flashlights[2].measures[0]: 'lux' is a required property",
+        "flashlights[3].measures[0].ra: 120 is more than 100",
+        "flashlights[3].measures[1].u: -1 is less than 0",
+        "flashlights[4].measures: {} is not of type 'array'",
+        "flashlights[5].measures[0]: 'og' is not of type 'object'",
+        "$.version: 1 is not of type 'string'",
+    ]
+
+    result = runner.invoke(
+        __main__.main,
+        ["batch", "--indb", tmp_path / "bad.json", "--outdir", tmp_path],
+    )
+    assert result.exit_code == 1
+    assert "8 schema errors" in result.output
+    assert list(tmp_path.iterdir()) == [tmp_path / "bad.json"]
+
+    # JSON Lines have no top-level fields, only flashlights are validated.
+    bad_lines = tmp_path / "bad.jsonl"
+    bad_lines.write_text("\n".join(json.dumps(fl) for fl in db["flashlights"]))
+    lines = tmp_path / "sotc.jsonl"
+    with open("data/sotc.json") as i:
+        flashlights = json.load(i)["flashlights"]
+    lines.write_text("\n".join(json.dumps(fl) for fl in flashlights))
+    outdir = tmp_path / "lines"
+    outdir.mkdir()
+    for indb, exit_code, output in [
+        (bad_lines, 1, "7 schema errors"),
+        (lines, 0, ""),
+    ]:
+        result = runner.invoke(
+            __main__.main,
+            ["evol", "--indb", indb, "--outdir", outdir],
+        )
+        assert result.exit_code == exit_code
+        assert output in result.output
+
+    # Columnar commands validate while loading, the database is read once.
+    monkeypatch.setattr(database, "validate", None)
+    for args in (
+        ["stats"],
+        ["drift"],
+        ["near", "--CIEx", "0.3604", "--CIEy", "0.3339"],
+        ["map", "--out", outdir / "map.svg"],
+    ):
+        result = runner.invoke(__main__.main, args + ["--indb", bad_lines])
+        assert result.exit_code == 1
+        assert "7 schema errors" in result.output
+        result = runner.invoke(__main__.main, args + ["--indb", lines])
+        assert result.exit_code == 0
+
+    error = schema.SchemaError("sotc.json", ["error"] * 25)
+    assert str(error).splitlines()[-1] == "  ... 5 more"
+    assert pickle.loads(pickle.dumps(error)).errors == error.errors  # noqa: S301
+
+    check = schema.compile_schema(
+        {
+            "type": ["integer", "null"],
+            "minimum": 0,
+            "maximum": 10,
+            "exclusiveMinimum": True,
+            "exclusiveMaximum": True,
+        },
+    )
+    errors = []
+    for value in (None, 5, 0, 10, 1.5, False):
+        check(value, "$", errors)
+    assert errors == [
+        "$: 0 is less than 0",
+        "$: 10 is more than 10",
+        "$: 1.5 is not of type 'integer', 'null'",
+        "$: False is not of type 'integer', 'null'",
+    ]
+
+    check = schema.compile_schema(
+        {
+            "type": "any",
+            "properties": {"flag": {"type": "boolean"}},
+            "additionalProperties": False,
+        },
+    )
+    errors = []
+    for value in ({"flag": True}, {"flag": 1, "extra": 0}, []):
+        check(value, "$", errors)
+    assert errors == [
+        "$.flag: 1 is not of type 'boolean'",
+        "$: unexpected property 'extra'",
+    ]
+
+    check = schema.compile_schema({"items": {"type": "number"}})
+    errors = []
+    for value in ([0, "1"], "01"):
+        check(value, "$", errors)
+    assert errors == ["$[1]: '1' is not of type 'number'"]
+
+    with pytest.raises(ValueError, match="pattern"):
+        schema.compile_schema({"type": "string", "pattern": "^og$"})
+
+
+def test_convert_errors(runner: CliRunner, small_db, tmp_path, monkeypatch) -> None:
+    """Invalid databases and compressed archives are rejected."""
+    # The schema ships with the package, commands run from any directory.
+    monkeypatch.chdir(tmp_path)
+    result = runner.invoke(
+        __main__.main,
+        ["stats", "--indb", str(small_db), "--out", "sotc.csv"],
+    )
+    assert result.exit_code == 0
+    database.convert(small_db, tmp_path / "sotc.npz")
+    assert len(database.load_table(tmp_path / "sotc.npz")) == 2
+
+    db = json.loads(small_db.read_text())
+    db["flashlights"][0]["status"] = "stolen"
+    small_db.write_text(json.dumps(db))
+    with pytest.raises(schema.SchemaError) as exc:
+        database.convert(small_db, tmp_path / "sotc.npz")
+    assert exc.value.errors == [
+        "flashlights[0].status: 'stolen' is not one of "
+        "['owned', 'gifted', 'sold', 'lent', 'broken', 'customer service']",
+    ]
+    result = runner.invoke(
+        __main__.main,
+        ["convert", "--indb", str(small_db), "--outdb", "sotc.npz"],
+    )
+    assert result.exit_code == 1
+    assert "1 schema errors" in result.output
+    database.convert(small_db, tmp_path / "sotc.npz", schema=None)
+
+    np.savez_compressed(tmp_path / "compressed.npz", ciex=np.zeros(2))
+    with pytest.raises(ValueError):
+        database.open_npz(tmp_path / "compressed.npz")
+
+    with zipfile.ZipFile(tmp_path / "v2.npz", "w") as z:
+        with z.open("ciex.npy", "w") as o:
+            np.lib.format.write_array(o, np.arange(3.0), version=(2, 0))
+    np.testing.assert_array_equal(
+        database.open_npz(tmp_path / "v2.npz")["ciex"], [0, 1, 2]
+    )
+
+
+def test_import_time() -> None:
+    """Benchmark CLI import time, plotting dependencies are deferred."""
+    code = (
+        "import sys\n"
+        "from chroma_spec import __main__, spec\n"
+        "spec.stat_chroma_spec(0.3604, 0.3339)\n"
+        "print(sorted({'colour', 'matplotlib', 'imageio'} & set(sys.modules)))\n"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+    cumulative = {
+        line.split("|")[2].strip(): int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[1].strip().isdigit()
+    }
+    # colour alone takes seconds, stay well under it.
+    assert cumulative["chroma_spec.__main__"] < 1_000_000
+
+
+def test_stats(runner: CliRunner, tmp_path) -> None:
+    """It writes chromatic properties of a database or stdin pairs."""
+    result = runner.invoke(
+        __main__.main,
+        ["stats", "--indb", "data/sotc.json", "--out", tmp_path / "sotc.csv"],
+    )
+    assert result.exit_code == 0
+    with open(tmp_path / "sotc.csv") as i:
+        rows = list(csv.DictReader(i))
+    assert len(rows) == 15
+    assert rows[3]["model"] == "TS10"
+    assert float(rows[3]["cct"]) == pytest.approx(5124.413540561434)
+
+    result = runner.invoke(
+        __main__.main,
+        ["stats", "--indb", "-", "--format", "npz", "--out", tmp_path / "xy.npz"],
+        input="0.3604 0.3339\n0.3418,0.3518\n",
+    )
+    assert result.exit_code == 0
+    table = np.load(tmp_path / "xy.npz")
+    np.testing.assert_allclose(
+        table["duv"], [-0.015143925038518163, 0.0014487684494922798]
+    )
+
+    result = runner.invoke(
+        __main__.main,
+        ["stats", "--indb", "-"],
+        input="0.3604 0.3339\n",
+    )
+    assert result.exit_code == 0
+    rows = list(csv.reader(io.StringIO(result.output)))
+    assert rows[0] == ["ciex", "ciey", "cct", "duv", "up", "vp"]
+    # CIE 1976 u'v', as the u'v' index and drift.
+    assert rows[1][4:] == ["0.22933503", "0.47806236"]
+
+    for content in ("0.3604 0.3339 0.3418\n", "0.3604 x\n"):
+        result = runner.invoke(__main__.main, ["stats", "--indb", "-"], input=content)
+        assert result.exit_code == 2
+        assert "Invalid stdin" in result.output
+
+    result = runner.invoke(
+        __main__.main,
+        ["stats", "--indb", "-", "--method", "Ohno 2013"],
+        input="0.3604 0.3339\n",
+    )
+    assert result.exit_code == 0
+    assert float(next(csv.DictReader(io.StringIO(result.output)))["cct"]) == (
+        pytest.approx(4310.39, abs=0.01)
+    )
+    assert spec._csv_quote('5,"og"') == '"5,""og"""'
+
+
+def test_drift(runner: CliRunner, tmp_path) -> None:
+    """Drift is analyzed along the dated history of every flashlight."""
+    analysis = drift.analyze(
+        {
+            "id": ["2", "1", "2", "1", "1", "1"],
+            "date": [
+                "2022-03-01",
+                "2023-01-01",
+                "2022-01-01",
+                "2022-01-01",
+                "2022-01-01",
+                "unknown",
+            ],
+            "mod": ["og", "og", "og", "og", "og", "og"],
+            "level": ["hi", "hi", "hi", "hi", "lo", "hi"],
+            "ciex": [0.36, 0.3637, 0.36, 0.36, 0.35, 0.40],
+            "ciey": [0.35, 0.35, 0.35, 0.35, 0.34, 0.38],
+        },
+    )
+    assert analysis["previous"].tolist() == [2, 4, -1, -1, 3, 1]
+    assert analysis["step"][0] == 0
+    assert np.isnan(analysis["step"][[2, 3]]).all()
+    assert analysis["days"][:5].tolist() == [59, 365, 0, 0, 0]
+    assert np.isnan(analysis["days"][5])
+    assert analysis["shift"][[0, 2, 3, 4]].tolist() == [0, 0, 0, 0]
+    assert analysis["shift"][1] == pytest.approx(0.0026, abs=1e-4)
+    assert analysis["rate"][1] == pytest.approx(analysis["shift"][1] * 365.25 / 365)
+    assert analysis["rate"][0] == 0
+    assert np.isnan(analysis["rate"][[2, 3, 4, 5]]).all()
+    assert not analysis["outlier"].any()
+    days = drift.dates_to_days(["2022-07-21", "2022-02-29", "2022-07-21T12:00"])
+    assert days[[0, 2]].tolist() == [19194, 19194]
+    assert np.isnan(days[1])
+    assert np.isnan(drift.dates_to_days(["?"])).all()
+    steps = np.array([0.001, 0.0012, np.nan, 0.0011, 0.02, 0.0009])
+    assert drift.outliers(steps).tolist() == [False] * 4 + [True, False]
+    assert drift.outliers(np.array([np.nan])).tolist() == [False]
+
+    result = runner.invoke(__main__.main, ["drift", "--out", tmp_path / "drift.csv"])
+    assert result.exit_code == 0
+    with open(tmp_path / "drift.csv") as i:
+        rows = list(csv.DictReader(i))
+    assert len(rows) == 15
+    assert [row["model"] for row in rows if row["outlier"] == "True"] == ["FW3X"]
+    assert rows[1]["step"] == "0.00343426"
+
+    result = runner.invoke(
+        __main__.main,
+        ["drift", "--out", tmp_path / "drift.npz", "--format", "npz"],
+    )
+    assert result.exit_code == 0
+    with np.load(tmp_path / "drift.npz") as table:
+        assert table["outlier"].sum() == 1
+        assert table["step"][1] == pytest.approx(float(rows[1]["step"]))
+
+    # The overlay is part of the graph inputs.
+    for flags in ([], ["--drift"]):
+        result = runner.invoke(
+            __main__.main,
+            ["evol", "--outdir", tmp_path] + flags,
+        )
+        assert result.exit_code == 0
+        assert "FW3X/FW3X.svg" in dict(manifest.Manifest(tmp_path).items())
+        digests = dict(manifest.Manifest(tmp_path).items())
+        if not flags:
+            plain = digests
+    assert digests["FW3X/FW3X.svg"] != plain["FW3X/FW3X.svg"]
+    assert digests["TS10/TS10.svg"] != plain["TS10/TS10.svg"]
+
+
+def test_near(runner: CliRunner, tmp_path) -> None:
+    """The index agrees with an exhaustive search."""
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0.25, 0.5, 5000)
+    y = rng.uniform(0.25, 0.45, 5000)
+    x[::100] = np.nan
+    chroma_index = index.ChromaIndex(x, y)
+    assert len(chroma_index) == 4950
+
+    u, v = utils.xy_to_uv_array(x, y)
+    for qx, qy in [(0.36, 0.33), (0.9, 0.05), (0.2, 0.6)]:
+        qu, qv = utils.xy_to_uv(qx, qy)
+        distances = np.nan_to_num(np.hypot(u - qu, 1.5 * (v - qv)), nan=np.inf)
+        rows, found = chroma_index.nearest(qx, qy, k=20)
+        np.testing.assert_array_equal(rows, np.argsort(distances, kind="stable")[:20])
+        np.testing.assert_allclose(found, np.sort(distances)[:20])
+        rows, found = chroma_index.within(qx, qy, 0.01)
+        assert sorted(rows) == np.flatnonzero(distances <= 0.01).tolist()
+        assert all(found <= 0.01)
+
+    rows, _ = index.ChromaIndex([], []).nearest(0.36, 0.33, k=3)
+    assert len(rows) == 0
+    for qx, qy in [(0.9, 0.05), (0.2, 0.6), (0.05, 0.05), (0.7, 0.8)]:
+        rows, found = chroma_index.within(qx, qy, 0.001)
+        assert (len(rows), len(found)) == (0, 0)
+
+    result = runner.invoke(
+        __main__.main,
+        ["near", "--CIEx", "0.3604", "--CIEy", "0.3339", "-k", "2"],
+    )
+    assert result.exit_code == 0
+    rows = list(csv.DictReader(io.StringIO(result.output)))
+    assert [row["model"] for row in rows] == ["PL47MU", "E14_III"]
+
+    result = runner.invoke(
+        __main__.main,
+        ["near", "--CIEx", "0.35", "--CIEy", "0.35", "--radius", "0.01", "-k", "3"],
+    )
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 4
+
+    result = runner.invoke(
+        __main__.main,
+        ["near", "--CIEx", "0.45", "--CIEy", "0.42", "--radius", "0.001"],
+    )
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 1
+
+
+def test_profile(runner: CliRunner, tmp_path, monkeypatch) -> None:
+    """It reports the timings of every stage, and a cProfile dump."""
+    result = runner.invoke(
+        __main__.main,
+        [
+            "--profile",
+            tmp_path / "profile.json",
+            "--cprofile",
+            tmp_path / "profile.prof",
+            "evol",
+            "--indb",
+            "data/sotc.json",
+            "--outdir",
+            tmp_path,
+        ],
+    )
+    assert result.exit_code == 0
+    with open(tmp_path / "profile.json") as i:
+        report = json.load(i)
+    stages = report["stages"]
+    assert set(stages) == {"background", "digest", "load", "plot", "render", "save"}
+    assert stages["load"]["count"] == 11
+    assert stages["save"]["count"] == 10
+    assert stages["save"]["p50"] <= stages["save"]["p99"] <= stages["save"]["max"]
+    assert report["max_rss_kib"] >= stages["save"]["max_rss_kib"] > 0
+    assert report["versions"]["matplotlib"] == plt.matplotlib.__version__
+    assert pstats.Stats(str(tmp_path / "profile.prof")).total_calls > 0
+    assert profiling.is_enabled() is False
+
+    result = runner.invoke(
+        __main__.main,
+        ["--profile", "-", "stats", "--indb", "-"],
+        input="0.3604 0.3339\n",
+    )
+    assert result.exit_code == 0
+    assert '"chroma": {' in result.output
+
+    with profiling.stage("chroma"):
+        pass
+    assert profiling.collect() == {"timings": dict(), "memory": dict()}
+
+    # Worker stages, see profiling.remote.
+    profiling.merge({"timings": {"render": [0.1]}, "memory": {"render": 5}})
+    profiling.merge({"timings": {"render": [0.3]}, "memory": {"render": 3}})
+    assert profiling.report()["stages"]["render"]["max_rss_kib"] == 5
+    assert profiling.collect()["timings"] == {"render": [0.1, 0.3]}
+
+    # ru_maxrss is in bytes on macOS, Windows has no resource module.
+    monkeypatch.setattr(
+        profiling.resource,
+        "getrusage",
+        lambda who: types.SimpleNamespace(ru_maxrss=2048),
+    )
+    assert profiling._max_rss() == 2048
+    monkeypatch.setattr(sys, "platform", "darwin")
+    assert profiling._max_rss(children=True) == 2
+    monkeypatch.setattr(profiling, "resource", None)
+    profiling.enable()
+    try:
+        with profiling.stage("render"):
+            pass
+    finally:
+        profiling.enable(False)
+    content = profiling.report()
+    assert content["stages"]["render"]["max_rss_kib"] is None
+    assert content["max_rss_kib"] is content["max_rss_kib_children"] is None
+    profiling.collect()
+
+
+def _post(url, body):
+    """POST a request body to the render server."""
+    request = urllib.request.Request(url, data=body, method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:  # noqa: S310
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        return err.code, json.loads(err.read())
+
+
+def test_server(tmp_path, monkeypatch) -> None:
+    """It renders measures posted over HTTP and over a Unix socket."""
+    with server.make_server(port=0) as httpd:
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        url = "http://127.0.0.1:" + str(httpd.server_address[1])
+        try:
+            query = {"x": 0.3604, "y": 0.3339, "model": "PL47MU", "format": "png"}
+            code, content = _post(url + "/render", json.dumps(query).encode())
+            assert code == 200
+            assert content["cct"] == pytest.approx(4330.655950072925)
+            assert base64.b64decode(content["image"]).startswith(b"\x89PNG")
+
+            code, content = _post(url + "/render", b'{"x": 0.3604, "y": 0.3339}')
+            assert (code, content["error"]) == (400, "KeyError: 'model'")
+            query["format"] = "gif"
+            code, content = _post(url + "/render", json.dumps(query).encode())
+            assert (code, content["error"]) == (
+                400,
+                "ValueError: Unsupported format: gif",
+            )
+            code, content = _post(url + "/plot", b"{}")
+            assert code == 404
+
+            query = {"x": 0.3604, "y": 0.3339, "model": "PL47MU", "zoom": "false"}
+            code, content = _post(url + "/render", json.dumps(query).encode())
+            assert (code, content["error"]) == (
+                400,
+                'TypeError: zoom must be a boolean: "false"',
+            )
+            query.update(y=0.1858, zoom=False)
+            code, content = _post(url + "/render", json.dumps(query).encode())
+            assert code == 400
+            assert content["error"].startswith("ZeroDivisionError")
+
+            def fail(*args, **kwargs):
+                raise RuntimeError("Renderer down")
+
+            query["y"] = 0.3339
+            with monkeypatch.context() as patch:
+                patch.setattr(spec, "render_chroma_spec", fail)
+                code, content = _post(url + "/render", json.dumps(query).encode())
+            assert (code, content["error"]) == (500, "RuntimeError: Renderer down")
+        finally:
+            httpd.shutdown()
+            thread.join()
+
+    socket_path = tmp_path / "chroma-spec.sock"
+    socket_path.write_text("")
+    with pytest.raises(OSError):
+        server.make_server(socket_path=socket_path)
+    assert socket_path.read_text() == ""
+    socket_path.unlink()
+    for _ in range(2):
+        with server.make_server(socket_path=socket_path) as httpd:
+            thread = threading.Thread(target=httpd.handle_request)
+            thread.start()
+            body = b'{"x": 0.3604, "y": 0.3339, "model": "PL47MU"}'
+            with socket.socket(socket.AF_UNIX) as client:
+                client.connect(str(socket_path))
+                client.sendall(
+                    b"POST /render HTTP/1.0\r\nContent-Length: "
+                    + str(len(body)).encode()
+                    + b"\r\n\r\n"
+                    + body
+                )
+                response = b"".join(iter(lambda: client.recv(1 << 16), b""))
+            thread.join()
+            assert response.startswith(b"HTTP/1.0 200")
+            assert b'"mime": "image/svg+xml"' in response
+            # Leave a stale socket behind, it is replaced on the next bind.
+            httpd.socket.close()
+            httpd.server_close = lambda: None
+    assert socket_path.exists()
+
+
+def test_serve(runner: CliRunner, monkeypatch) -> None:
+    """It serves until interrupted."""
+
+    def interrupt(self):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(http.server.HTTPServer, "serve_forever", interrupt)
+    result = runner.invoke(__main__.main, ["serve", "--port", "0"])
+    assert result.exit_code == 0
+
+    # Windows has no Unix sockets.
+    monkeypatch.setattr(server, "UNIX_SOCKETS", False)
+    result = runner.invoke(__main__.main, ["serve", "--socket", "chroma-spec.sock"])
+    assert result.exit_code == 2
+    assert "Unix sockets are not supported" in result.output
+
+
+def test_pipeline(runner: CliRunner, tmp_path) -> None:
+    """It renders batch and evol graphs on one event loop, once."""
+    args = ["pipeline", "--indb", "data/sotc.json", "--outdir", tmp_path, "-j", "2"]
+    result = runner.invoke(__main__.main, args)
+    assert result.exit_code == 0
+    with open("data/sotc.json") as i:
+        db = json.load(i)
+
+    expected = sorted(
+        [
+            pathlib.Path(fl["model"], "_".join((fl["model"], rec["mod"], rec["level"])))
+            for fl in db["flashlights"]
+            for rec in fl["measures"]
+        ]
+        + [pathlib.Path(fl["model"], fl["model"]) for fl in db["flashlights"]]
+    )
+    rendered = {
+        p.relative_to(tmp_path).with_suffix(""): p.stat().st_mtime_ns
+        for p in tmp_path.glob("*/*.svg")
+    }
+    assert sorted(rendered) == expected
+
+    result = runner.invoke(__main__.main, args)
+    assert result.exit_code == 0
+    assert {
+        p.relative_to(tmp_path).with_suffix(""): p.stat().st_mtime_ns
+        for p in tmp_path.glob("*/*.svg")
+    } == rendered
+
+
+def test_duplicates(runner: CliRunner, small_db, tmp_path) -> None:
+    """Measures and flashlights that share a graph are rendered once."""
+    db = json.loads(small_db.read_text())
+    fl = db["flashlights"][0]
+    db["flashlights"].append(
+        dict(fl, id="003", measures=[dict(m, ciex=0.36) for m in fl["measures"]]),
+    )
+    fl["measures"].append(dict(fl["measures"][0], ciex=0.3604, ciey=0.3339))
+    small_db.write_text(json.dumps(db))
+
+    def render(commands, outdir):
+        for command in commands:
+            args = [command, "--indb", small_db, "--outdir", outdir]
+            result = runner.invoke(__main__.main, args)
+            assert result.exit_code == 0
+        return {p.name: p.stat() for p in outdir.glob("TS10/*")}
+
+    # Graphs get the permissions of files created by open.
+    (tmp_path / "mode").touch()
+    file_mode = stat.S_IMODE((tmp_path / "mode").stat().st_mode)
+    manifests = []
+    for commands in (["pipeline"], ["batch", "evol", "gifs"]):
+        outdir = tmp_path / commands[0]
+        outdir.mkdir()
+        rendered = render(commands, outdir)
+        # Reruns converge, nothing is rendered again.
+        assert render(commands, outdir) == rendered
+        assert {stat.S_IMODE(s.st_mode) for s in rendered.values()} == {file_mode}
+        manifests.append(manifest.Manifest(outdir).items())
+
+    # Both keep the first measure and the first flashlight of a graph.
+    assert sorted(rendered) == [
+        "TS10.gif",
+        "TS10.svg",
+        "TS10_og_1-150.svg",
+        "TS10_og_lvl5.svg",
+    ]
+    assert manifests[0] == [item for item in manifests[1] if ".gif" not in item[0]]
+
+
+def test_render_queue(tmp_path) -> None:
+    """It applies backpressure, reports failures and skips cancelled jobs."""
+    points = {"og": [0.3604, 0.3339]}
+
+    async def main():
+        async with pipeline.RenderQueue(maxsize=1) as queue:
+            path = tmp_path / "PL47MU.svg"
+            rendered = await queue.submit(
+                spec.render_chroma_evol, {"points": points, "model": "PL47MU"}, path
+            )
+            failing = await queue.submit(spec.render_chroma_evol, {"model": "PL47MU"})
+            for kwargs in ({"model": "PL47MU"}, {"points": points, "model": "PL47MU"}):
+                cancelled = await queue.submit(spec.render_chroma_evol, kwargs)
+                cancelled.cancel()
+            assert await rendered == path
+            with pytest.raises(TypeError):
+                await failing
+            svg = await queue.render(
+                spec.render_chroma_evol, {"points": points, "model": "PL47MU"}
+            )
+            assert svg.startswith(b"<?xml")
+
+        with pytest.raises(RuntimeError):
+            async with pipeline.RenderQueue():
+                raise RuntimeError
+
+    asyncio.run(main())
+    assert (tmp_path / "PL47MU.svg").read_bytes().startswith(b"<?xml")
+
+
+def test_formats(runner: CliRunner, tmp_path, small_db) -> None:
+    """It renders raster graphs and svg graphs with a raster background."""
+    single = ["single", "--CIEx", "0.3604", "--CIEy", "0.3339", "--outdir", tmp_path]
+    for model, options in (
+        ("vector", []),
+        ("raster", ["--raster-background"]),
+        ("webp", ["--format", "webp"]),
+    ):
+        result = runner.invoke(__main__.main, single + ["--model", model] + options)
+        assert result.exit_code == 0
+
+    vector = (tmp_path / "vector.svg").read_text()
+    raster = (tmp_path / "raster.svg").read_text()
+    assert raster.count("<path") < vector.count("<path") // 10
+    assert raster.count("<image") == 1
+    assert (tmp_path / "webp.webp").read_bytes()[8:12] == b"WEBP"
+
+    for command in ("batch", "evol"):
+        result = runner.invoke(
+            __main__.main,
+            [command, "--indb", small_db, "--outdir", tmp_path, "--format", "png"],
+        )
+        assert result.exit_code == 0
+    assert sorted(p.name for p in (tmp_path / "TS10").iterdir()) == [
+        "TS10.png",
+        "TS10_og_1-150.png",
+        "TS10_og_lvl5.png",
+    ]
+
+    args = ["pipeline", "--indb", small_db, "--outdir", tmp_path]
+    result = runner.invoke(__main__.main, args + ["--raster-background"])
+    assert result.exit_code == 0
+    assert (tmp_path / "TS10" / "TS10.svg").read_text().count("<path") < 100
+
+
+def test_map(runner: CliRunner, tmp_path) -> None:
+    """It plots all measures on one graph, colored or as a density."""
+    for name, options in (
+        ("plain.svg", ["--raster-background"]),
+        ("lux.png", ["--color-by", "lux"]),
+        ("status.png", ["--color-by", "status"]),
+        ("density.webp", ["--density"]),
+    ):
+        result = runner.invoke(
+            __main__.main,
+            ["map", "--indb", "data/sotc.json", "--out", tmp_path / name] + options,
+        )
+        assert result.exit_code == 0
+        assert (tmp_path / name).stat().st_size > 0
+
+    result = runner.invoke(__main__.main, ["map", "--out", tmp_path / "sotc.gif"])
+    assert result.exit_code == 2
+    assert "Usage:" in result.output
+    assert "Unsupported graph format" in result.output
+    with pytest.raises(ValueError):
+        spec.chroma_spec_map("data/sotc.json", tmp_path / "sotc.gif")
+
+    stream = io.BytesIO()
+    spec.render_chroma_map({"ciex": [np.nan], "ciey": [np.nan]}, stream, fmt="png")
+    assert stream.getvalue().startswith(b"\x89PNG")